@@ -1,4 +1,8 @@
+import io
+
+import discord
 from discord.ext import commands
+from tabulate import tabulate
 import traceback
 
 
@@ -26,6 +30,47 @@ class Admin(commands.Cog):
             except Exception:
                 traceback.print_exc()
 
+    @commands.command(name='metrics', help='Show ZwiftPower scraper metrics. Format: summary, json or prometheus')
+    @commands.is_owner()
+    async def metrics(self, ctx, fmt: str = 'summary'):
+        zp = ctx.bot.get_cog('ZwiftPower')
+        if zp is None:
+            await ctx.send("ZwiftPower cog isn't loaded")
+            return
+        scraper = zp.scraper
+        if fmt in ('json', 'prometheus'):
+            data = scraper.metrics.to_json(indent=2) if fmt == 'json' else scraper.metrics.to_prometheus()
+            filename = 'metrics.json' if fmt == 'json' else 'metrics.prom'
+            await ctx.send(file=discord.File(io.BytesIO(data.encode()), filename=filename))
+            return
+        rows = [(name, r['requests'], r['hits'], round(r['avg_ms']), r['bytes'])
+                for name, r in sorted(scraper.metrics.summary().items())]
+        table = tabulate(rows, headers=['Endpoint', 'Requests', 'Cached', 'Avg ms', 'Bytes'])
+        # Worker threads keep adding to the metrics, so only read them through a snapshot
+        snapshot = scraper.metrics.snapshot()
+        parse = ', '.join('{} {:.1f}ms'.format(t, 1000 * h['sum'] / h['count'])
+                          for t, h in sorted(snapshot['parse'].items()) if h['count'])
+        hit_ratio = snapshot['cache_hit_ratio']
+        counters = snapshot['counters']
+        lines = [
+            table,
+            '',
+            'Cache hit ratio: {}'.format('-' if hit_ratio is None else '{:.0%}'.format(hit_ratio)),
+            'Parse (avg): {}'.format(parse or '-'),
+            'Logins: {}'.format(counters['scraper'].get('logins', 0)),
+            'Rate limit wait: {:.1f}s'.format(counters['rate_limiter'].get('wait_time', 0)),
+        ]
+        loop_lag = getattr(ctx.bot, 'loop_lag', None)
+        if loop_lag is not None and loop_lag.lags:
+            lag = loop_lag.summary()
+            lines.append('Loop lag: median {:.0f}ms, p95 {:.0f}ms, max {:.0f}ms'.format(
+                1000 * lag['median'], 1000 * lag['p95'], 1000 * lag['max']))
+        blocking = getattr(ctx.bot, 'blocking', None)
+        if blocking is not None:
+            calls = ', '.join('{} {}'.format(k, v) for k, v in sorted(blocking.stats.items()))
+            lines.append('Blocking calls: {}'.format(calls or '-'))
+        await ctx.send("```{}```".format('\n'.join(lines)))
+
 
 async def setup(bot):
     await bot.add_cog(Admin(bot, bot.EXTENSIONS))
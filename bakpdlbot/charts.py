@@ -0,0 +1,303 @@
+"""
+Rendering charts in worker processes, from plain plot data, so matplotlib doesn't hold up the bot or a template run.
+"""
+import asyncio
+import collections
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import timedelta
+from html import escape
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import ago
+
+logger = logging.getLogger(__name__)
+
+#: Log scale ticks of CP curves, in seconds
+CP_TICKS = (1, 2, 5, 10, 30, 60, 120, 300, 600, 1200, 3600, 7200, 14400, 36000)
+
+FORMATS = ('png', 'svg')
+
+#: Part of the cache key, bump it when charts are drawn differently
+CHART_VERSION = 1
+
+
+def ago_fmt(v, _):
+    td = timedelta(seconds=int(v))
+    return ago.human(td, past_tense='{}', abbreviate=True).replace(', ', '')
+
+
+class CPChart(NamedTuple):
+    """Critical power curves: ``plots`` is a list of (durations, values, label)"""
+    plots: List[Tuple[Sequence[float], Sequence[float], str]]
+    title: str
+    ylabel: str
+    style: str = 'default'
+
+
+class PowerBars(NamedTuple):
+    """One bar per rider, at a single duration ``period`` in seconds"""
+    labels: List[str]
+    values: List[float]
+    period: int
+    unit: str
+    style: str = 'default'
+    direction: str = 'horizontal'
+    value_labels: bool = True
+
+
+Chart = Union[CPChart, PowerBars]
+
+
+def make_cp(plots, title, ylabel):
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import FuncFormatter
+
+    fig = plt.figure()
+    ax = fig.add_subplot(1, 1, 1)
+    ax.set_title(title)
+    ax.set_xscale('log')
+    ax.set_ylabel(ylabel)
+    ax.set_xticks(CP_TICKS)
+    ax.set_xticks([], minor=True)
+    ax.xaxis.set_major_formatter(FuncFormatter(ago_fmt))
+    ax.grid(visible=True)
+    for x, y, label in plots:
+        ax.plot(x, y, label=label)
+    ax.legend(loc='upper right')
+    ax.set_xlim(left=1, right=None)
+    return fig
+
+
+def make_power_bars(chart: PowerBars):
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure()
+    ax = fig.add_subplot(1, 1, 1)
+    ax.set_title("90 day {} power".format(ago_fmt(chart.period, None)))
+    if chart.direction == 'vertical':
+        ax.bar(chart.labels, chart.values)
+        ax.set_ylabel(chart.unit)
+    elif chart.direction == 'horizontal':
+        ax.barh(chart.labels, chart.values)
+        ax.set_xlabel(chart.unit)
+        if chart.value_labels:
+            for rect in ax.patches:
+                x, y = rect.get_width(), rect.get_y() + rect.get_height() / 2
+                ax.annotate(x, (x, y), xytext=(-10, 0), textcoords='offset points', va='center', ha='right')
+    fig.tight_layout()
+    return fig
+
+
+def _style(name: str):
+    import matplotlib.pyplot as plt
+    return plt.xkcd() if name == 'xkcd' else plt.style.context(name)
+
+
+def render(chart: Chart, fmt: str = 'png') -> bytes:
+    """Render a chart to PNG or SVG (without the XML prolog, for inlining) in this process"""
+    import matplotlib.pyplot as plt
+
+    if fmt not in FORMATS:
+        raise Exception("Unsupported chart format: {}".format(fmt))
+    with _style(chart.style):
+        if isinstance(chart, CPChart):
+            fig = make_cp(chart.plots, chart.title, chart.ylabel)
+        else:
+            fig = make_power_bars(chart)
+        try:
+            buf = io.BytesIO()
+            fig.savefig(buf, format=fmt)
+        finally:
+            plt.close(fig)
+    data = buf.getvalue()
+    if fmt == 'svg':
+        data = data[data.index(b'<svg'):]
+    return data
+
+
+def warm_up():
+    """
+    Worker initializer: load matplotlib with the Agg backend, its styles and the font cache, and draw some text
+    once, so the first real chart doesn't pay for it.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib import font_manager
+
+    font_manager.findfont(font_manager.FontProperties())
+    list(plt.style.library)
+    for fmt in FORMATS:
+        render(CPChart([([1, 10], [2, 1], 'warm up')], 'warm up', 'w/kg'), fmt)
+    logger.debug("Chart worker %d ready", os.getpid())
+
+
+def chart_key(chart: Chart, fmt: str) -> str:
+    """Hash of everything that goes into a rendered chart: its kind, data, labels, style and the output format"""
+    data = json.dumps([CHART_VERSION, type(chart).__name__, list(chart), fmt], separators=(',', ':'))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class ChartCache:
+    """
+    Rendered charts on disk, named by :func:`chart_key`. When the files add up to more than ``max_bytes``, the least
+    recently used ones are removed; a file's modification time is its last use.
+    """
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, path: Union[str, Path], max_bytes: int = None):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes or self.DEFAULT_MAX_BYTES
+        self._lock = threading.Lock()
+        #: Counters: hits, misses, evictions
+        self.stats = collections.Counter()
+        self._sizes = collections.OrderedDict()
+        for file in sorted(self.path.glob('*.chart'), key=lambda f: f.stat().st_mtime):
+            self._sizes[file.name] = file.stat().st_size
+        self.size = sum(self._sizes.values())
+
+    def stats_copy(self) -> dict:
+        """:attr:`stats`, copied under the cache's lock"""
+        with self._lock:
+            return dict(self.stats)
+
+    def _file(self, key: str) -> Path:
+        return self.path / (key + '.chart')
+
+    def get(self, chart: Chart, fmt: str) -> Optional[bytes]:
+        file = self._file(chart_key(chart, fmt))
+        with self._lock:
+            try:
+                data = file.read_bytes()
+            except FileNotFoundError:
+                self._sizes.pop(file.name, None)
+                self.stats['misses'] += 1
+                return None
+            os.utime(file)
+            # The file may have been written by another process (or cache) since this one started
+            self.size += len(data) - self._sizes.get(file.name, 0)
+            self._sizes[file.name] = len(data)
+            self._sizes.move_to_end(file.name)
+            self.stats['hits'] += 1
+            return data
+
+    def put(self, chart: Chart, fmt: str, data: bytes):
+        file = self._file(chart_key(chart, fmt))
+        with self._lock:
+            tmp = file.with_suffix('.tmp')
+            tmp.write_bytes(data)
+            os.replace(tmp, file)
+            self.size += len(data) - self._sizes.pop(file.name, 0)
+            self._sizes[file.name] = len(data)
+            while self.size > self.max_bytes and len(self._sizes) > 1:
+                name, size = self._sizes.popitem(last=False)
+                (self.path / name).unlink(missing_ok=True)
+                self.size -= size
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            for name in self._sizes:
+                (self.path / name).unlink(missing_ok=True)
+            self._sizes.clear()
+            self.size = 0
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+class ChartRenderer:
+    """
+    A pool of warmed-up worker processes rendering charts. Workers are spawned rather than forked, since the bot and
+    the scraper have threads running. With a ``cache``, charts that were rendered before aren't rendered again.
+    """
+    DEFAULT_WORKERS = 2
+
+    def __init__(self, max_workers: int = None, cache: ChartCache = None):
+        self.max_workers = max_workers or min(self.DEFAULT_WORKERS, os.cpu_count() or 1)
+        self.cache = cache
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                         mp_context=multiprocessing.get_context('spawn'), initializer=warm_up)
+
+    def warm_up(self) -> 'ChartRenderer':
+        """Start all the workers now instead of on the first charts, and wait until they're ready"""
+        for f in [self._pool.submit(_ready) for _ in range(self.max_workers)]:
+            f.result()
+        return self
+
+    def submit(self, chart: Chart, fmt: str = 'png') -> Future:
+        if self.cache is None:
+            return self._pool.submit(render, chart, fmt)
+        data = self.cache.get(chart, fmt)
+        if data is not None:
+            future = Future()
+            future.set_result(data)
+            return future
+        future = self._pool.submit(render, chart, fmt)
+        future.add_done_callback(lambda f: self._store(f, chart, fmt))
+        return future
+
+    def _store(self, future: Future, chart: Chart, fmt: str):
+        if not future.cancelled() and future.exception() is None:
+            try:
+                self.cache.put(chart, fmt, future.result())
+            except OSError:
+                logger.exception("Could not cache chart")
+
+    def render(self, chart: Chart, fmt: str = 'png') -> bytes:
+        return self.submit(chart, fmt).result()
+
+    async def render_async(self, chart: Chart, fmt: str = 'png') -> bytes:
+        return await asyncio.wrap_future(self.submit(chart, fmt))
+
+    def close(self):
+        if sys.version_info >= (3, 9):
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        else:  # pragma: no cover - cancel_futures is new in 3.9
+            self._pool.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ChartSlots:
+    """
+    Lets template filters start rendering charts while the template is still being rendered: :meth:`add` submits a
+    chart and returns a placeholder for the output, :meth:`fill` waits for the charts and puts them in. A chart
+    that fails to render is replaced by an error message rather than failing the whole output.
+    """
+    _PLACEHOLDER = re.compile(r'<!--chart:(\d+)-->')
+
+    def __init__(self, renderer: ChartRenderer, fmt: str = 'svg'):
+        self.renderer = renderer
+        self.fmt = fmt
+        self._futures: List[Future] = []
+
+    def add(self, chart: Chart) -> str:
+        self._futures.append(self.renderer.submit(chart, self.fmt))
+        return '<!--chart:{}-->'.format(len(self._futures) - 1)
+
+    def fill(self, text: str) -> str:
+        return self._PLACEHOLDER.sub(lambda m: self._output(int(m.group(1))), text)
+
+    def _output(self, n: int) -> str:
+        try:
+            return self._futures[n].result().decode()
+        except Exception as e:
+            logger.error("Chart %d failed to render: %r", n, e)
+            return '<!-- chart {} failed to render: {} -->'.format(n, escape(str(e)).replace('--', '- -'))
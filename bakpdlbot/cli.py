@@ -6,13 +6,14 @@ import sys
 import click
 from dotenv import load_dotenv
 
-from .discord_bot import bot
-
 
 @click.command()
 @click.option('--debug', is_flag=True, help='Enable debug logging')
 def main(debug, args=None):
     """Console script for bakpdlbot."""
+    # discord.py takes a while to import, which --help doesn't need
+    from .discord_bot import bot
+
     load_dotenv()
     TOKEN = os.getenv('DISCORD_TOKEN')
     bot.run(TOKEN)
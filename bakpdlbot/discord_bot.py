@@ -2,9 +2,13 @@ import traceback
 import discord
 from discord.ext import commands
 
+from .executor import BlockingExecutor, LoopLagMonitor
+
 intents = discord.Intents(message_content=True, messages=True)
 
 bot = commands.Bot(command_prefix='!', intents=intents)
+bot.blocking = BlockingExecutor()
+bot.loop_lag = LoopLagMonitor()
 bot.EXTENSIONS = (
     'bakpdlbot.simple',
     'bakpdlbot.sheet',
@@ -16,6 +20,7 @@ bot.EXTENSIONS = (
 
 @bot.listen("on_ready")
 async def load_extensions(*args):
+    bot.loop_lag.start()
     for e in bot.EXTENSIONS:
         try:
             await bot.load_extension(e)
@@ -0,0 +1,117 @@
+"""
+Running blocking work (requests, Google API calls, matplotlib) from bot commands without stalling the event loop.
+"""
+import asyncio
+import collections
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CommandTimeout(Exception):
+    pass
+
+
+class BlockingExecutor:
+    """
+    A bounded thread pool for blocking calls made by commands, with a timeout per call.
+
+    When a call times out or the command is cancelled, a call that hasn't started yet is dropped. One that is
+    already running can't be interrupted; it finishes in the background and its result is thrown away.
+    """
+    DEFAULT_WORKERS = 8
+    #: Seconds, unless the caller gives a timeout
+    DEFAULT_TIMEOUT = 60.0
+
+    def __init__(self, max_workers: int = None, timeout: float = None):
+        self.max_workers = max_workers or self.DEFAULT_WORKERS
+        self.timeout = timeout or self.DEFAULT_TIMEOUT
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='blocking')
+        #: Counters: calls, timeouts, cancelled, errors
+        self.stats = collections.Counter()
+
+    async def run(self, fn: Callable, *args, timeout: float = None, **kwargs):
+        """Call ``fn(*args, **kwargs)`` on the pool and wait for it, for at most ``timeout`` seconds"""
+        loop = asyncio.get_running_loop()
+        self.stats['calls'] += 1
+        future = loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+        return await self.wait(future, timeout=timeout, name=getattr(fn, '__qualname__', repr(fn)))
+
+    async def wait(self, aw: Awaitable, timeout: float = None, name: str = None):
+        """Wait for an awaitable (e.g. an AsyncScraper call) with the same timeout handling as :meth:`run`"""
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(aw, timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            logger.warning("%s timed out after %.0fs", name or aw, timeout)
+            raise CommandTimeout("Timed out after {:.0f}s, please try again later".format(timeout))
+        except asyncio.CancelledError:
+            self.stats['cancelled'] += 1
+            raise
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+def for_bot(bot) -> BlockingExecutor:
+    """The bot's shared executor, created on first use"""
+    if getattr(bot, 'blocking', None) is None:
+        bot.blocking = BlockingExecutor()
+    return bot.blocking
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes up from a sleep of ``interval`` seconds. Anything above a few
+    milliseconds means something is blocking the loop; lags over ``warn_after`` are logged.
+    """
+
+    def __init__(self, interval: float = 0.5, warn_after: float = 0.25, window: int = 120):
+        self.interval = interval
+        self.warn_after = warn_after
+        #: The most recent lags in seconds
+        self.lags = collections.deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._monitor())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _monitor(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - start - self.interval)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.warn_after:
+                logger.warning("Event loop was blocked for %.2fs", lag)
+
+    def summary(self) -> dict:
+        lags = sorted(self.lags)
+        if not lags:
+            return {'samples': 0}
+        return {
+            'samples': len(lags),
+            'median': lags[len(lags) // 2],
+            'p95': lags[min(len(lags) - 1, int(len(lags) * 0.95))],
+            'max_recent': lags[-1],
+            'max': self.max_lag,
+        }
@@ -1,26 +1,29 @@
 import csv
+import functools
 import io
 import logging
 import os
 import sys
-from datetime import timedelta, date, datetime
+from datetime import timedelta
 from pathlib import Path
-from typing import Dict, List
+from typing import List
 
 import ago
 import click
-import matplotlib.pyplot
-import pendulum
 from appdirs import user_cache_dir
 from dotenv import load_dotenv
-from jinja2 import Environment, FileSystemLoader, StrictUndefined
-from matplotlib.figure import Figure
-from requests_cache import CachedSession
 
-from .zwiftpower.scraper import Scraper
-from . import zwiftracing
-
-from .zp import make_cp, ago_fmt
+from .zwiftpower.auth import CookieStore
+from .zwiftpower.cache import cached_session
+from .zwiftpower.fixtures import FixtureCorpus, Recorder
+from .zwiftpower.history import RaceHistory, is_race, is_ttt
+from .zwiftpower.powermatrix import TeamPowerMatrix
+from .zwiftpower.ratelimit import TokenBucket
+from .zwiftpower.refresh import RefreshPlanner
+from .zwiftpower.scraper import Scraper, Profile
+from .zwiftpower.store import RiderStore
+from . import charts, svgchart, zwiftracing
+from .charts import ChartCache, ChartRenderer, ChartSlots, CPChart, PowerBars
 
 load_dotenv()  # Not a fan of having this dangling here
 
@@ -36,83 +39,54 @@ def filter_catstr(cat):
     }.get(cat, '?')
 
 
-def fig_to_svg(fig: Figure, prolog: bool = False):
-    # Stupid monkey-patch to prevent xml prolog in output
-    if not prolog:
-        import matplotlib.backends.backend_svg as s
-        if s.svgProlog:
-            s.old_svgProlog = s.svgProlog
-            s.svgProlog = ""
-
-    imgdata = io.StringIO()
-    fig.savefig(imgdata, format='svg')
-    imgdata.seek(0)  # rewind the data
-
-    svg_dta = imgdata.read()  # this is svg data
-    matplotlib.pyplot.close(fig)
-
-    if not prolog:
-        s.svgProlog = s.old_svgProlog
-    return svg_dta
-
-
-def filter_cp_svg(riders, type_='wkg', style='default') -> str:
+def cp_chart(riders, type_='wkg', style='default') -> CPChart:
     plots = []
-    title = "90 day CP"
-    ylabel = type_
-
     for rider in riders:
         graph = rider.cp_watts if type_ == 'watts' else rider.cp_wkg
         if graph is None:
             continue
         graph = graph['90days']
-        plots.append([graph.keys(), graph.values(), rider.name])
-    ctx = matplotlib.pyplot.xkcd if style == 'xkcd' else lambda: matplotlib.pyplot.style.context(style)
-
-    with ctx():
-        fig = make_cp(plots, title, ylabel)
-
-    return fig_to_svg(fig, False)
-
-
-def filter_power_bars(riders, type_, period, style='default', direction='horizontal', value_labels=True) -> str:
-    import matplotlib.pyplot as plt
-
-    ctx = matplotlib.pyplot.xkcd if style == 'xkcd' else lambda: matplotlib.pyplot.style.context(style)
-    with ctx():
-        fig = plt.figure()
-        ax = fig.add_subplot(1, 1, 1)
-        ax.set_title("90 day {} power".format(ago_fmt(period, None)))
-        x = []
-        y = []
-        for rider in riders:
-            graph = rider.cp_watts if type_ == 'watts' else rider.cp_wkg
-            if graph is None:
-                continue
-            graph = graph['90days']
-            x.append(rider.name)
-            y.append(graph[period])
-        if direction == 'vertical':
-            ax.bar(x, y)
-            ax.set_ylabel(type_)
-        elif direction == 'horizontal':
-            ax.barh(x, y)
-            d = ax.set_xlabel(type_)
-            if value_labels:
-                for rect in ax.patches:
-                    x, y = rect.get_width(), rect.get_y() + rect.get_height() / 2
-                    label = x
-                    plt.annotate(
-                        label,
-                        (x, y),
-                        xytext=(-10, 0),
-                        textcoords='offset points',
-                        va='center',
-                        ha='right'
-                    )
-        fig.tight_layout()
-
-    return fig_to_svg(fig, False)
+        plots.append((graph.x.tolist(), graph.y.tolist(), rider.name))
+    return CPChart(plots, "90 day CP", type_, style)
+
+
+def power_bars_chart(riders, type_, period, style='default', direction='horizontal', value_labels=True) -> PowerBars:
+    labels = []
+    values = []
+    for rider in riders:
+        graph = rider.cp_watts if type_ == 'watts' else rider.cp_wkg
+        if graph is None:
+            continue
+        labels.append(rider.name)
+        values.append(graph['90days'][period])
+    return PowerBars(labels, values, period, type_, style, direction, value_labels)
+
+
+#: Chart renderers the filters can use: matplotlib in worker processes, or the plain SVG writer in svgchart
+RENDERERS = ('matplotlib', 'svg')
+
+
+def _svg(chart, slots: ChartSlots = None, renderer: str = 'matplotlib') -> str:
+    if renderer not in RENDERERS:
+        raise Exception("Unknown chart renderer {}, use one of: {}".format(renderer, ", ".join(RENDERERS)))
+    if renderer == 'svg':
+        return svgchart.render(chart).decode()
+    if slots is None:
+        return charts.render(chart, 'svg').decode()
+    return slots.add(chart)
+
+
+def filter_cp_svg(riders, type_='wkg', style='default', renderer='matplotlib', slots: ChartSlots = None) -> str:
+    return _svg(cp_chart(riders, type_, style), slots, renderer)
+
+
+def filter_power_bars(riders, type_, period, style='default', direction='horizontal', value_labels=True,
+                      renderer='matplotlib', slots: ChartSlots = None) -> str:
+    return _svg(power_bars_chart(riders, type_, period, style, direction, value_labels), slots, renderer)
+
+
+def filter_power_matrix(riders, durations=TeamPowerMatrix.DEFAULT_DURATIONS, effort='90days') -> TeamPowerMatrix:
+    return TeamPowerMatrix.from_riders(riders, durations, effort)
 
 
 def flag_unicode(flag: str) -> str:
@@ -128,88 +102,15 @@ def flag_unicode(flag: str) -> str:
     return r
 
 
-def is_race(race: Dict) -> bool:
-    return 'TYPE_RACE' in race['f_t']
-
-
-def is_zrl(race: Dict) -> bool:
-    return 'Zwift Racing League'.lower() in race['event_title'].lower()
-
-
-def is_zrl_ttt(race: Dict) -> bool:
-    if not is_zrl(race):
-        return False
-
-    ttt_dates = [
-        # ZRL 20/21 Season 1
-        date(2020, 10, 19), date(2020, 10, 20),  # Week 2
-        date(2020, 11,  2), date(2020, 11,  3),  # Week 4
-        date(2020, 11, 16), date(2020, 11, 17),  # Week 6
-        date(2020, 11, 30), date(2020, 12,  1),  # Week 8
-        date(2020, 12, 15), date(2020, 12, 16),  # Week 10
-        # ZRL 20/21 Season 2
-        date(2021,  1, 18), date(2021,  1, 19),  # Week 2
-        date(2021,  2,  8), date(2021,  2,  9),  # Week 5
-        date(2021,  3,  1), date(2021,  3,  2),  # Week 8
-        # ZRL 20/21 Season 3
-        date(2021,  4,  6), date(2021,  4,  7),  # Week 1
-        date(2021,  4, 27), date(2021,  4, 28),  # Week 4
-        date(2021,  5, 18), date(2021,  5, 19),  # Week 7
-        date(2021,  6,  6), date(2021,  6,  7),  # Playoff TTT
-        # ZRL 21/22 Season 1
-        date(2021,  9, 28), date(2021,  9, 29),  # Week 1
-        date(2021, 10,  8), date(2021, 10,  9),  # Week 7
-        date(2021, 11, 23), date(2021, 11, 24),  # Playoff TTT
-        # ZRL 21/22 Season 2
-        date(2022,  2,  1), date(2022,  2,  2),  # Week 4
-        date(2022,  2, 22), date(2022,  2, 23),  # Week 7
-        date(2022,  3, 12), date(2022,  3, 13),  # Playoff TTT
-        # ZRL 21/22 Season 3
-        date(2022,  4, 12), date(2022,  4, 13),  # Week 2
-        date(2022,  5,  3), date(2022,  5,  4),  # Week 5
-        # ZRL 22/23 Round 1
-        date(2022,  9, 27), date(2022,  9, 28),  # Week 3
-        # ZRL 22/23 Round 2
-        date(2022, 11, 15), date(2022, 11, 16),  # Week 2
-        date(2022, 12,  6), date(2022, 12,  7),  # Week 5
-        # ZRL 22/23 Round 3
-        date(2023,  1, 17), date(2023,  1, 18),  # Week 2
-        date(2023,  2,  7), date(2023,  2,  8),  # Week 5
-        # ZRL 23/24 Round 1
-        date(2023,  9, 26), date(2023,  9, 27),  # Week 3
-        date(2023, 10, 17), date(2023, 10, 18),  # Week 3
-        # ZRL 23/24 Round 2
-        date(2023, 11, 28), date(2023, 11, 29),  # Week 3
-        date(2023, 12, 19), date(2023, 12, 20),  # Week 3
-        # ZRL 23/24 Round 3
-        date(2024,  2,  6), date(2024,  2,  7),  # Week 3
-        date(2024,  2, 27), date(2024,  2, 28),  # Week 3
-        # ZRL 24/25 Round 1
-        date(2024,  9, 10), date(2024,  9, 11),  # Week 1
-        date(2024, 10,  1), date(2024, 10,  2),  # Week 4
-    ]
-    race_date = datetime.utcfromtimestamp(race['event_date'])
-    return race_date.date() in ttt_dates
-
-
-def is_wtrl_ttt(race: Dict) -> bool:
-    return 'WTRL Team Time Trial' in race['event_title']
-
-
-def is_frr_ttt(race: Dict) -> bool:
-    title = race['event_title']
-    return 'FRR' in title and 'TTT' in title
-
-
-def is_ttt(race: Dict) -> bool:
-    return is_wtrl_ttt(race) or is_zrl_ttt(race) or is_frr_ttt(race)
-
-
 def filter_ttts(races):
+    if isinstance(races, RaceHistory):
+        return races.ttts()
     return filter(is_ttt, races)
 
 
 def filter_races(races):
+    if isinstance(races, RaceHistory):
+        return races.races()
     return filter(is_race, races)
 
 
@@ -231,6 +132,15 @@ def filter_csv_dict(row, *args, **kwargs):
     return string_io.read()
 
 
+def prefetch_resources(values) -> List[str]:
+    """The profile resources to prefetch for the --prefetch values given, in order"""
+    if 'none' in values:
+        return []
+    if 'all' in values:
+        return list(Profile.RESOURCES)
+    return list(dict.fromkeys(values))
+
+
 class NamedVarType(click.ParamType):
     name = 'NAME=VALUE'
 
@@ -275,6 +185,7 @@ class Getters:
     @staticmethod
     def riders(scraper: Scraper, ids: List[int]):
         """Return profile(s) directly"""
+        import matplotlib.pyplot
         profiles = [scraper.profile(id_) for id_ in ids]
         return {
             'riders': profiles,
@@ -320,10 +231,27 @@ class Getters:
               help='Save output to file', default="-")
 @click.option('--zwift-user', envvar='ZWIFT_USER', help='Will use environment ZWIFT_USER if set. Supports .env')
 @click.option('--zwift-pass', envvar='ZWIFT_PASS', help='Will use environment ZWIFT_PASS if set. Supports .env')
+@click.option('--concurrency', type=int, default=Scraper.DEFAULT_CONCURRENCY, show_default=True,
+              help='Number of concurrent requests to ZwiftPower')
+@click.option('--rate', type=float, default=30, show_default=True,
+              help='Maximum number of uncached requests to ZwiftPower per minute')
+@click.option('--prefetch', multiple=True, type=click.Choice(list(Profile.RESOURCES) + ['all', 'none']),
+              help='Profile data the template uses, to fetch for all riders in bulk before rendering. May be repeated. '
+                   'Default: none, the template fetches what it reads')
+@click.option('--store', is_flag=True,
+              help='Keep rider data in a local database and reuse it while fresh, instead of re-parsing responses')
+@click.option('--refresh-changed', type=click.Choice(RefreshPlanner.SIGNALS),
+              help='For a team, only fetch profiles and CP again for riders whose team data (team) or latest race '
+                   '(races) changed. Needs --store')
+@click.option('--metrics', 'metrics_file', type=click.Path(dir_okay=False, writable=True),
+              help='Write scraper metrics to this file: JSON if it ends in .json, a Prometheus textfile otherwise')
+@click.option('--record', type=click.Path(file_okay=False),
+              help='Save the ZwiftPower responses, scrubbed of credentials, to this fixture directory')
 @click.option('--var', 'tplvars', multiple=True, default=[], help='Variable to pass to the template, may be repeated', type=NamedVarType())
 @click.argument('rider_list', type=SourceType())
 @click.argument('template')
-def main(clear_cache, debug, zwift_user, zwift_pass, tplvars, output_file, rider_list, template):
+def main(clear_cache, debug, zwift_user, zwift_pass, concurrency, rate, prefetch, store, refresh_changed,
+         metrics_file, record, tplvars, output_file, rider_list, template):
     """
     Output some sort of rider list with data downloaded from ZwiftPower
 
@@ -338,17 +266,34 @@ def main(clear_cache, debug, zwift_user, zwift_pass, tplvars, output_file, rider
     - TEMPLATE: Jinja2 template to use to generate the output. Will be
                 searched for either in CWD or from builtin templates.
     """
+    # Imported here rather than at the top, so --help and usage errors don't wait for them
+    import pendulum
+    from jinja2 import Environment, FileSystemLoader, StrictUndefined
+
     level = logging.DEBUG if debug else logging.INFO
     logging.basicConfig(level=level)
     source, id_ = rider_list
+    if refresh_changed and not (store and source == 'team'):
+        raise click.UsageError("--refresh-changed needs --store and a team")
 
-    expire_after = timedelta(hours=12)
     cache_dir = Path(user_cache_dir('riderlist'))
     cache_dir.mkdir(parents=True, exist_ok=True)
-    cached = CachedSession(str(cache_dir / 'zp_cache'), expire_after=expire_after)
+    cached = cached_session(cache_dir / 'zp_cache')
+    cookie_store = CookieStore(cache_dir / 'zp_cookies.json')
+    rider_store = RiderStore(cache_dir / 'riders.sqlite') if store else None
+    chart_cache = ChartCache(cache_dir / 'charts')
     if clear_cache:
         cached.cache.clear()
-    s = Scraper(username=zwift_user, password=zwift_pass, sleep=2.0, session=cached)
+        cookie_store.clear()
+        chart_cache.clear()
+        if rider_store is not None:
+            rider_store.clear()
+    s = Scraper(username=zwift_user, password=zwift_pass, session=cached,
+                rate_limiter=TokenBucket(per_minute=rate, burst=concurrency), concurrency=concurrency,
+                cookie_store=cookie_store, store=rider_store)
+    s.metrics.register('chart_cache', chart_cache.stats_copy)
+    if record:
+        Recorder(FixtureCorpus(record), secrets=[zwift_user, zwift_pass]).attach(cached)
     ctx = {
         'scraper': s,
         'now': pendulum.now()
@@ -364,18 +309,35 @@ def main(clear_cache, debug, zwift_user, zwift_pass, tplvars, output_file, rider
     env.filters['ttts'] = filter_ttts
     env.filters['races'] = filter_races
     env.filters['flag2unicode'] = flag_unicode
-    env.filters['cp_svg'] = filter_cp_svg
+    renderer = ChartRenderer(cache=chart_cache)
+    slots = ChartSlots(renderer)
+    env.filters['cp_svg'] = functools.partial(filter_cp_svg, slots=slots)
     env.filters['sdur'] = filter_sdur
-    env.filters['powerbars_svg'] = filter_power_bars
+    env.filters['powerbars_svg'] = functools.partial(filter_power_bars, slots=slots)
     env.filters['csv_dict'] = filter_csv_dict
+    env.filters['power_matrix'] = filter_power_matrix
 
     tpl = env.get_template(template)
-    with cached.cache_disabled():
+    # The rider list itself (roster, signups, results) is always fetched, so the output is current. The profiles
+    # of the riders on it are what the cache and the store save requests on.
+    with cached.cache_disabled(), s.store_disabled():
         ctx.update(getattr(Getters, source)(s, id_))
-    result = tpl.render(args=dict(tplvars), **ctx)
+    if refresh_changed:
+        plan = RefreshPlanner(s, refresh_changed).refresh(ctx['team'])
+        logging.info("%d riders changed, %d unchanged", len(plan.changed), len(plan.unchanged))
+    # Fetch what the template needs up front, so rendering doesn't wait on requests one by one
+    resources = prefetch_resources(prefetch)
+    if resources:
+        s.prefetch_profiles([r if isinstance(r, Profile) else r.profile for r in ctx['riders']], resources)
+    # Charts are rendered by worker processes while the rest of the template is, and put in at the end
+    with renderer:
+        result = slots.fill(tpl.render(args=dict(tplvars), **ctx))
 
     with click.open_file(output_file, mode='w') as f:
         f.write(result)
+    logging.debug("Rate limiter: %r", dict(s.rate_limiter.stats))
+    if metrics_file:
+        s.metrics.write(metrics_file)
 
 
 if __name__ == "__main__":
@@ -5,6 +5,7 @@ import typing
 from discord import Member
 from discord.ext import commands
 
+from . import executor
 from .googledocs.ttt_sheet import FindTttTeam, SignupRider, RemoveSignup
 from .googledocs.zrl import ZrlSignups, ZrlTeam, GetDiscordNames
 
@@ -13,14 +14,18 @@ logger = logging.getLogger(__name__)
 
 class Sheet(commands.Cog):
 
+    #: Seconds before a command gives up on the Google API
+    TIMEOUT = 60
+
     def __init__(self, bot):
         self.bot = bot
+        self.blocking = executor.for_bot(bot)
         self.discord_zid_map = None
 
     @commands.command(name='zrl', help='Shares the information to sign up for Backpedal ZRL teams')
     async def zrl(self, ctx):
         user = str(ctx.author).split('#')[0]
-        current_signups = ZrlSignups()
+        current_signups = await self.blocking.run(ZrlSignups, timeout=self.TIMEOUT)
         message='```Hey ' + user + '' \
                 '\nFind the ZRL sign-up form at: ' \
                 '```<https://forms.gle/uP7WYfVXVR6Wzpdg6>'
@@ -33,10 +38,11 @@ class Sheet(commands.Cog):
                 teams = []
                 for i in range(1,3):
                     tname = 'BAKPDL ' + str(i)
-                    teams.append(FindTttTeam(teamname=tname))
+                    teams.append(await self.blocking.run(FindTttTeam, teamname=tname, timeout=self.TIMEOUT))
                 message = '```Showing all Backpedal TTT team signups\n' + '\n'.join([team for team in teams]) + '```'
             else:
-                message = '```' + FindTttTeam(teamname=' '.join(args)) + '```'
+                team = await self.blocking.run(FindTttTeam, teamname=' '.join(args), timeout=self.TIMEOUT)
+                message = '```' + team + '```'
             await ctx.send(message)
         except Exception as e:
             traceback.print_exc()
@@ -45,7 +51,7 @@ class Sheet(commands.Cog):
     @commands.command(name='ttt-signup', help='Sign up for next week\'s WTRL TTT')
     async def ttt_signup(self, ctx, *, name: typing.Optional[str]):
         try:
-            SignupRider(ctx.author, name)
+            await self.blocking.run(SignupRider, ctx.author, name, timeout=self.TIMEOUT)
             msg = "You are now signed up"
             if name is not None:
                 msg += ". You can now simply use !ttt-signup to sign up as " + name
@@ -57,7 +63,7 @@ class Sheet(commands.Cog):
     @commands.command(name='ttt-signoff', help='Cancel sign-up for next week\'s WTRL TTT')
     async def ttt_signoff(self, ctx):
         try:
-            RemoveSignup(ctx.author)
+            await self.blocking.run(RemoveSignup, ctx.author, timeout=self.TIMEOUT)
             await ctx.message.reply("You are no longer signed up")
         except Exception as e:
             traceback.print_exc()
@@ -67,11 +73,12 @@ class Sheet(commands.Cog):
     async def zrl_team(self, ctx, *args):
         if len(args) != 1:
             if len(args) == 2 and args[1] == 'full':
-                message = '```' + ZrlTeam(teamtag=args[0], full=True) + '```'
+                team = await self.blocking.run(ZrlTeam, teamtag=args[0], full=True, timeout=self.TIMEOUT)
+                message = '```' + team + '```'
             else:
                 message = '```Please type in !zrl-team <teamtag> "full". example: !zrl-team A1```'
         else:
-            message = '```' + ZrlTeam(teamtag=args[0]) + '```'
+            message = '```' + await self.blocking.run(ZrlTeam, teamtag=args[0], timeout=self.TIMEOUT) + '```'
         await ctx.send(message)
 
     async def discord_to_zwift_id(self, ctx, lookfor: Member) -> int:
@@ -80,7 +87,7 @@ class Sheet(commands.Cog):
             return lookup_map[lookfor.id][1]
 
     async def discord_zwift_id_map(self, ctx):
-        names = GetDiscordNames()
+        names = await self.blocking.run(GetDiscordNames, timeout=self.TIMEOUT)
         converter = commands.MemberConverter()
         if self.discord_zid_map is None:
             self.discord_zid_map = {}
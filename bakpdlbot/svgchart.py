@@ -0,0 +1,186 @@
+"""
+A small SVG writer for the CP curves and power bars of :mod:`.charts`, for when loading matplotlib costs more than
+drawing the chart. Styles other than the default aren't supported and are ignored.
+"""
+import math
+from html import escape
+from typing import List, Optional, Sequence, Tuple
+
+from .charts import CP_TICKS, Chart, CPChart, PowerBars, ago_fmt
+
+WIDTH = 640
+HEIGHT = 480
+MARGIN = {'top': 40, 'right': 20, 'bottom': 50, 'left': 60}
+FONT = 'font-family="DejaVu Sans, Bitstream Vera Sans, Arial, sans-serif"'
+#: matplotlib's default color cycle
+COLORS = ('#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22',
+          '#17becf')
+#: Rough width of a character at 10px, for making room for labels
+CHAR_WIDTH = 6.5
+
+
+def nice_ticks(low: float, high: float, count: int = 6) -> List[float]:
+    """Round tick values (1, 2 or 5 times a power of ten apart) covering ``low`` to ``high``"""
+    if high <= low:
+        high = low + 1
+    raw = (high - low) / count
+    magnitude = 10 ** math.floor(math.log10(raw))
+    step = next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= raw)
+    start = math.floor(low / step) * step
+    ticks = []
+    value = start
+    while value < high + step / 2:
+        ticks.append(round(value, 10))
+        value += step
+    return ticks
+
+
+def fmt_number(value: float) -> str:
+    return '{:g}'.format(value)
+
+
+class Frame:
+    """Maps data coordinates to the plot area of the SVG, which spans ``left``..``right`` and ``top``..``bottom``"""
+
+    def __init__(self, x_range: Tuple[float, float], y_range: Tuple[float, float], log_x: bool = False,
+                 left: float = MARGIN['left']):
+        self.left = left
+        self.right = WIDTH - MARGIN['right']
+        self.top = MARGIN['top']
+        self.bottom = HEIGHT - MARGIN['bottom']
+        self.log_x = log_x
+        self.x0, self.x1 = map(self._tx, x_range)
+        self.y0, self.y1 = y_range
+
+    def _tx(self, x: float) -> float:
+        return math.log10(x) if self.log_x else x
+
+    def x(self, value: float) -> float:
+        return self.left + (self._tx(value) - self.x0) / ((self.x1 - self.x0) or 1) * (self.right - self.left)
+
+    def y(self, value: float) -> float:
+        return self.bottom - (value - self.y0) / ((self.y1 - self.y0) or 1) * (self.bottom - self.top)
+
+
+def _text(x: float, y: float, text: str, anchor: str = 'middle', size: int = 10, extra: str = '') -> str:
+    return '<text x="{:.1f}" y="{:.1f}" text-anchor="{}" font-size="{}" {}{}>{}</text>'.format(
+        x, y, anchor, size, FONT, extra, escape(str(text)))
+
+
+def _document(title: str, body: List[str]) -> bytes:
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{1}" viewBox="0 0 {0} {1}">'
+             .format(WIDTH, HEIGHT),
+             '<rect width="100%" height="100%" fill="white"/>',
+             _text(WIDTH / 2, MARGIN['top'] - 12, title, size=12)]
+    parts.extend(body)
+    parts.append('</svg>')
+    return '\n'.join(parts).encode()
+
+
+def _axes(frame: Frame) -> str:
+    return '<rect x="{:.1f}" y="{:.1f}" width="{:.1f}" height="{:.1f}" fill="none" stroke="black"/>'.format(
+        frame.left, frame.top, frame.right - frame.left, frame.bottom - frame.top)
+
+
+def _y_axis(frame: Frame, ticks: Sequence[float], label: str, grid: bool) -> List[str]:
+    parts = []
+    for tick in ticks:
+        y = frame.y(tick)
+        if grid:
+            parts.append('<line x1="{:.1f}" x2="{:.1f}" y1="{:.1f}" y2="{:.1f}" stroke="#b0b0b0" stroke-width="0.8"/>'
+                         .format(frame.left, frame.right, y, y))
+        parts.append(_text(frame.left - 5, y + 3.5, fmt_number(tick), 'end'))
+    x = 14
+    y = (frame.top + frame.bottom) / 2
+    parts.append(_text(x, y, label, extra=' transform="rotate(-90 {:.1f} {:.1f})"'.format(x, y)))
+    return parts
+
+
+def _segments(xs: Sequence[float], ys: Sequence[Optional[float]]) -> List[List[Tuple[float, float]]]:
+    """Split a line where values are missing, like matplotlib does"""
+    segments = [[]]
+    for x, y in zip(xs, ys):
+        if y is None or x <= 0 or (isinstance(y, float) and math.isnan(y)):
+            if segments[-1]:
+                segments.append([])
+        else:
+            segments[-1].append((x, y))
+    return [s for s in segments if s]
+
+
+def cp_svg(chart: CPChart) -> bytes:
+    """CP curves on a log time scale with a legend, like :func:`.charts.make_cp`"""
+    lines = [(_segments(x, y), label) for x, y, label in chart.plots]
+    points = [p for segments, _ in lines for s in segments for p in s]
+    x_max = max([x for x, _ in points] + [10])
+    values = [y for _, y in points] or [0, 1]
+    y_ticks = nice_ticks(min(values), max(values))
+    frame = Frame((1, x_max), (y_ticks[0], y_ticks[-1]), log_x=True)
+
+    body = _y_axis(frame, y_ticks, chart.ylabel, grid=True)
+    for tick in CP_TICKS:
+        if tick > x_max:
+            break
+        x = frame.x(tick)
+        body.append('<line x1="{:.1f}" x2="{:.1f}" y1="{:.1f}" y2="{:.1f}" stroke="#b0b0b0" stroke-width="0.8"/>'
+                    .format(x, x, frame.top, frame.bottom))
+        body.append(_text(x, frame.bottom + 14, ago_fmt(tick, None)))
+    for i, (segments, _) in enumerate(lines):
+        for segment in segments:
+            body.append('<polyline fill="none" stroke="{}" stroke-width="1.5" points="{}"/>'.format(
+                COLORS[i % len(COLORS)], ' '.join('{:.1f},{:.1f}'.format(frame.x(x), frame.y(y)) for x, y in segment)))
+    body.append(_axes(frame))
+
+    if lines:
+        width = 40 + CHAR_WIDTH * max(len(str(label)) for _, label in lines)
+        left = frame.right - 8 - width
+        body.append('<rect x="{:.1f}" y="{:.1f}" width="{:.1f}" height="{}" fill="white" fill-opacity="0.8" '
+                    'stroke="#cccccc" rx="3"/>'.format(left, frame.top + 8, width, 8 + 16 * len(lines)))
+        for i, (_, label) in enumerate(lines):
+            y = frame.top + 20 + 16 * i
+            body.append('<line x1="{:.1f}" x2="{:.1f}" y1="{:.1f}" y2="{:.1f}" stroke="{}" stroke-width="1.5"/>'
+                        .format(left + 6, left + 26, y, y, COLORS[i % len(COLORS)]))
+            body.append(_text(left + 32, y + 3.5, label, 'start'))
+    return _document(chart.title, body)
+
+
+def power_bars_svg(chart: PowerBars) -> bytes:
+    """Bars per rider, like :func:`.charts.make_power_bars`. Horizontal bars list the first rider at the bottom."""
+    values = [0 if v is None else v for v in chart.values]
+    ticks = nice_ticks(min(values + [0]), max(values + [0]))
+    title = "90 day {} power".format(ago_fmt(chart.period, None))
+    n = max(len(values), 1)
+    body = []
+    if chart.direction == 'vertical':
+        frame = Frame((0, n), (ticks[0], ticks[-1]))
+        body.extend(_y_axis(frame, ticks, chart.unit, grid=False))
+        slot = (frame.right - frame.left) / n
+        for i, (label, value) in enumerate(zip(chart.labels, values)):
+            x = frame.left + slot * (i + 0.1)
+            top = frame.y(max(value, 0))
+            body.append('<rect x="{:.1f}" y="{:.1f}" width="{:.1f}" height="{:.1f}" fill="{}"/>'.format(
+                x, top, slot * 0.8, abs(frame.y(value) - frame.y(0)), COLORS[0]))
+            body.append(_text(x + slot * 0.4, frame.bottom + 14, label))
+    else:
+        left = max(MARGIN['left'], 10 + CHAR_WIDTH * max((len(str(label)) for label in chart.labels), default=0))
+        frame = Frame((ticks[0], ticks[-1]), (0, n), left=left)
+        slot = (frame.bottom - frame.top) / n
+        for tick in ticks:
+            body.append(_text(frame.x(tick), frame.bottom + 14, fmt_number(tick)))
+        body.append(_text((frame.left + frame.right) / 2, HEIGHT - 16, chart.unit))
+        for i, (label, value) in enumerate(zip(chart.labels, values)):
+            y = frame.bottom - slot * (i + 0.9)
+            x = frame.x(min(value, 0))
+            body.append('<rect x="{:.1f}" y="{:.1f}" width="{:.1f}" height="{:.1f}" fill="{}"/>'.format(
+                x, y, abs(frame.x(value) - frame.x(0)), slot * 0.8, COLORS[0]))
+            body.append(_text(frame.left - 5, y + slot * 0.4 + 3.5, label, 'end'))
+            if chart.value_labels:
+                body.append(_text(frame.x(value) - 10, y + slot * 0.4 + 3.5, fmt_number(value), 'end'))
+    body.append(_axes(frame))
+    return _document(title, body)
+
+
+def render(chart: Chart) -> bytes:
+    if isinstance(chart, CPChart):
+        return cp_svg(chart)
+    return power_bars_svg(chart)
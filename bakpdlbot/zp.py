@@ -1,48 +1,33 @@
+import asyncio
 import io
 import logging
 import os
+import re
+import traceback
 import typing
-from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
 
-import ago
 import discord
-import matplotlib
-import matplotlib.pyplot as plt
 from appdirs import user_cache_dir
 from discord.ext import commands
 from discord.ext.commands import BadArgument
-from requests_cache import CachedSession
-
+from tabulate import tabulate
+
+from . import executor
+from .charts import ChartCache, ChartRenderer, CPChart, ago_fmt
+from .executor import CommandTimeout
+from .zwiftpower.asyncscraper import AsyncScraper
+from .zwiftpower.auth import CookieStore
+from .zwiftpower.cache import cached_session
+from .zwiftpower.powermatrix import TeamPowerMatrix
+from .zwiftpower.ratelimit import TokenBucket
 from .zwiftpower.scraper import Scraper, Profile
+from .zwiftpower.store import RiderStore
 
 logger = logging.getLogger(__name__)
 
 
-def ago_fmt(v, _):
-    td = timedelta(seconds=int(v))
-    return ago.human(td, past_tense='{}', abbreviate=True).replace(', ', '')
-
-
-def make_cp(plots, title, ylabel):
-    fig = plt.figure()
-    ax = fig.add_subplot(1, 1, 1)
-    ax.set_title(title)
-    ax.set_xscale('log')
-    ax.set_ylabel(ylabel)
-    ax.set_xticks([1, 2, 5, 10, 30, 60, 120, 300, 600, 1200, 3600, 7200, 14400, 36000])
-    ax.set_xticks([], minor=True)
-    formatter = matplotlib.ticker.FuncFormatter(ago_fmt)
-    ax.xaxis.set_major_formatter(formatter)
-    ax.grid(visible=True)
-    for x, y, label in plots:
-        line = ax.plot(x, y, label=label)
-    ax.legend(loc='upper right')
-    ax.set_xlim(left=1, right=None)
-    return fig
-
-
 def graph_type_conv(arg: str):
     a = arg.strip().lower()
     if a in ('wkg', 'w/kg'):
@@ -53,20 +38,58 @@ def graph_type_conv(arg: str):
         raise BadArgument("Not a valid graph type: {}".format(arg))
 
 
+def duration_conv(arg: str) -> int:
+    m = re.fullmatch(r'(?P<value>[0-9]+)\s*(?P<unit>s|m|min|h)?', arg.strip().lower())
+    if not m:
+        raise BadArgument("Not a valid duration: {}".format(arg))
+    return int(m.group('value')) * {None: 1, 's': 1, 'm': 60, 'min': 60, 'h': 3600}[m.group('unit')]
+
+
 class ZwiftPower(commands.Cog):
 
+    #: Seconds before !cp and !rank give up
+    CP_TIMEOUT = 60
+    RANK_TIMEOUT = 180
+
     def __init__(self, bot):
         self.bot = bot
+        self.blocking = executor.for_bot(bot)
         cache_dir = Path(user_cache_dir('bakpdlbot'))
         cache_dir.mkdir(parents=True, exist_ok=True)
-        expire_after = timedelta(hours=12)
-        cached = CachedSession(str(cache_dir / 'zp_cache'), expire_after=expire_after)
+        cached = cached_session(cache_dir / 'zp_cache')
         load_dotenv()
         ZWIFTUSER = os.getenv('ZWIFT_USER')
         ZWIFTPASS = os.getenv('ZWIFT_PASS')
         ZWIFTTEAM = os.getenv('ZP_TEAM_ID')
-        self.scraper = Scraper(sleep=1.0, username=ZWIFTUSER, password=ZWIFTPASS, session=cached)
+        self.scraper = Scraper(username=ZWIFTUSER, password=ZWIFTPASS, session=cached,
+                               rate_limiter=TokenBucket(per_minute=60, burst=5),
+                               cookie_store=CookieStore(cache_dir / 'zp_cookies.json'),
+                               store=RiderStore(cache_dir / 'zp_riders.sqlite'))
+        self.ascraper = AsyncScraper(self.scraper)
         self.team = self.scraper.team(int(ZWIFTTEAM))
+        self.charts = ChartRenderer(cache=ChartCache(cache_dir / 'charts'))
+        self.scraper.metrics.register('chart_cache', self.charts.cache.stats_copy)
+
+    async def cog_load(self):
+        # Start the chart workers in the background, so the first !cp doesn't wait for them
+        future = asyncio.get_running_loop().run_in_executor(None, self.charts.warm_up)
+        future.add_done_callback(self._warmed_up)
+
+    @staticmethod
+    def _warmed_up(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Could not start the chart workers", exc_info=future.exception())
+
+    def cog_unload(self):
+        self.ascraper.close()
+        self.charts.close()
+        self.scraper.store.close()
+
+    async def cog_command_error(self, ctx, error):
+        if isinstance(getattr(error, 'original', None), CommandTimeout):
+            await ctx.message.reply(str(error.original))
+        else:
+            traceback.print_exception(type(error), error, error.__traceback__)
 
     @commands.command(name="cp", help="Show Critical Power")
     async def cp(self, ctx, graph_type: typing.Optional[graph_type_conv], *names):
@@ -85,19 +108,36 @@ class ZwiftPower(commands.Cog):
         async with ctx.typing():
             if len(ids) > 0:
                 plots = []
-                for profile in [self.scraper.profile(id_) for id_ in ids]:
+                cp_resource = 'cp_watts' if graph_type == 'watt' else 'cp_wkg'
+                profiles = await self.blocking.wait(self.ascraper.profiles(ids, resources=('html', cp_resource)),
+                                                    timeout=self.CP_TIMEOUT, name='cp')
+                for profile in profiles:
                     # Make sure plots come out in order
                     cp = profile.cp_watts if graph_type == 'watt' else profile.cp_wkg
-                    cp_data = sorted(cp['90days'].items(), key=lambda i: i[0])
-                    plots.append(([i[0] for i in cp_data], [i[1] for i in cp_data], profile.name))
-                fig = make_cp(plots, "90 day critical power", graph_type)
-                fn = "cp_{}.png".format("_".join(map(str, ids)))
-                file = self._fig_to_file(fig, fn)
-                matplotlib.pyplot.close(fig)
+                    plots.append((cp['90days'].x.tolist(), cp['90days'].y.tolist(), profile.name))
+                chart = CPChart(plots, "90 day critical power", graph_type)
+                png = await self.blocking.wait(self.charts.render_async(chart), timeout=self.CP_TIMEOUT,
+                                               name='cp chart')
+                file = discord.File(io.BytesIO(png), filename="cp_{}.png".format("_".join(map(str, ids))))
             else:
                 file = None
             await ctx.send("\n".join(errors), file=file)
 
+    @commands.command(name="rank", help="Rank the team by 90 day power at a duration, e.g. !rank 5m wkg")
+    async def rank(self, ctx, duration: duration_conv, graph_type: typing.Optional[graph_type_conv] = 'w/kg',
+                   count: int = 15):
+        type_ = 'watts' if graph_type == 'watt' else 'wkg'
+        async with ctx.typing():
+            matrix = await self.blocking.run(TeamPowerMatrix.from_team, self.team, durations=(duration,),
+                                             timeout=self.RANK_TIMEOUT)
+            ranking = matrix.best(duration, type_, n=count)
+            pct = matrix.percentiles(type_)[:, 0]
+            rows = [(i + 1, rider.name, round(value, 1 if type_ == 'wkg' else 0),
+                     '{:.0f}'.format(pct[matrix.riders.index(rider)]))
+                    for i, (rider, value) in enumerate(ranking)]
+            table = tabulate(rows, headers=['#', 'Name', graph_type, 'pct'])
+        await ctx.send("90 day {} power\n```{}```".format(ago_fmt(duration, None), table))
+
     def find_team_member(self, q: str) -> typing.List[Profile]:
         logger.debug("Lookup <%s>", q)
 
@@ -110,7 +150,14 @@ class ZwiftPower(commands.Cog):
         def contains(q: str):
             return lambda m: q.lower() in m.name.lower()
 
+        # Loads the team (from the store while fresh), so its members are in the store's index
         members = list(self.team.members)
+        if self.scraper.store is not None:
+            # SQLite only folds case for ASCII, so names like Ørjan are left to the matchers below
+            ids = self.scraper.store.find_riders(q, team_id=self.team.id)
+            if ids:
+                logger.debug("Found match(es) in store for <%s>", q)
+                return [self.scraper.profile(id_) for id_ in ids]
         for match_fn in [exact, startswith, contains]:
             matches = list(filter(match_fn(q), members))
             if len(matches) > 0:
@@ -118,13 +165,6 @@ class ZwiftPower(commands.Cog):
                 return [m.profile for m in matches]
         return []
 
-    @staticmethod
-    def _fig_to_file(fig, fn):
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png')
-        buf.seek(0)
-        return discord.File(buf, filename=fn)
-
 
 async def setup(bot):
     await bot.add_cog(ZwiftPower(bot))
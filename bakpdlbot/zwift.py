@@ -1,5 +1,6 @@
 import logging
 import re
+import traceback
 from datetime import timedelta
 
 import ago
@@ -7,10 +8,11 @@ import discord
 from discord import Member, PartialMessageable
 from discord.ext import commands
 
-from . import zwiftcom
+from . import executor, zwiftcom
+from .executor import CommandTimeout
 from .sheet import Sheet
 from .zwiftcom import Event
-from .zwiftcom.const import items as list_of_items
+from .zwiftcom import const
 
 
 
@@ -199,16 +201,30 @@ def get_tag_value(tag, is_item=True):
 
 def get_item(item_id):
     """Obtain item name from item id"""
-    if item_id in list_of_items:
-        return list_of_items[item_id]['name']
+    if item_id in const.items:
+        return const.items[item_id]['name']
     return f"Unknown ({item_id})"
 
 class Zwift(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        self.blocking = executor.for_bot(bot)
         self.emojis = None
 
+    async def cog_load(self):
+        # Event embeds look up routes and items in the game dictionary, download it off the event loop
+        try:
+            await self.blocking.run(const.game_dictionary, timeout=60)
+        except Exception:
+            logger.exception("Game dictionary not loaded, will try again on the next event link")
+
+    async def cog_command_error(self, ctx, error):
+        if isinstance(getattr(error, 'original', None), CommandTimeout):
+            await ctx.message.reply(str(error.original))
+        else:
+            traceback.print_exception(type(error), error, error.__traceback__)
+
     @commands.Cog.listener("on_message")
     async def zwift_link_embed(self, message):
         if self.emojis is None:
@@ -222,7 +238,8 @@ class Zwift(commands.Cog):
         for m in eventlink.finditer(message.content):
             eid = int(m.group('eid'))
             secret = m.group('secret')
-            event = zwiftcom.get_event(eid, secret)
+            event = await self.blocking.run(zwiftcom.get_event, eid, secret, timeout=30)
+            await self.blocking.run(const.game_dictionary, timeout=30)
             embed = await event_embed(message, event, emojis=self.emojis)
             await message.reply(embed=embed)
 
@@ -232,7 +249,8 @@ class Zwift(commands.Cog):
         results = {}
         for query, ids in (await self.zwift_id_lookup(ctx, *args)).items():
             if ids is not None and 0 < len(ids) <= 5:
-                results[query] = " / ".join(["{p.id} ({p.name})".format(p=zp.scraper.profile(id_)) for id_ in ids])
+                profiles = await self.blocking.wait(zp.ascraper.profiles(ids), name='zwiftid')
+                results[query] = " / ".join(["{p.id} ({p.name})".format(p=p) for p in profiles])
             else:
                 results[query] = "Not found or too many results"
         await ctx.send("\n".join(["{0}: {1}".format(q, r) for q, r in results.items()]))
@@ -261,7 +279,7 @@ class Zwift(commands.Cog):
                 pass
 
             # See if we can find a match for the string on the ZP team
-            team_member_results = zp.find_team_member(query)
+            team_member_results = await self.blocking.run(zp.find_team_member, query)
             if len(team_member_results) > 0:
                 results[query] = [p.id for p in team_member_results]
                 continue
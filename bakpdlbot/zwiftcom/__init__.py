@@ -1,2 +1,8 @@
+from . import const
 from .const import *
 from .events import Event, get_event
+
+
+def __getattr__(name):
+    # The game dictionary sections are loaded by const on first use
+    return getattr(const, name)
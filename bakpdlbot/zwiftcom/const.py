@@ -1,9 +1,14 @@
+import functools
+import logging
+import threading
+import time
 from datetime import timedelta
 from pathlib import Path
 
 from appdirs import user_cache_dir
 from requests import Session
-from requests_cache import CachedSession
+
+logger = logging.getLogger(__name__)
 
 # These aren't defined in the Game dictionary
 worlds = {
@@ -26,6 +31,7 @@ worlds = {
 def retrieve_data(use_cache=True):
     url = 'https://www.zwift.com/zwift-web-pages/gamedictionary'
     if use_cache:
+        from requests_cache import CachedSession
         cache_dir = Path(user_cache_dir('bakpdlbot'))
         cache_dir.mkdir(parents=True, exist_ok=True)
         expire_after = timedelta(hours=12)
@@ -124,54 +130,77 @@ def object_key(o):
     return int(o['$']['signature'])
 
 
-gamedictionary = {}
-for plural, sublist in retrieve_data().items():
-    if plural == '$':
-        continue
-    singular = list(sublist[0].keys())[0]
-    gamedictionary[plural.lower()] = {object_key(r): convert_item(r['$'], singular) for r in sublist[0][singular]}
-
-# Add segments on routes for no particular reason
-for segment in gamedictionary['segments'].values():
-    for route in segment.get('onRoutes', []):
-        if route not in gamedictionary['routes']:
+#: Sections of the game dictionary available as module attributes, e.g. ``const.routes``
+SECTIONS = ('routes', 'segments', 'jerseys', 'runshirts', 'runshorts', 'runshoes', 'bikeshoes', 'bikefrontwheels',
+            'bikerearwheels', 'bikeframes', 'paintjobs', 'socks', 'glasses', 'headgears', 'achievements', 'challenges',
+            'notable_moment_types', 'unlockable_categories', 'training_plans', 'portal_segments')
+
+#: The sections that make up :data:`items`
+ITEM_SECTIONS = ('bikeframes', 'jerseys', 'headgears', 'socks', 'paintjobs', 'glasses', 'bikeshoes', 'bikefrontwheels',
+                 'bikerearwheels', 'runshirts', 'runshorts', 'runshoes')
+
+
+#: Seconds before downloading the game dictionary is tried again after it failed
+RETRY_AFTER = 300
+
+_game_dictionary = None
+#: (time.monotonic() of the failure, exception) of the last failed download
+_failure = None
+_lock = threading.Lock()
+
+
+def game_dictionary() -> dict:
+    """
+    Zwift's game dictionary, downloaded (or read from the cache) on first use rather than at import. This blocks,
+    so the bot loads it off the event loop when its cog loads. After a failure, it raises right away without trying
+    again for :data:`RETRY_AFTER` seconds.
+    """
+    global _game_dictionary, _failure
+    with _lock:
+        if _game_dictionary is None:
+            if _failure is not None and time.monotonic() - _failure[0] < RETRY_AFTER:
+                raise Exception("Zwift game dictionary unavailable, will retry later") from _failure[1]
+            try:
+                _game_dictionary = _load_game_dictionary()
+            except Exception as e:
+                logger.warning("Could not load the Zwift game dictionary: %s", e)
+                _failure = (time.monotonic(), e)
+                raise
+            _failure = None
+        return _game_dictionary
+
+
+def _load_game_dictionary() -> dict:
+    gamedictionary = {}
+    for plural, sublist in retrieve_data().items():
+        if plural == '$':
             continue
-        if 'segments' not in gamedictionary['routes'][route]:
-            gamedictionary['routes'][route]['segments'] = []
-        gamedictionary['routes'][route]['segments'].append(segment['signature'])
-
-routes = gamedictionary['routes']
-segments = gamedictionary['segments']
-jerseys = gamedictionary['jerseys']
-runshirts = gamedictionary['runshirts']
-runshorts = gamedictionary['runshorts']
-runshoes = gamedictionary['runshoes']
-bikeshoes = gamedictionary['bikeshoes']
-bikefrontwheels = gamedictionary['bikefrontwheels']
-bikerearwheels = gamedictionary['bikerearwheels']
-bikeframes = gamedictionary['bikeframes']
-paintjobs = gamedictionary['paintjobs']
-socks = gamedictionary['socks']
-glasses = gamedictionary['glasses']
-headgears = gamedictionary['headgears']
-achievements = gamedictionary['achievements']
-challenges = gamedictionary['challenges']
-notable_moment_types = gamedictionary['notable_moment_types']
-unlockable_categories = gamedictionary['unlockable_categories']
-training_plans = gamedictionary['training_plans']
-portal_segments = gamedictionary['portal_segments']
-
-items = {
-    **bikeframes,
-    **jerseys,
-    **headgears,
-    **socks,
-    **paintjobs,
-    **glasses,
-    **bikeshoes,
-    **bikefrontwheels,
-    **bikerearwheels,
-    **runshirts,
-    **runshorts,
-    **runshoes
-}
+        singular = list(sublist[0].keys())[0]
+        gamedictionary[plural.lower()] = {object_key(r): convert_item(r['$'], singular) for r in sublist[0][singular]}
+
+    # Add segments on routes for no particular reason
+    for segment in gamedictionary['segments'].values():
+        for route in segment.get('onRoutes', []):
+            if route not in gamedictionary['routes']:
+                continue
+            if 'segments' not in gamedictionary['routes'][route]:
+                gamedictionary['routes'][route]['segments'] = []
+            gamedictionary['routes'][route]['segments'].append(segment['signature'])
+    return gamedictionary
+
+
+@functools.lru_cache(maxsize=None)
+def all_items() -> dict:
+    """Everything a rider can wear or ride, by signature"""
+    gamedictionary = game_dictionary()
+    return {k: v for section in ITEM_SECTIONS for k, v in gamedictionary[section].items()}
+
+
+def __getattr__(name):
+    if name == 'gamedictionary':
+        return game_dictionary()
+    if name == 'items':
+        return all_items()
+    if name in SECTIONS:
+        return game_dictionary()[name]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
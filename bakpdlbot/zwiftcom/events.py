@@ -5,7 +5,7 @@ from abc import ABC
 import pendulum
 import requests
 
-from .const import worlds, routes
+from . import const
 
 logger = logging.getLogger(__name__)
 
@@ -39,7 +39,7 @@ class Eventish(ABC):
 
     @property
     def route(self):
-        route = routes.get(self.route_id)
+        route = const.routes.get(self.route_id)
         if route is None:
             logger.warning("Unknown route id: %s", self.route_id)
             route = 'Unknown'
@@ -0,0 +1,55 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List
+
+from requests import Response
+
+from .scraper import Fetchable, Profile, Race, Scraper, Team
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncScraper:
+    """
+    asyncio front-end for a :class:`Scraper`.
+
+    Requests are run on a thread pool using the wrapped scraper, so the session, cache and login are shared with
+    any synchronous users of it. At most ``concurrency`` requests (by default the scraper's) are in flight at once.
+    """
+
+    def __init__(self, scraper: Scraper, concurrency: int = None):
+        self.scraper = scraper
+        self.concurrency = scraper.concurrency if concurrency is None else concurrency
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='zwiftpower')
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def get_url(self, url: str) -> Response:
+        return await self._run(self.scraper.get_url, url)
+
+    async def load(self, obj: Fetchable, resources: Iterable[str]) -> Fetchable:
+        """Fetch the given resources of ``obj`` concurrently, skipping the ones already loaded"""
+        # Decoding happens on the worker as well, HTML parsing is too slow for the event loop
+        missing = [r for r in resources if not obj.is_loaded(r)]
+        await asyncio.gather(*[self._run(self.scraper.load, obj, r) for r in missing])
+        return obj
+
+    async def profile(self, id_: int, resources: Iterable[str] = ('html',)) -> Profile:
+        return await self.load(self.scraper.profile(id_), resources)
+
+    async def team(self, id_: int, resources: Iterable[str] = ('html', 'riders_json')) -> Team:
+        return await self.load(self.scraper.team(id_), resources)
+
+    async def race(self, id_: int, resources: Iterable[str] = ('html',)) -> Race:
+        return await self.load(self.scraper.race(id_), resources)
+
+    async def profiles(self, ids: Iterable[int], resources: Iterable[str] = ('html',)) -> List[Profile]:
+        """Fetch several profiles at once. The result is in the same order as ``ids``"""
+        resources = tuple(resources)
+        return list(await asyncio.gather(*[self.profile(id_, resources) for id_ in ids]))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,115 @@
+"""
+Cheap checks for whether our ZwiftPower session is still valid, and keeping it across restarts.
+"""
+import contextlib
+import json
+import logging
+import os
+import re
+import time
+from http.cookiejar import CookieJar
+from pathlib import Path
+from typing import Optional
+
+from requests import Response
+from requests.cookies import create_cookie
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DOMAIN = 'zwiftpower.com'
+
+# The front page and every page we get while logged out contain <form id="login">
+LOGIN_FORM = re.compile(rb'<form\b[^>]*\bid\s*=\s*["\']?login\b', re.IGNORECASE)
+JSON_START = re.compile(rb'\s*[\[{]')
+
+
+def is_logged_in(resp: Response) -> bool:
+    """
+    Whether ``resp`` is actual content rather than the login page, without parsing the response.
+    JSON is always content. The logged out page is found with a byte-level scan for the login form.
+    """
+    if 'json' in resp.headers.get('Content-Type', ''):
+        return True
+    content = resp.content
+    # api3.php serves JSON as text/html
+    if JSON_START.match(content, 0, 64):
+        return True
+    return LOGIN_FORM.search(content) is None
+
+
+def cookies_expire_at(jar: CookieJar, domain: str = DOMAIN) -> Optional[float]:
+    """Earliest expiry time of the cookies for ``domain``, or None if none of them expire"""
+    expires = [c.expires for c in jar if c.domain.lstrip('.').endswith(domain) and c.expires]
+    return min(expires) if expires else None
+
+
+def cookies_expired(jar: CookieJar, domain: str = DOMAIN, margin: float = 0.0) -> bool:
+    """Whether the session cookies for ``domain`` have expired, or will within ``margin`` seconds"""
+    expires = cookies_expire_at(jar, domain)
+    return expires is not None and expires <= time.time() + margin
+
+
+@contextlib.contextmanager
+def _locked(path: Path):
+    """Hold an exclusive lock on ``path``.lock, so bot and CLI processes don't trample each other's cookies"""
+    with open(str(path) + '.lock', 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class CookieStore:
+    """
+    Keeps the cookies of a logged in session on disk, so a restart doesn't need to go through the Zwift login.
+    """
+    FIELDS = ('name', 'value', 'domain', 'path', 'expires', 'secure')
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def load(self, jar: CookieJar) -> int:
+        """Add the stored, unexpired cookies to ``jar`` and return how many there were"""
+        with _locked(self.path):
+            try:
+                stored = json.loads(self.path.read_text())
+            except FileNotFoundError:
+                return 0
+            except ValueError:
+                logger.warning("Ignoring corrupt cookie file %s", self.path)
+                return 0
+        now = time.time()
+        count = 0
+        for c in stored:
+            if c.get('expires') and c['expires'] <= now:
+                continue
+            jar.set_cookie(create_cookie(rest=c.get('rest', {}), **{k: c[k] for k in self.FIELDS}))
+            count += 1
+        logger.debug("Loaded %d cookies from %s", count, self.path)
+        return count
+
+    def save(self, jar: CookieJar):
+        cookies = [dict({k: getattr(c, k) for k in self.FIELDS}, rest=c._rest) for c in jar]
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        with _locked(self.path):
+            # Readable by us only from the start, it holds the session cookies
+            fd = os.open(str(tmp), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            if hasattr(os, 'fchmod'):
+                os.fchmod(fd, 0o600)  # In case a stale temp file was left with other permissions
+            with os.fdopen(fd, 'w') as f:
+                f.write(json.dumps(cookies))
+            os.replace(str(tmp), str(self.path))
+        logger.debug("Saved %d cookies to %s", len(cookies), self.path)
+
+    def clear(self):
+        with _locked(self.path):
+            with contextlib.suppress(FileNotFoundError):
+                self.path.unlink()
@@ -0,0 +1,40 @@
+"""
+Cache policy for ZwiftPower responses.
+"""
+from datetime import timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # requests_cache is imported when a session is made, it's slow to load
+    from requests_cache import CachedSession
+
+DEFAULT_EXPIRE_AFTER = timedelta(hours=12)
+
+#: Results can be fetched while a race is still being processed, and get corrected (DQs, upgrades) for a while after,
+#: so they aren't kept forever. Once expired they're revalidated, which is cheap when they haven't changed.
+RESULTS_EXPIRE_AFTER = timedelta(days=1)
+
+#: Expiry per URL pattern, the first match wins. Patterns are globs on the URL without the scheme.
+URLS_EXPIRE_AFTER = {
+    # Empty results (race not finished yet) are evicted by Race
+    'zwiftpower.com/cache3/results/*_view.json': RESULTS_EXPIRE_AFTER,
+    'zwiftpower.com/cache3/results/*_zwift.json': RESULTS_EXPIRE_AFTER,
+    'zwiftpower.com/cache3/results/*_signups.json': timedelta(minutes=15),
+    'zwiftpower.com/events.php*': timedelta(hours=1),
+    'zwiftpower.com/api3.php?do=critical_power_profile*': timedelta(hours=6),
+    'zwiftpower.com/cache3/profile/*': timedelta(hours=6),
+    'zwiftpower.com/profile.php*': timedelta(hours=12),
+    'zwiftpower.com/api3.php?do=team_riders*': timedelta(hours=1),
+    'zwiftpower.com/team.php*': timedelta(days=1),
+}
+
+
+def cached_session(path: Path, expire_after=DEFAULT_EXPIRE_AFTER) -> 'CachedSession':
+    """
+    A session caching ZwiftPower responses according to :data:`URLS_EXPIRE_AFTER`.
+
+    Expired responses are kept, so requests-cache can revalidate them with If-None-Match/If-Modified-Since where
+    ZwiftPower sends an ETag or Last-Modified, instead of downloading them again.
+    """
+    from requests_cache import CachedSession
+    return CachedSession(str(path), expire_after=expire_after, urls_expire_after=URLS_EXPIRE_AFTER)
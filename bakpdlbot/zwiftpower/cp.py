@@ -0,0 +1,90 @@
+"""
+Critical power curves backed by NumPy arrays.
+"""
+from typing import Iterator, Mapping, Optional, Union
+
+import numpy as np
+
+
+class CPWindow(Mapping):
+    """
+    The CP curve of one effort window ('90days', ...). Works like the ``{duration: value}`` dict it replaces, with
+    the data in the sorted arrays :attr:`x` (seconds) and :attr:`y`. Looking up a duration returns the value as it was
+    given, since NumPy turns a mix of ints and floats into floats.
+    """
+    __slots__ = ('x', 'y', '_values', '_yf')
+
+    def __init__(self, x, y):
+        order = np.argsort(x, kind='stable')
+        self._values = [y[i] for i in order.tolist()]
+        self.x = np.asarray(x)[order]
+        self.y = np.asarray(y)[order]
+        self._yf = None
+
+    @classmethod
+    def from_points(cls, points) -> 'CPWindow':
+        """From ZwiftPower's ``[{'x': seconds, 'y': value}, ...]``"""
+        return cls([p['x'] for p in points], [p['y'] for p in points])
+
+    @property
+    def yf(self) -> np.ndarray:
+        """:attr:`y` as floats, with missing values as NaN"""
+        if self._yf is None:
+            self._yf = np.array([np.nan if v is None else v for v in self._values], dtype=float)
+        return self._yf
+
+    def at(self, durations: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        """Value at arbitrary durations, interpolated on a log time scale. NaN outside of the curve."""
+        d = np.asarray(durations, dtype=float)
+        if len(self.x) == 0:
+            result = np.full(d.shape, np.nan)
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result = np.interp(np.log(d), np.log(self.x.astype(float)), self.yf, left=np.nan, right=np.nan)
+        return result.item() if result.ndim == 0 else result
+
+    def __getitem__(self, duration):
+        i = np.searchsorted(self.x, duration)
+        if i < len(self.x) and self.x[i] == duration:
+            return self._values[i]
+        raise KeyError(duration)
+
+    def __iter__(self) -> Iterator:
+        return iter(self.x.tolist())
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def __repr__(self):
+        return "<CPWindow {}>".format(dict(self))
+
+
+class CPCurve(Mapping):
+    """
+    Critical power curves per effort window, as returned by ZwiftPower's critical_power_profile. Works like the
+    ``{effort: {duration: value}}`` dict it replaces.
+    """
+    __slots__ = ('_windows',)
+
+    def __init__(self, windows: Mapping[str, CPWindow]):
+        self._windows = dict(windows)
+
+    @classmethod
+    def from_json(cls, data: Optional[dict]) -> 'CPCurve':
+        efforts = (data or {}).get('efforts') or {}
+        return cls({effort: CPWindow.from_points(points) for effort, points in efforts.items()})
+
+    def at(self, durations: Union[float, np.ndarray], effort: str = '90days') -> Union[float, np.ndarray]:
+        return self._windows[effort].at(durations)
+
+    def __getitem__(self, effort: str) -> CPWindow:
+        return self._windows[effort]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._windows)
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def __repr__(self):
+        return "<CPCurve {}>".format(list(self._windows))
@@ -0,0 +1,118 @@
+"""
+Recording ZwiftPower responses into a fixture corpus, for replaying them with :mod:`.standin`.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, Optional, Union
+from urllib.parse import urlsplit
+
+from requests import Response, Session
+
+from . import auth
+
+logger = logging.getLogger(__name__)
+
+#: Response headers that are kept besides the Content-Type, everything else (cookies in particular) is dropped
+KEEP_HEADERS = ('ETag', 'Last-Modified')
+
+#: Things in bodies and URLs that identify a session or a person
+SCRUB = (
+    (re.compile(rb'(\bsid=)[0-9a-f]{16,}'), rb'\1scrubbed'),
+    (re.compile(rb'(name="(?:username|password|email)"[^>]*\bvalue=")[^"]*'), rb'\1'),
+)
+
+
+class Fixture(NamedTuple):
+    status: int
+    content_type: str
+    body: bytes
+    headers: dict = {}
+
+
+def fixture_key(url: str) -> str:
+    """Path and query of a ZwiftPower URL, which is what fixtures are looked up by"""
+    parts = urlsplit(url)
+    key = parts.path or '/'
+    if parts.query:
+        key += '?' + parts.query
+    return scrub(key.encode()).decode()
+
+
+def scrub(content: bytes, secrets: Iterable[str] = ()) -> bytes:
+    for pattern, replacement in SCRUB:
+        content = pattern.sub(replacement, content)
+    for secret in secrets:
+        if secret:
+            content = content.replace(secret.encode(), b'scrubbed')
+    return content
+
+
+class FixtureCorpus:
+    """
+    A directory of recorded responses: ``index.json`` maps each :func:`fixture_key` to its status and headers, the
+    bodies are in files named after the hash of the key.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        index = self.path / 'index.json'
+        self._index = json.loads(index.read_text()) if index.exists() else {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def keys(self) -> Iterator[str]:
+        return iter(sorted(self._index))
+
+    def get(self, key: str) -> Optional[Fixture]:
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        body = (self.path / entry['file']).read_bytes()
+        return Fixture(entry['status'], entry['content_type'], body, entry.get('headers', {}))
+
+    def add(self, key: str, fixture: Fixture):
+        filename = hashlib.sha1(key.encode()).hexdigest() + '.body'
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            (self.path / filename).write_bytes(fixture.body)
+            self._index[key] = {'status': fixture.status, 'content_type': fixture.content_type, 'file': filename,
+                                'headers': fixture.headers}
+            (self.path / 'index.json').write_text(json.dumps(self._index, indent=1, sort_keys=True))
+
+
+class Recorder:
+    """
+    Saves the ZwiftPower responses a session receives into a corpus, scrubbed of cookies, session ids and the given
+    secrets (username, password). Logged out pages and errors aren't recorded.
+    """
+
+    def __init__(self, corpus: FixtureCorpus, secrets: Iterable[str] = ()):
+        self.corpus = corpus
+        self.secrets = [s for s in secrets if s]
+
+    def attach(self, session: Session):
+        session.hooks['response'].append(self._hook)
+
+    def _hook(self, resp: Response, *args, **kwargs):
+        if urlsplit(resp.url).hostname not in (auth.DOMAIN, 'www.' + auth.DOMAIN):
+            return
+        if resp.status_code != 200 or not auth.is_logged_in(resp):
+            return
+        self.record(resp)
+
+    def record(self, resp: Response):
+        key = fixture_key(resp.url)
+        headers = {h: resp.headers[h] for h in KEEP_HEADERS if h in resp.headers}
+        fixture = Fixture(resp.status_code, resp.headers.get('Content-Type', 'text/html'),
+                          scrub(resp.content, self.secrets), headers)
+        logger.debug("Recording %s", key)
+        self.corpus.add(key, fixture)
@@ -0,0 +1,129 @@
+"""
+Race history of a profile, indexed by date and race type.
+"""
+import json
+from datetime import date
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+#: Race type flags, combine with |
+RACE = 1
+ZRL = 2
+ZRL_TTT = 4
+WTRL_TTT = 8
+FRR_TTT = 16
+TTT = ZRL_TTT | WTRL_TTT | FRR_TTT
+
+#: ZRL TTT days per season, see :func:`load_ttt_calendar`
+ZRL_TTT_CALENDAR = Path(__file__).with_name('zrl_ttt.json')
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_DAY = 86400
+
+
+def load_ttt_calendar(path: Path = ZRL_TTT_CALENDAR) -> FrozenSet[int]:
+    """The ZRL TTT days in ``path`` (``[{"season": ..., "weeks": [{"week": ..., "dates": [...]}]}]``) as ordinals"""
+    with open(path) as f:
+        seasons = json.load(f)
+    return frozenset(date.fromisoformat(d).toordinal()
+                     for season in seasons for week in season['weeks'] for d in week['dates'])
+
+
+ZRL_TTT_DAYS = load_ttt_calendar()
+_ZRL_TTT_DAYS_ARRAY = np.array(sorted(ZRL_TTT_DAYS), dtype=np.int64)
+
+
+def day_ordinal(timestamp: float) -> int:
+    """The ordinal of the UTC day of a unix timestamp"""
+    return _EPOCH_ORDINAL + int(timestamp // _DAY)
+
+
+def ttt_day_mask(event_dates) -> np.ndarray:
+    """For an array of unix timestamps, whether each falls on a ZRL TTT day"""
+    days = _EPOCH_ORDINAL + np.floor_divide(np.asarray(event_dates, dtype=float), _DAY).astype(np.int64)
+    return np.isin(days, _ZRL_TTT_DAYS_ARRAY)
+
+
+def is_race(race: Dict) -> bool:
+    return 'TYPE_RACE' in race['f_t']
+
+
+def is_zrl(race: Dict) -> bool:
+    return 'Zwift Racing League'.lower() in race['event_title'].lower()
+
+
+def is_zrl_ttt(race: Dict) -> bool:
+    return is_zrl(race) and day_ordinal(race['event_date']) in ZRL_TTT_DAYS
+
+
+def is_wtrl_ttt(race: Dict) -> bool:
+    return 'WTRL Team Time Trial' in race['event_title']
+
+
+def is_frr_ttt(race: Dict) -> bool:
+    title = race['event_title']
+    return 'FRR' in title and 'TTT' in title
+
+
+def is_ttt(race: Dict) -> bool:
+    return is_wtrl_ttt(race) or is_zrl_ttt(race) or is_frr_ttt(race)
+
+
+def race_flags(race: Dict) -> int:
+    return int(classify([race])[0])
+
+
+def classify(races: Sequence[Dict]) -> np.ndarray:
+    """The flags of each race, with the TTT calendar checked for all races at once"""
+    flags = np.zeros(len(races), dtype=np.uint8)
+    for i, race in enumerate(races):
+        flags[i] = ((RACE if is_race(race) else 0)
+                    | (ZRL if is_zrl(race) else 0)
+                    | (WTRL_TTT if is_wtrl_ttt(race) else 0)
+                    | (FRR_TTT if is_frr_ttt(race) else 0))
+    if len(races):
+        on_ttt_day = ttt_day_mask([race['event_date'] for race in races])
+        flags[on_ttt_day & (flags & ZRL > 0)] |= ZRL_TTT
+    return flags
+
+
+class RaceHistory(Sequence):
+    """
+    The races of a profile, oldest first, with the type flags of each race worked out once. Selections by flag are
+    kept, so filtering the same history again (as several templates filters do) costs nothing.
+    """
+
+    def __init__(self, races: Iterable[Dict]):
+        self._races = sorted(races, key=lambda r: r['event_date'])
+        self.flags = classify(self._races)
+        self._selections = {}
+
+    @property
+    def latest(self) -> Optional[Dict]:
+        return self._races[-1] if self._races else None
+
+    def select(self, mask: int) -> List[Dict]:
+        """The races having any of the flags in ``mask``"""
+        if mask not in self._selections:
+            self._selections[mask] = [self._races[i] for i in np.flatnonzero(self.flags & mask)]
+        return self._selections[mask]
+
+    def count(self, mask: int) -> int:
+        return len(self.select(mask))
+
+    def races(self) -> List[Dict]:
+        return self.select(RACE)
+
+    def ttts(self) -> List[Dict]:
+        return self.select(TTT)
+
+    def __getitem__(self, index):
+        return self._races[index]
+
+    def __len__(self) -> int:
+        return len(self._races)
+
+    def __repr__(self):
+        return "<RaceHistory races={}>".format(len(self))
@@ -0,0 +1,65 @@
+import collections
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional
+
+
+class IdentityMap:
+    """
+    Bounded map of id -> live object, so asking for the same id twice gives the same object and whatever it has
+    already fetched and decoded.
+
+    The least recently used objects are evicted beyond ``maxsize``, and objects older than ``max_age`` seconds
+    are replaced, so a long running bot doesn't keep serving old data from memory.
+    """
+
+    def __init__(self, maxsize: int, max_age: Optional[float] = None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self._clock = clock
+        self._objects = collections.OrderedDict()
+        self._lock = threading.Lock()
+        #: Counters: hits, misses, evictions, expired, invalidations
+        self.stats = collections.Counter()
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            now = self._clock()
+            entry = self._objects.get(key)
+            if entry is not None:
+                created, obj = entry
+                if self.max_age is None or now - created < self.max_age:
+                    self._objects.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return obj
+                self.stats['expired'] += 1
+            self.stats['misses'] += 1
+            obj = factory()
+            self._objects[key] = (now, obj)
+            self._objects.move_to_end(key)
+            while len(self._objects) > self.maxsize:
+                self._objects.popitem(last=False)
+                self.stats['evictions'] += 1
+            return obj
+
+    def invalidate(self, key: Hashable = None) -> bool:
+        """Forget the object for ``key``, or all objects if no key is given. Returns whether anything was dropped."""
+        with self._lock:
+            if key is None:
+                dropped = len(self._objects) > 0
+                self._objects.clear()
+            else:
+                dropped = self._objects.pop(key, None) is not None
+            if dropped:
+                self.stats['invalidations'] += 1
+            return dropped
+
+    def info(self) -> dict:
+        with self._lock:
+            return dict(self.stats, size=len(self._objects), maxsize=self.maxsize)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._objects
+
+    def __len__(self) -> int:
+        return len(self._objects)
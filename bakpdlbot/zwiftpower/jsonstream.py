@@ -0,0 +1,72 @@
+"""
+Incremental decoding of the ``{"data": [...]}`` files ZwiftPower serves.
+
+Records are decoded one at a time and can be cut down to the fields that are actually used, so a big results or
+race history file never exists as a full list of full dicts. ijson is used when it is installed, otherwise a
+small incremental parser on top of :meth:`json.JSONDecoder.raw_decode`.
+"""
+import io
+import json
+import re
+from typing import Iterator, Optional, Sequence
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - ijson is optional
+    ijson = None
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+def _skip(text: str, i: int) -> int:
+    return _WHITESPACE.match(text, i).end()
+
+
+def _expect(text: str, i: int, char: str) -> int:
+    if text[i:i + 1] != char:
+        raise ValueError("Expected {!r} at position {}".format(char, i))
+    return _skip(text, i + 1)
+
+
+def _iter_raw(text: str, key: str) -> Iterator[dict]:
+    i = _expect(text, _skip(text, 0), '{')
+    while text[i:i + 1] != '}':
+        name, i = _decoder.raw_decode(text, i)
+        i = _expect(text, _skip(text, i), ':')
+        if name == key and text[i:i + 1] == '[':
+            i = _skip(text, i + 1)
+            while text[i:i + 1] != ']':
+                item, i = _decoder.raw_decode(text, i)
+                yield item
+                i = _skip(text, i)
+                if text[i:i + 1] == ',':
+                    i = _skip(text, i + 1)
+                elif text[i:i + 1] != ']':
+                    raise ValueError("Expected ',' or ']' at position {}".format(i))
+            return
+        _, i = _decoder.raw_decode(text, i)
+        i = _skip(text, i)
+        if text[i:i + 1] == ',':
+            i = _skip(text, i + 1)
+
+
+def iter_items(content: bytes, key: str = 'data', fields: Optional[Sequence[str]] = None,
+               use_ijson: bool = None) -> Iterator[dict]:
+    """
+    Yield the items of the array ``key`` of a JSON object one by one.
+
+    :param fields: Only keep these fields of each item (those that are present)
+    :param use_ijson: Force (or avoid) ijson, by default it's used if installed
+    """
+    if use_ijson is None:
+        use_ijson = ijson is not None
+    if use_ijson:
+        items = ijson.items(io.BytesIO(content), key + '.item', use_float=True)
+    else:
+        items = _iter_raw(content.decode('utf-8') if isinstance(content, bytes) else content, key)
+    if fields is None:
+        yield from items
+    else:
+        for item in items:
+            yield {f: item[f] for f in fields if f in item}
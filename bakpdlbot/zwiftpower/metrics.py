@@ -0,0 +1,187 @@
+"""
+Request and parse metrics of the scraper, exportable as a Prometheus textfile or JSON.
+"""
+import collections
+import fnmatch
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Mapping, Optional, Sequence, Union
+
+from requests import Response
+
+#: Endpoint names by URL pattern, the first match wins. Patterns are globs on the URL without the scheme.
+ENDPOINTS = (
+    ('results', 'zwiftpower.com/cache3/results/*'),
+    ('profile_races', 'zwiftpower.com/cache3/profile/*'),
+    ('critical_power', 'zwiftpower.com/api3.php?do=critical_power_profile*'),
+    ('team_riders', 'zwiftpower.com/api3.php?do=team_riders*'),
+    ('profile', 'zwiftpower.com/profile.php*'),
+    ('team', 'zwiftpower.com/team.php*'),
+    ('events', 'zwiftpower.com/events.php*'),
+)
+
+
+def endpoint(url: str) -> str:
+    url = url.split('://', 1)[-1]
+    return next((name for name, pattern in ENDPOINTS if fnmatch.fnmatchcase(url, pattern)), 'other')
+
+
+class Histogram:
+    """Cumulative histogram of durations in seconds, Prometheus style"""
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self) -> dict:
+        return {'buckets': dict(zip(self.buckets, self.counts)), 'count': self.count, 'sum': self.sum}
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                          for k, v in labels.items()) + '}'
+
+
+class ScraperMetrics:
+    """
+    What the scraper spends its time on: requests per endpoint and cache hit/miss with their latency and size, and
+    decode time per :class:`~.scraper.Fetchable` type. Counters of other components (the scraper's own stats, the
+    rate limiter) are :meth:`register`-ed and exported alongside.
+    """
+    PREFIX = 'zwiftpower'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        #: (endpoint, 'hit'/'miss', status) -> count
+        self.requests = collections.Counter()
+        self.latency = collections.defaultdict(Histogram)
+        self.bytes = collections.Counter()
+        self.parse = collections.defaultdict(Histogram)
+        self._counters = {}
+
+    def register(self, name: str, counters: Union[Mapping[str, float], Callable[[], Mapping[str, float]]]):
+        """
+        Export ``counters`` as ``zwiftpower_<name>_<key>``. Counters updated from several threads should be given
+        as a function returning a copy taken under the owner's lock (e.g. ``TokenBucket.stats_copy``), since
+        copying a Counter while another thread adds a key fails.
+        """
+        self._counters[name] = counters
+
+    def counters(self) -> Dict[str, dict]:
+        """Copies of the registered counters"""
+        return {name: dict(counters() if callable(counters) else counters)
+                for name, counters in self._counters.items()}
+
+    def observe_request(self, url: str, resp: Response, seconds: float):
+        name = endpoint(url)
+        cache = 'hit' if getattr(resp, 'from_cache', False) else 'miss'
+        with self._lock:
+            self.requests[(name, cache, resp.status_code)] += 1
+            self.latency[(name, cache)].observe(seconds)
+            self.bytes[name] += len(resp.content or b'')
+
+    def observe_parse(self, type_name: str, seconds: float):
+        with self._lock:
+            self.parse[type_name].observe(seconds)
+
+    def hit_ratio(self) -> Optional[float]:
+        with self._lock:
+            hits = sum(n for (_, cache, _), n in self.requests.items() if cache == 'hit')
+            total = sum(self.requests.values())
+        return hits / total if total else None
+
+    def snapshot(self) -> dict:
+        """Everything as plain data, for JSON"""
+        hit_ratio = self.hit_ratio()
+        counters = self.counters()
+        with self._lock:
+            endpoints = {}
+            for (name, cache, status), n in sorted(self.requests.items()):
+                e = endpoints.setdefault(name, {'requests': {}, 'bytes': self.bytes[name], 'latency': {}})
+                e['requests']['{} {}'.format(cache, status)] = n
+            for (name, cache), histogram in self.latency.items():
+                endpoints[name]['latency'][cache] = histogram.as_dict()
+            return {
+                'endpoints': endpoints,
+                'cache_hit_ratio': hit_ratio,
+                'parse': {t: h.as_dict() for t, h in self.parse.items()},
+                'counters': counters,
+            }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self) -> str:
+        p = self.PREFIX
+        lines = []
+
+        def metric(name, type_, help_):
+            lines.append('# HELP {}_{} {}'.format(p, name, help_))
+            lines.append('# TYPE {}_{} {}'.format(p, name, type_))
+
+        def histogram(name, histogram, **labels):
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append('{}_{}_bucket{} {}'.format(p, name, _labels(**labels, le=bound), count))
+            lines.append('{}_{}_bucket{} {}'.format(p, name, _labels(**labels, le='+Inf'), histogram.count))
+            lines.append('{}_{}_sum{} {}'.format(p, name, _labels(**labels), histogram.sum))
+            lines.append('{}_{}_count{} {}'.format(p, name, _labels(**labels), histogram.count))
+
+        hit_ratio = self.hit_ratio()
+        counters = self.counters()
+        with self._lock:
+            metric('requests_total', 'counter', 'Requests by endpoint, cache hit/miss and status')
+            for (name, cache, status), n in sorted(self.requests.items()):
+                lines.append('{}_requests_total{} {}'.format(p, _labels(endpoint=name, cache=cache, status=status),
+                                                             n))
+            metric('request_seconds', 'histogram', 'Request latency by endpoint and cache hit/miss')
+            for (name, cache), h in sorted(self.latency.items()):
+                histogram('request_seconds', h, endpoint=name, cache=cache)
+            metric('response_bytes_total', 'counter', 'Response body bytes by endpoint')
+            for name, n in sorted(self.bytes.items()):
+                lines.append('{}_response_bytes_total{} {}'.format(p, _labels(endpoint=name), n))
+            metric('parse_seconds', 'histogram', 'Time decoding responses by object type')
+            for type_name, h in sorted(self.parse.items()):
+                histogram('parse_seconds', h, type=type_name)
+            if hit_ratio is not None:
+                metric('cache_hit_ratio', 'gauge', 'Share of requests served from the HTTP cache')
+                lines.append('{}_cache_hit_ratio {}'.format(p, hit_ratio))
+            for source, values in sorted(counters.items()):
+                for key, value in sorted(values.items()):
+                    name = '{}_{}_total'.format(source, key)
+                    metric(name, 'counter', '{} {}'.format(source, key))
+                    lines.append('{}_{} {}'.format(p, name, value))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: Union[str, Path]):
+        """Write a Prometheus textfile, or a JSON snapshot if ``path`` ends in .json. Replaces the file atomically."""
+        path = Path(path)
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_text(self.to_json(indent=2) if path.suffix == '.json' else self.to_prometheus())
+        os.replace(tmp, path)
+
+    def summary(self) -> Dict[str, dict]:
+        """Per endpoint: requests, cache hits, average latency (ms) and bytes"""
+        with self._lock:
+            rows = {}
+            for (name, cache, _), n in self.requests.items():
+                row = rows.setdefault(name, {'requests': 0, 'hits': 0, 'avg_ms': 0.0, 'bytes': self.bytes[name]})
+                row['requests'] += n
+                if cache == 'hit':
+                    row['hits'] += n
+            for name, row in rows.items():
+                histograms = [h for (e, _), h in self.latency.items() if e == name]
+                count = sum(h.count for h in histograms)
+                row['avg_ms'] = 1000 * sum(h.sum for h in histograms) / count if count else 0.0
+            return rows
@@ -0,0 +1,88 @@
+"""
+HTML parsing backends for the scraper.
+
+Both backends produce documents with the small part of the requests_html API that the scraper uses: ``find()``,
+``xpath()``, ``.text``, ``.attrs`` and ``.lxml``. The lxml backend parses with libxml2 directly and compiles each
+selector once, the requests_html backend is kept as a fallback.
+"""
+import functools
+import logging
+from typing import List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+try:
+    import lxml.html
+    from lxml import etree
+    from lxml.cssselect import CSSSelector
+except ImportError:  # pragma: no cover - cssselect is an optional extra of lxml
+    CSSSelector = None
+
+
+@functools.lru_cache(maxsize=None)
+def css(selector: str) -> 'CSSSelector':
+    """Compiled CSS selector, cached for the lifetime of the process"""
+    return CSSSelector(selector)
+
+
+@functools.lru_cache(maxsize=None)
+def xpath(expression: str) -> 'etree.XPath':
+    """Compiled XPath expression, cached for the lifetime of the process"""
+    return etree.XPath(expression)
+
+
+class Element:
+    __slots__ = ('lxml',)
+
+    def __init__(self, element):
+        self.lxml = element
+
+    @property
+    def text(self) -> str:
+        return self.lxml.text_content()
+
+    @property
+    def attrs(self) -> dict:
+        return dict(self.lxml.attrib)
+
+    def find(self, selector: str, first: bool = False) -> Union['Element', List['Element'], None]:
+        found = css(selector)(self.lxml)
+        if first:
+            return Element(found[0]) if found else None
+        return [Element(e) for e in found]
+
+    def xpath(self, expression: str, first: bool = False):
+        found = [Element(e) if isinstance(e, etree.ElementBase) else e for e in xpath(expression)(self.lxml)]
+        if first:
+            return found[0] if found else None
+        return found
+
+    def __repr__(self):
+        return "<Element {!r} {!r}>".format(self.lxml.tag, self.attrs)
+
+
+class Document(Element):
+    __slots__ = ('url',)
+
+    def __init__(self, html: bytes, url: Optional[str] = None):
+        super().__init__(lxml.html.document_fromstring(html) if html.strip() else lxml.html.Element('html'))
+        self.url = url
+
+
+def _requests_html(html: bytes, url: Optional[str] = None):
+    # Imported when used: requests_html pulls in pyppeteer and pyquery, which take a while to load
+    import requests_html
+    return requests_html.HTML(url=url, html=html)
+
+
+BACKENDS = {
+    'lxml': Document,
+    'requests_html': _requests_html,
+}
+
+#: Backend used by :func:`parse` unless one is given
+default_backend = 'lxml' if CSSSelector is not None else 'requests_html'
+
+
+def parse(html: bytes, url: Optional[str] = None, backend: Optional[str] = None):
+    return BACKENDS[backend or default_backend](html, url=url)
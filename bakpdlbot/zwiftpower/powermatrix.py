@@ -0,0 +1,96 @@
+"""
+Riders x durations matrices of critical power, for comparing a whole team at once.
+"""
+from typing import List, Sequence
+
+import numpy as np
+
+from .scraper import Profile, Team
+
+TYPES = ('watts', 'wkg')
+
+
+class TeamPowerMatrix:
+    """
+    90 day (by default) critical power of a set of riders at fixed durations, as ``riders x durations`` arrays of
+    watts and w/kg. Durations a rider has no data for are NaN.
+    """
+    DEFAULT_DURATIONS = (5, 15, 30, 60, 120, 300, 600, 1200, 2400, 3600)
+
+    def __init__(self, riders: Sequence, watts: np.ndarray, wkg: np.ndarray, durations: Sequence[int]):
+        self.riders = list(riders)
+        self.durations = np.asarray(durations)
+        self.watts = watts
+        self.wkg = wkg
+
+    @classmethod
+    def from_riders(cls, riders: Sequence, durations: Sequence[int] = DEFAULT_DURATIONS,
+                    effort: str = '90days') -> 'TeamPowerMatrix':
+        """
+        :param riders: Profiles, or Riders (team members, entrants) whose profile to use. The CP data should have
+                       been prefetched, or it will be fetched one rider at a time.
+        """
+        riders = list(riders)
+        watts = np.full((len(riders), len(durations)), np.nan)
+        wkg = np.full((len(riders), len(durations)), np.nan)
+        for i, rider in enumerate(riders):
+            profile = rider if isinstance(rider, Profile) else rider.profile
+            for matrix, curve in ((watts, profile.cp_watts), (wkg, profile.cp_wkg)):
+                if curve is not None and effort in curve:
+                    matrix[i] = curve[effort].at(durations)
+        return cls(riders, watts, wkg, durations)
+
+    @classmethod
+    def from_team(cls, team: Team, durations: Sequence[int] = DEFAULT_DURATIONS,
+                  effort: str = '90days') -> 'TeamPowerMatrix':
+        members = list(team.members)
+        team.scraper.prefetch_profiles([m.profile for m in members], resources=('cp_watts', 'cp_wkg'))
+        return cls.from_riders(members, durations, effort)
+
+    def matrix(self, type_: str) -> np.ndarray:
+        if type_ not in TYPES:
+            raise ValueError("Not a valid power type: {}".format(type_))
+        return self.watts if type_ == 'watts' else self.wkg
+
+    def column(self, duration: int) -> int:
+        found = np.flatnonzero(self.durations == duration)
+        if len(found) == 0:
+            raise KeyError(duration)
+        return int(found[0])
+
+    def missing(self, type_: str = 'wkg') -> np.ndarray:
+        """Boolean mask of the entries without data"""
+        return np.isnan(self.matrix(type_))
+
+    def ranks(self, type_: str = 'wkg') -> np.ndarray:
+        """Rank of each rider per duration, 1 being the best. NaN where there's no data."""
+        m = self.matrix(type_)
+        order = np.argsort(-np.where(np.isnan(m), -np.inf, m), axis=0, kind='stable')
+        ranks = np.empty(m.shape)
+        ranks[order, np.arange(m.shape[1])] = np.arange(1, m.shape[0] + 1)[:, np.newaxis]
+        ranks[np.isnan(m)] = np.nan
+        return ranks
+
+    def percentiles(self, type_: str = 'wkg') -> np.ndarray:
+        """Percentile of each rider within the team per duration: 100 for the best, 0 for the worst"""
+        ranks = self.ranks(type_)
+        valid = np.sum(~np.isnan(ranks), axis=0)
+        with np.errstate(invalid='ignore'):
+            return 100.0 * (valid - ranks) / np.maximum(valid - 1, 1)
+
+    def quantiles(self, q: Sequence[float] = (25, 50, 75), type_: str = 'wkg') -> np.ndarray:
+        """Team quantiles per duration, as a ``len(q) x durations`` array"""
+        m = self.matrix(type_)
+        if m.size == 0 or np.all(np.isnan(m)):
+            return np.full((len(q), len(self.durations)), np.nan)
+        with np.errstate(all='ignore'):
+            return np.nanpercentile(m, q, axis=0)
+
+    def best(self, duration: int, type_: str = 'wkg', n: int = None) -> List[tuple]:
+        """``(rider, value)`` of the riders with data at ``duration``, best first"""
+        values = self.matrix(type_)[:, self.column(duration)]
+        order = [i for i in np.argsort(-values, kind='stable') if not np.isnan(values[i])]
+        return [(self.riders[i], values[i].item()) for i in order[:n]]
+
+    def __len__(self):
+        return len(self.riders)
@@ -0,0 +1,131 @@
+import asyncio
+import collections
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from requests import Response
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Up to ``burst`` requests can go out back-to-back, after which requests are spaced to keep within ``per_minute``.
+    A rate of ``None`` disables limiting, but still honours backoff.
+
+    Responses are reported back with :meth:`feedback`. A 429 or 5xx blocks all requests for the Retry-After time
+    (or an exponential backoff) and halves the rate, which then creeps back up to ``per_minute`` as requests succeed.
+    """
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    MIN_BACKOFF = 2.0
+    MAX_BACKOFF = 300.0
+
+    def __init__(self, per_minute: Optional[float], burst: int = 1, clock=time.monotonic, sleep=time.sleep):
+        self.max_rate = per_minute / 60.0 if per_minute else None
+        self.rate = self.max_rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._backoff = 0.0
+        #: Counters: requests, waits, wait_time (seconds), backoffs
+        self.stats = collections.Counter()
+
+    def stats_copy(self) -> dict:
+        """:attr:`stats`, copied under the lock the request threads update it with"""
+        with self._lock:
+            return dict(self.stats)
+
+    @classmethod
+    def from_interval(cls, seconds: float, **kwargs) -> 'TokenBucket':
+        """A limiter allowing one request every ``seconds``"""
+        return cls(per_minute=60.0 / seconds if seconds else None, **kwargs)
+
+    def _reserve(self) -> float:
+        """Take a token, possibly going into debt, and return how long the caller has to wait for it"""
+        with self._lock:
+            now = self._clock()
+            self.stats['requests'] += 1
+            delay = max(0.0, self._blocked_until - now)
+            if self.rate is not None:
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._tokens -= 1
+                if self._tokens < 0:
+                    delay = max(delay, -self._tokens / self.rate)
+            self._updated = now
+            if delay > 0:
+                self.stats['waits'] += 1
+                self.stats['wait_time'] += delay
+            return delay
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        delay = self._reserve()
+        if delay > 0:
+            logger.debug("Rate limited, waiting %.2fs", delay)
+            self._sleep(delay)
+
+    async def acquire_async(self):
+        """Like :meth:`acquire`, but without blocking the event loop"""
+        delay = self._reserve()
+        if delay > 0:
+            logger.debug("Rate limited, waiting %.2fs", delay)
+            await asyncio.sleep(delay)
+
+    def charge(self):
+        """Account for a request that was sent without :meth:`acquire`, e.g. an unexpected cache miss"""
+        with self._lock:
+            self.stats['requests'] += 1
+            if self.rate is not None:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate) - 1
+                self._updated = now
+
+    def feedback(self, resp: Response) -> Optional[float]:
+        """
+        Report a response that went over the network.
+
+        :return: The number of seconds to back off before retrying, or None if the response shouldn't be retried
+        """
+        with self._lock:
+            if resp.status_code not in self.RETRY_STATUSES:
+                self._backoff = 0.0
+                if self.rate is not None and self.rate < self.max_rate:
+                    self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+                return None
+
+            self._backoff = min(self.MAX_BACKOFF, max(self.MIN_BACKOFF, self._backoff * 2))
+            delay = self._retry_after(resp)
+            delay = self._backoff if delay is None else min(delay, self.MAX_BACKOFF)
+            if resp.status_code == 429 and self.rate is not None:
+                self.rate = max(self.max_rate / 16, self.rate / 2)
+            self._blocked_until = max(self._blocked_until, self._clock() + delay)
+            self.stats['backoffs'] += 1
+            logger.warning("Got %d, backing off for %.1fs", resp.status_code, delay)
+            return delay
+
+    @staticmethod
+    def _retry_after(resp: Response) -> Optional[float]:
+        value = resp.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,86 @@
+"""
+Refreshing a team's profiles only where something changed.
+"""
+import hashlib
+import json
+import logging
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+from .scraper import Profile, Scraper, Team
+
+logger = logging.getLogger(__name__)
+
+#: The profile resources that are skipped for riders without changes
+EXPENSIVE = ('html', 'cp_watts', 'cp_wkg')
+
+
+class RefreshPlan(NamedTuple):
+    changed: List[int]
+    unchanged: List[int]
+
+
+def row_hash(row: dict) -> str:
+    return hashlib.sha1(json.dumps(row, sort_keys=True).encode()).hexdigest()
+
+
+class RefreshPlanner:
+    """
+    Refreshes the profiles of a team based on a cheap change signal per rider: their row in the team riders JSON
+    (``'team'``, one request for the whole team) or the date of their latest race (``'races'``, one request per
+    rider). Only riders whose signal differs from the last refresh get their profile page and CP curves fetched
+    again; for the others the stored copies are marked fresh.
+
+    Needs a scraper with a :class:`~.store.RiderStore`, which is where the signals are kept.
+    """
+    SIGNALS = ('team', 'races')
+
+    def __init__(self, scraper: Scraper, signal: str = 'team'):
+        if scraper.store is None:
+            raise Exception("Refresh planning needs a scraper with a store")
+        if signal not in self.SIGNALS:
+            raise ValueError("Not a valid change signal: {}".format(signal))
+        self.scraper = scraper
+        self.store = scraper.store
+        self.signal = signal
+
+    def signals(self, team: Team) -> Dict[int, str]:
+        """The current signal of each team member"""
+        members = list(team.members)
+        if self.signal == 'team':
+            return {int(m.id): row_hash(m.data) for m in members}
+        ids = [int(m.id) for m in members]
+        # The races feed has to come from ZwiftPower, not from the store or the HTTP cache
+        for id_ in ids:
+            self.scraper.invalidate(id_, Profile)
+            self.scraper.evict_url(Profile.URL_RACES.format(id=id_))
+        with self.scraper.store_disabled():
+            profiles = self.scraper.prefetch_profiles(ids, resources=('races',))
+        return {p.id: str(p.latest_race['event_date'] if p.latest_race else '') for p in profiles}
+
+    def plan(self, team: Team, resources: Sequence[str] = EXPENSIVE) -> Tuple[RefreshPlan, Dict[int, str]]:
+        current = self.signals(team)
+        plan = RefreshPlan([], [])
+        for id_, value in current.items():
+            known = self.store.signal(id_, self.signal) == value \
+                and all(self.store.fetched_at('Profile', id_, r) is not None for r in resources)
+            (plan.unchanged if known else plan.changed).append(id_)
+        return plan, current
+
+    def refresh(self, team: Team, resources: Sequence[str] = EXPENSIVE) -> RefreshPlan:
+        """Fetch ``resources`` of the changed riders of ``team``, and mark those of the others fresh"""
+        plan, current = self.plan(team, resources)
+        logger.info("Refreshing %d of %d riders of team %s", len(plan.changed), len(current), team.id)
+        for id_ in plan.unchanged:
+            for resource in resources:
+                self.store.touch('Profile', id_, resource)
+        for id_ in plan.changed:
+            self.scraper.invalidate(id_, Profile)
+            for resource in resources:
+                self.scraper.evict_url(Profile.RESOURCES[resource].format(id=id_))
+        with self.scraper.store_disabled():
+            profiles = self.scraper.prefetch_profiles(plan.changed, resources)
+        for profile in profiles:
+            # Failed riders keep their old signal, so they are tried again next time
+            if all(profile.is_loaded(r) for r in resources):
+                self.store.set_signal(profile.id, self.signal, current[profile.id])
+        return plan
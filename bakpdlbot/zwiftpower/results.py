@@ -0,0 +1,116 @@
+"""
+Columnar tables of race results and signups.
+"""
+from html import unescape
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Sequence, Union
+
+import numpy as np
+
+
+def decodeentities(value):
+    if isinstance(value, str) and '&' in value:
+        return unescape(value)
+    return value
+
+
+def _column(values: List[Any]) -> np.ndarray:
+    """Numeric columns get a numeric dtype, anything else (strings, lists, missing values) is an object array"""
+    if values and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return np.array(values)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+class RowView(Mapping):
+    """One row of a :class:`ResultsTable`, read straight from its columns"""
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table: 'ResultsTable', index: int):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, field: str):
+        value = self.table.columns[field][self.index]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.table.columns)
+
+    def __len__(self) -> int:
+        return len(self.table.columns)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ResultsTable:
+    """
+    The rows of a ZwiftPower results or signups file as ``{field: array}``, with HTML entities decoded once.
+
+    Iterating gives ``row_type`` objects (:class:`Entrant` for a race) reading from the columns. :meth:`where`,
+    :meth:`filter` and :meth:`sort` return new tables, :meth:`group_by` a dict of tables.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], row_type: Callable = None, scraper=None, container=None):
+        self.columns = columns
+        self.row_type = row_type
+        self.scraper = scraper
+        self.container = container
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[dict], row_type: Callable = None, scraper=None,
+                  container=None) -> 'ResultsTable':
+        fields = {}
+        for row in rows:
+            fields.update(dict.fromkeys(row))
+        columns = {f: _column([decodeentities(row.get(f)) for row in rows]) for f in fields}
+        return cls(columns, row_type, scraper, container)
+
+    def _take(self, index) -> 'ResultsTable':
+        return ResultsTable({f: c[index] for f, c in self.columns.items()}, self.row_type, self.scraper,
+                            self.container)
+
+    def column(self, field: str) -> np.ndarray:
+        return self.columns[field]
+
+    def where(self, **equals) -> 'ResultsTable':
+        """Rows where all the given fields have the given values, e.g. ``where(category='A')``"""
+        mask = np.ones(len(self), dtype=bool)
+        for field, value in equals.items():
+            mask &= self.columns[field] == value
+        return self._take(mask)
+
+    def filter(self, mask: Union[np.ndarray, Sequence[bool]]) -> 'ResultsTable':
+        return self._take(np.asarray(mask, dtype=bool))
+
+    def sort(self, field: str, reverse: bool = False) -> 'ResultsTable':
+        order = np.argsort(self.columns[field], kind='stable')
+        return self._take(order[::-1] if reverse else order)
+
+    def group_by(self, field: str) -> Dict[Any, 'ResultsTable']:
+        keys = self.columns[field]
+        groups = {}
+        for i, key in enumerate(keys.tolist()):
+            groups.setdefault(key, []).append(i)
+        return {key: self._take(np.array(index)) for key, index in groups.items()}
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        row = RowView(self, index)
+        if self.row_type is None:
+            return row
+        return self.row_type(row, scraper=self.scraper, container=self.container, decoded=True)
+
+    def __iter__(self) -> Iterator:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __repr__(self):
+        return "<ResultsTable rows={} fields={}>".format(len(self), len(self.columns))
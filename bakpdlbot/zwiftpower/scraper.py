@@ -1,19 +1,33 @@
 import abc
+import collections
 import contextlib
 import logging
 import re
+import threading
 import time
 import traceback
-from typing import Iterator, List
-from html import unescape
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, \
+    Union
 
 import demjson3 as demjson
-import requests_html
 from requests import Response, Session
 from urllib.parse import urlparse, parse_qs
 
+from . import auth, jsonstream, parser
+from .cp import CPCurve
+from .history import RaceHistory
+from .identitymap import IdentityMap
+from .metrics import ScraperMetrics
+from .ratelimit import TokenBucket
+from .results import ResultsTable, decodeentities
+
 logger = logging.getLogger(__name__)
 
+#: requests_html's default User-Agent, which the scraper has always sent (importing requests_html for it is slow)
+USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_12_6) AppleWebKit/603.3.8 (KHTML, like Gecko) '
+              'Version/10.1.2 Safari/603.3.8')
+
 # Flag<=>Country as used by ZwiftPower. Probably incomplete.
 flags = {
     'ad': 'Andorra',
@@ -226,21 +240,34 @@ flags = {
 countries = {country:flag for flag, country in flags.items()}
 
 
-def decodeentities(s):
-    if isinstance(s, str) and '&' in s:
-        return unescape(s)
-    return s
-
-
 def html(resp: Response):
-    return requests_html.HTML(url=resp.url, html=resp.content)
+    return parser.parse(resp.content, url=resp.url)
 
 
 class Fetchable(abc.ABC):
+    #: Named resources of this object as {name: URL template}. A fetched resource is stored in ``_<name>``
+    RESOURCES = {}
 
     def __init__(self, scraper):
         self.scraper = scraper
 
+    def resource_url(self, resource: str) -> str:
+        return self.RESOURCES[resource].format(id=self.id)
+
+    def is_loaded(self, resource: str) -> bool:
+        return getattr(self, '_' + resource) is not None
+
+    def _decode(self, resource: str, resp: Response):
+        """Turn the response for one of :attr:`RESOURCES` into what is stored in ``_<name>``"""
+        if resource == 'html':
+            return html(resp)
+        return resp.json()
+
+    def _fetch(self, resource: str):
+        if not self.is_loaded(resource):
+            self.scraper.load(self, resource)
+        return getattr(self, '_' + resource)
+
     def _get(self, selector):
         return self.html.find(selector, first=True)
 
@@ -255,10 +282,11 @@ class Fetchable(abc.ABC):
 
 
 class Rider:
-    def __init__(self, rider_data, scraper, container):
+    def __init__(self, rider_data, scraper, container, decoded=False):
         self.data = rider_data
         self.scraper = scraper
         self.container = container
+        self._decoded = decoded
         self._profile = None
 
     @property
@@ -271,8 +299,13 @@ class Rider:
             self._profile = self.scraper.profile(self.id)
         return self._profile
 
+    @profile.setter
+    def profile(self, profile):
+        self._profile = profile
+
     def __getattr__(self, item):
-        return decodeentities(self.data.get(item, None))
+        value = self.data.get(item, None)
+        return value if self._decoded else decodeentities(value)
 
     def __repr__(self):
         return "<{0.__class__.__name__} id={0.id}, name='{0.name}'>".format(self)
@@ -297,6 +330,12 @@ class Race(Fetchable):
     URL_SIGNUPS = 'https://zwiftpower.com/cache3/results/{id}_signups.json'
     URL_RESULTS = 'https://zwiftpower.com/cache3/results/{id}_view.json'
     URL_UNFILTERED = 'https://zwiftpower.com/cache3/results/{id}_zwift.json'
+    RESOURCES = {
+        'html': URL,
+        'signups': URL_SIGNUPS,
+        'results': URL_RESULTS,
+        'unfiltered': URL_UNFILTERED,
+    }
 
     def __init__(self, id_, scraper):
         super().__init__(scraper)
@@ -305,13 +344,46 @@ class Race(Fetchable):
         self._results = None
         self._unfiltered = None
         self._html = None
+        self._tables = {}
 
     @property
     def html(self):
-        if not self._html:
-            resp = self.scraper.get_url(self.URL.format(id=self.id))
-            self._html = html(resp)
-        return self._html
+        return self._fetch('html')
+
+    def _table(self, resource: str) -> ResultsTable:
+        rows = self._fetch(resource)['data']
+        table = self._tables.get(resource)
+        if table is None or table[0] is not rows:
+            table = self._tables[resource] = (rows, ResultsTable.from_rows(rows, Entrant, self.scraper, self))
+        return table[1]
+
+    def signups_table(self) -> ResultsTable:
+        return self._table('signups')
+
+    def results_table(self) -> ResultsTable:
+        return self._table('results')
+
+    def unfiltered_table(self) -> ResultsTable:
+        return self._table('unfiltered')
+
+    def stream(self, resource: str, fields: Sequence[str] = None) -> Iterator[dict]:
+        """
+        Rows of the signups/results/unfiltered file, decoded one at a time and not kept on the race. For crawling
+        big events when only a few fields are needed.
+        """
+        if self.is_loaded(resource):
+            rows = self._fetch(resource)['data']
+            yield from (rows if fields is None else ({f: r[f] for f in fields if f in r} for r in rows))
+        else:
+            resp = self.scraper.get_url(self.resource_url(resource))
+            yield from jsonstream.iter_items(resp.content, 'data', fields)
+
+    def _decode(self, resource: str, resp: Response):
+        data = super()._decode(resource, resp)
+        if resource in ('results', 'unfiltered') and not data.get('data'):
+            # Results are cached forever, but there aren't any until the race is over
+            self.scraper.evict(resp)
+        return data
 
     @property
     def name(self):
@@ -320,26 +392,17 @@ class Race(Fetchable):
 
     @property
     def signups(self) -> Iterator[Entrant]:
-        if not self._signups:
-            url = self.URL_SIGNUPS.format(id=self.id)
-            self._signups = self.scraper.get_url(url).json()
-        for entrant in self._signups['data']:
+        for entrant in self._fetch('signups')['data']:
             yield Entrant(entrant, scraper=self.scraper, container=self)
 
     @property
     def results(self) -> Iterator[Entrant]:
-        if not self._results:
-            url = self.URL_RESULTS.format(id=self.id)
-            self._results = self.scraper.get_url(url).json()
-        for entrant in self._results['data']:
+        for entrant in self._fetch('results')['data']:
             yield Entrant(entrant, scraper=self.scraper, container=self)
 
     @property
     def unfiltered(self) -> Iterator[Entrant]:
-        if not self._unfiltered:
-            url = self.URL_UNFILTERED.format(id=self.id)
-            self._unfiltered = self.scraper.get_url(url).json()
-        for entrant in self._unfiltered['data']:
+        for entrant in self._fetch('unfiltered')['data']:
             yield Entrant(entrant, scraper=self.scraper, container=self)
 
     @property
@@ -352,6 +415,10 @@ class Race(Fetchable):
 class Team(Fetchable):
     URL = 'https://zwiftpower.com/team.php?id={id}'
     RIDERS = 'https://zwiftpower.com/api3.php?do=team_riders&id={id}'
+    RESOURCES = {
+        'html': URL,
+        'riders_json': RIDERS,
+    }
 
     def __init__(self, id_, scraper):
         super().__init__(scraper)
@@ -365,18 +432,11 @@ class Team(Fetchable):
 
     @property
     def html(self):
-        if not self._html:
-            resp = self.scraper.get_url(self.url)
-            self._html = html(resp)
-        return self._html
+        return self._fetch('html')
 
     @property
     def riders_json(self):
-        if not self._riders_json:
-            url = self.RIDERS.format(id=self.id)
-            resp = self.scraper.get_url(url)
-            self._riders_json = resp.json()
-        return self._riders_json
+        return self._fetch('riders_json')
 
     @property
     def members(self) -> Iterator[Member]:
@@ -407,14 +467,134 @@ class Team(Fetchable):
         return "<Team id={0.id}, name={0.name}>".format(self)
 
 
+def _parse_field(parse, name: str, text: str):
+    """``parse()``, or None if the text isn't in the expected format, so one odd cell doesn't lose the others"""
+    try:
+        return parse()
+    except (IndexError, ValueError):
+        logger.debug("Unexpected %s on profile page: %r", name, text)
+        return None
+
+
+class ProfileSnapshot(NamedTuple):
+    """
+    All the data we use from a profile page, extracted in a single pass so the DOM doesn't have to be kept.
+    """
+    name: Optional[str] = None
+    cat: Optional[str] = None
+    rank: Optional[int] = None
+    zftp: Optional[int] = None
+    #: Weight from the FTP row, if shown
+    weight: Optional[float] = None
+    country: Optional[str] = None
+    rs: Optional[str] = None
+    team_id: Optional[str] = None
+    punch: Optional[float] = None
+    #: See :attr:`Profile.power_profile`
+    power_profile: Optional[dict] = None
+
+    ROWS = ('zFTP', 'FTP', 'Country', 'Zwift Racing Score', 'Team')
+    RANK = '#profile_information > tr:nth-child(1) > td > small > b:nth-child(2)'
+
+    @classmethod
+    def from_html(cls, doc) -> 'ProfileSnapshot':
+        root = doc.lxml
+        rows = {}
+        fields = {}
+        for el in root.iter('th', 'span', 'a', 'script'):
+            if el.tag == 'th':
+                key = ' '.join(el.text_content().split())
+                if key in cls.ROWS and key not in rows:
+                    rows[key] = next(el.itersiblings('td'), None)
+            elif el.tag == 'span':
+                if 'cat' not in fields and el.get('title') == 'Mixed 30 day category' \
+                        and _within(el, 'table', 'profile_information'):
+                    fields['cat'] = el.text_content().strip()
+                elif 'punch' not in fields and _within(el, 'div', 'table_scroll_overview'):
+                    m = re.search(r'Punch:\s*(?P<punch>[0-9\.]*)%', el.text_content())
+                    if m:
+                        fields['punch'] = float(m.group('punch'))
+            elif el.tag == 'a':
+                if 'name' not in fields and el.get('href') == '#tab-results' and _within(el, 'div', 'zp_submenu'):
+                    fields['name'] = el.text_content().strip()
+            elif 'power_profile' not in fields and 'function load_profile_spider()' in (el.text or ''):
+                fields['power_profile'] = cls._power_profile(el.text)
+
+        rank = parser.css(cls.RANK)(root)
+        if rank:
+            s = rank[0].text_content().strip()
+            if s:
+                fields['rank'] = _parse_field(lambda: int(s.split()[0].replace(',', '')), 'rank', s)
+
+        # 220w ~ 86kg, or "-" when unknown
+        if rows.get('zFTP') is not None:
+            s = rows['zFTP'].text_content().strip()
+            fields['zftp'] = _parse_field(lambda: int(s.split('w', 1)[0]), 'zFTP', s)
+        if rows.get('FTP') is not None:
+            s = rows['FTP'].text_content().strip()
+            fields['weight'] = _parse_field(lambda: float(s.split('~', 1)[1].replace('kg', '')), 'FTP', s)
+        if rows.get('Country') is not None:
+            fields['country'] = rows['Country'].text_content().strip()
+        if rows.get('Zwift Racing Score') is not None:
+            score = rows['Zwift Racing Score'].find('b')
+            if score is not None:
+                fields['rs'] = score.text_content().strip()
+        if rows.get('Team') is not None:
+            link = rows['Team'].find('a')
+            if link is not None:
+                parsed_qs = parse_qs(urlparse(link.get('href', '')).query)
+                if 'id' in parsed_qs:
+                    fields['team_id'] = parsed_qs['id'][0]
+        return cls(**fields)
+
+    @classmethod
+    def _power_profile(cls, script: str) -> Optional[dict]:
+        try:
+            decoded = [cls._decode_spider(x) for x in re.findall(r'{ mean:[^}]* }', script)]
+        except demjson.JSONDecodeError:
+            traceback.print_exc()
+            return None
+        return {
+            'wkg': dict(zip([15, 60, 300, 1200], decoded[:4])),
+            'watt': dict(zip([15, 60, 300, 1200], decoded[4:])),
+        }
+
+    @staticmethod
+    def _decode_spider(x):
+        values = demjson.decode(x)
+        top = {
+            '#f26f33': 1,
+            '#0a7dce': 2,
+            '#7CB5EC': 3,
+        }
+        return {
+            'top': top.get(values['color'], None),
+            'value': values['ours'].split(' ')[0],
+            'pct': values['y'],
+        }
+
+
+def _within(el, tag: str, id_: str) -> bool:
+    return any(a.tag == tag and a.get('id') == id_ for a in el.iterancestors())
+
+
 class Profile(Fetchable):
     URL_PROFILE = 'https://zwiftpower.com/profile.php?z={id}'
     URL_RACES = 'https://zwiftpower.com/cache3/profile/{id}_all.json'
     URL_CP = 'https://zwiftpower.com/api3.php?do=critical_power_profile&zwift_id={id}&zwift_event_id=&type={type}'
+    RESOURCES = {
+        'html': URL_PROFILE,
+        'races': URL_RACES,
+        'cp_watts': URL_CP.format(id='{id}', type='watts'),
+        'cp_wkg': URL_CP.format(id='{id}', type='wkg'),
+    }
+    #: The fields of the race history that are kept
+    RACE_FIELDS = ('event_date', 'f_t', 'event_title', 'height', 'weight')
 
     def __init__(self, id_: int, scraper):
         super().__init__(scraper)
         self.id = id_
+        # The profile page is only kept as its ProfileSnapshot
         self._html = None
         self._races = None
         self._cp_wkg = None
@@ -426,24 +606,34 @@ class Profile(Fetchable):
 
     @property
     def html(self):
-        if not self._html:
-            resp = self.scraper.get_url(self.url)
-            self._html = html(resp)
-        return self._html
+        """The parsed profile page. It isn't kept around, use :attr:`snapshot` for anything repeated"""
+        return html(self.scraper.get_url(self.url))
+
+    def _decode(self, resource: str, resp: Response):
+        if resource == 'html':
+            return ProfileSnapshot.from_html(html(resp))
+        if resource == 'races':
+            races = jsonstream.iter_items(resp.content, 'data', self.RACE_FIELDS)
+            return RaceHistory(race for race in races if race.get('event_date', '') != '')
+        if resource in ('cp_watts', 'cp_wkg'):
+            return CPCurve.from_json(resp.json())
+        return super()._decode(resource, resp)
+
+    @property
+    def snapshot(self) -> 'ProfileSnapshot':
+        return self._fetch('html')
 
     @property
     def cat(self):
-        return self._get_text('table#profile_information span[title="Mixed 30 day category"]')
+        return self.snapshot.cat
 
     @property
     def name(self):
-        return self._get_text('div#zp_submenu a[href="#tab-results"]')
+        return self.snapshot.name
 
     @property
     def rank(self):
-        s = self._get_text('#profile_information > tr:nth-child(1) > td > small > b:nth-child(2)')
-        if s:
-            return int(s.split("\n")[0].strip().replace(',', ''))
+        return self.snapshot.rank
 
     @property
     def ftp(self):
@@ -451,39 +641,28 @@ class Profile(Fetchable):
 
     @property
     def zftp(self):
-        taglist = self.html.xpath("//th[normalize-space() = 'zFTP'][1]/following-sibling::td[1]")
-        if len(taglist) == 1:
-            # 220w ~ 86kg
-            return int(taglist[0].text.strip().split('w', 1)[0])
-        else:
+        zftp = self.snapshot.zftp
+        if zftp is None:
             logger.warning("Could not find zFTP for %s", self.id)
-            return None
+        return zftp
 
     @property
     def punch(self):
-        s = self._get_text('#table_scroll_overview > div.btn-toolbar > div.pull-right > div.progress > div.progress-bar > span')
-        m = re.search(r'Punch:\s*(?P<punch>[0-9\.]*)%', s)
-        if m:
-            return float(m.group('punch'))
+        return self.snapshot.punch
 
     @property
-    def races(self):
+    def races(self) -> RaceHistory:
         if self._races is None:
             try:
-                url = self.URL_RACES.format(id=self.id)
-                self._races = self.scraper.get_url(url).json()['data']
-                self._races = list(filter(lambda e: e['event_date'] != '', self._races))
+                self._fetch('races')
             except Exception as e:
                 traceback.print_exc()
-                self._races = []
+                self._races = RaceHistory([])
         return self._races
 
     @property
     def latest_race(self):
-        r = sorted(self.races, key=lambda r: r['event_date'], reverse=True)
-        if len(r) > 0:
-            return r[0]
-        return None
+        return self.races.latest
 
     @property
     def height(self):
@@ -495,10 +674,8 @@ class Profile(Fetchable):
 
     @property
     def weight(self):
-        taglist = self.html.xpath("//th[normalize-space() = 'FTP'][1]/following-sibling::td[1]")
-        if len(taglist) == 1:
-            # 220w ~ 86kg
-            return float(taglist[0].text.strip().split('~', 1)[1].replace('kg', ''))
+        if self.snapshot.weight is not None:
+            return self.snapshot.weight
         # Fall back to using weight from latest race
         race = self.latest_race
         if not race:
@@ -507,26 +684,20 @@ class Profile(Fetchable):
         return weight if weight > 0 else None
 
     @property
-    def cp_watts(self):
-        if not self._cp_watts:
+    def cp_watts(self) -> Optional[CPCurve]:
+        if self._cp_watts is None:
             try:
-                url_watts = self.URL_CP.format(id=self.id, type='watts')
-                self._cp_watts = self.scraper.get_url(url_watts).json()
+                self._fetch('cp_watts')
             except:
                 traceback.print_exc()
                 return None
-        if not self._cp_watts or len(self._cp_watts['efforts']) == 0:
-            return None
-        return {effort: {p['x']: p['y'] for p in data} for effort, data in self._cp_watts['efforts'].items()}
+        return self._cp_watts or None
 
     @property
-    def cp_wkg(self):
-        if not self._cp_wkg:
-            url_wkg = self.URL_CP.format(id=self.id, type='wkg')
-            self._cp_wkg = self.scraper.get_url(url_wkg).json()
-        if not self._cp_wkg or len(self._cp_wkg['efforts']) == 0:
-            return None
-        return {effort: {p['x']: p['y'] for p in data} for effort, data in self._cp_wkg['efforts'].items()}
+    def cp_wkg(self) -> Optional[CPCurve]:
+        if self._cp_wkg is None:
+            self._fetch('cp_wkg')
+        return self._cp_wkg or None
 
     @property
     def power_profile(self):
@@ -538,40 +709,29 @@ class Profile(Fetchable):
         :return: A dict of the form {'wkg':{15:1000,60:700,300:350,1200:270},'watt':{...}}
         :rtype: dict
         """
-        try:
-            sc = next(filter(lambda s: 'function load_profile_spider()' in s.text, self.html.find('script')))
-            decoded = [self._decode_spider(x) for x in re.findall(r'{ mean:[^}]* }', sc.text)]
-            ret = {
-                'wkg': dict(zip([15, 60, 300, 1200], decoded[:4])),
-                'watt': dict(zip([15, 60, 300, 1200], decoded[4:])),
-            }
-            return ret
-        except (StopIteration, demjson.JSONDecodeError):
-            traceback.print_exc()
-            return {
-               'wkg': {
-                   15: {'pct': None, 'top': None, 'value': None},
-                   60: {'pct': None, 'top': None, 'value': None},
-                   300: {'pct': None, 'top': None, 'value': None},
-                   1200: {'pct': None, 'top': None, 'value': None},
-               },
-               'watt': {
-                   15: {'pct': None, 'top': None, 'value': None},
-                   60: {'pct': None, 'top': None, 'value': None},
-                   300: {'pct': None, 'top': None, 'value': None},
-                   1200: {'pct': None, 'top': None, 'value': None},
-               }
-            }
+        if self.snapshot.power_profile is not None:
+            return self.snapshot.power_profile
+        return {
+           'wkg': {
+               15: {'pct': None, 'top': None, 'value': None},
+               60: {'pct': None, 'top': None, 'value': None},
+               300: {'pct': None, 'top': None, 'value': None},
+               1200: {'pct': None, 'top': None, 'value': None},
+           },
+           'watt': {
+               15: {'pct': None, 'top': None, 'value': None},
+               60: {'pct': None, 'top': None, 'value': None},
+               300: {'pct': None, 'top': None, 'value': None},
+               1200: {'pct': None, 'top': None, 'value': None},
+           }
+        }
 
     @property
     def country(self):
-        taglist = self.html.xpath("//th[normalize-space() = 'Country'][1]/following-sibling::td[1]")
-        if len(taglist) == 1:
-            # 220w ~ 86kg
-            return taglist[0].text.strip()
-        else:
+        country = self.snapshot.country
+        if country is None:
             logger.warning("Could not find country for %s", self.id)
-            return None
+        return country
 
     @property
     def flag(self):
@@ -581,20 +741,12 @@ class Profile(Fetchable):
 
     @property
     def rs(self):
-        taglist = self.html.xpath("//th[normalize-space() = 'Zwift Racing Score'][1]/following-sibling::td[1]/b")
-        if len(taglist) == 1:
-            return taglist[0].text.strip()
+        return self.snapshot.rs
 
     @property
     def team(self) -> Team:
-        taglist = self.html.xpath("//th[normalize-space() = 'Team'][1]/following-sibling::td[1]/a")
-
-        if len(taglist) == 1:
-            href = taglist[0].attrs['href']
-            parsed_url = urlparse(href)
-            parsed_qs = parse_qs(parsed_url.query)
-            if 'id' in parsed_qs:
-                return Team(parsed_qs['id'][0], self.scraper)
+        if self.snapshot.team_id is not None:
+            return self.scraper.team(self.snapshot.team_id)
 
     def __str__(self):
         return "{0.name} ({0.cat}) <{0.id}>".format(self)
@@ -602,66 +754,279 @@ class Profile(Fetchable):
     def __repr__(self):
         return "<{} id={}>".format(type(self).__name__, self.id)
 
-    @staticmethod
-    def _decode_spider(x):
-        values = demjson.decode(x)
-        top = {
-            '#f26f33': 1,
-            '#0a7dce': 2,
-            '#7CB5EC': 3,
-        }
-        return {
-            'top': top.get(values['color'], None),
-            'value': values['ours'].split(' ')[0],
-            'pct': values['y'],
-        }
-
 
 class Scraper:
     DEFAULT_SLEEP = 5.0
+    DEFAULT_CONCURRENCY = 4
+    MAX_RETRIES = 3
+    #: Log in again this many seconds before the session cookies expire
+    REFRESH_MARGIN = 300
+    #: Number of Profile, Team and Race objects kept alive by profile(), team() and race()
+    IDENTITY_MAP_SIZES = {Profile: 1000, Team: 100, Race: 50}
+    #: Seconds after which profile(), team() and race() start over with a fresh object
+    IDENTITY_MAX_AGE = 600
     HOST = 'https://zwiftpower.com'
     ROOT = '/'
 
-    def __init__(self, username: str, password: str, sleep: float = None, session: Session = None):
+    def __init__(self, username: str, password: str, sleep: float = None, session: Session = None,
+                 rate_limiter: TokenBucket = None, concurrency: int = None, cookie_store: auth.CookieStore = None,
+                 store=None):
+        """
+        :param sleep: Minimum interval between uncached requests. Ignored if ``rate_limiter`` is given
+        :param rate_limiter: Limiter for requests going to ZwiftPower, shared by all threads using this scraper
+        :param concurrency: Maximum number of requests in flight when fetching in bulk
+        :param cookie_store: Where to keep the login session between runs
+        :param store: A :class:`~.store.RiderStore` to write decoded profiles and teams to, and read them from
+                      while they're fresh
+        """
         if not all([username, password]):
             raise Exception("Username or password empty")
-        self.sleep = self.DEFAULT_SLEEP if sleep is None else sleep
+        if rate_limiter is None:
+            rate_limiter = TokenBucket.from_interval(self.DEFAULT_SLEEP if sleep is None else sleep)
+        self.rate_limiter = rate_limiter
+        self.concurrency = self.DEFAULT_CONCURRENCY if concurrency is None else concurrency
         self.session = session if session is not None else Session()
-        self.session.headers.update({'User-Agent': requests_html.user_agent()})
+        self.session.headers.update({'User-Agent': USER_AGENT})
         self._username = username
         self._password = password
+        # Requests may come from several threads (see AsyncScraper), but only one of them should log in
+        self._login_lock = threading.Lock()
+        self._logins = 0
+        self._last_login = 0.0
+        # Requests and decodes currently in progress, so concurrent callers can wait for them instead
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        #: Counters. coalesced_requests/coalesced_loads: requests saved by sharing an in-flight one
+        self.stats = collections.Counter()
+        self._stats_lock = threading.Lock()
+        self.metrics = ScraperMetrics()
+        self.metrics.register('scraper', self.stats_copy)
+        self.metrics.register('rate_limiter', getattr(self.rate_limiter, 'stats_copy', self.rate_limiter.stats))
+        self._objects = {type_: IdentityMap(size, max_age=self.IDENTITY_MAX_AGE)
+                         for type_, size in self.IDENTITY_MAP_SIZES.items()}
+        self.cookie_store = cookie_store
+        if cookie_store is not None:
+            cookie_store.load(self.session.cookies)
+        self.store = store
+        #: Per thread: how many store_disabled() blocks it's in
+        self._store_disabled = threading.local()
+
+    def _count(self, counter: str):
+        with self._stats_lock:
+            self.stats[counter] += 1
+
+    def stats_copy(self) -> dict:
+        """:attr:`stats`, copied under the lock the worker threads update it with"""
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def _single_flight(self, key: Hashable, fn: Callable[[], Any], counter: str) -> Any:
+        """Call fn, unless a call for the same key is already in progress. In that case wait for its result."""
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self._count(counter)
+        if not leader:
+            logger.debug("Waiting for in-flight %r", key)
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    def load(self, obj: Fetchable, resource: str, use_store: bool = None):
+        """
+        Fetch and decode one of ``obj``'s resources. Objects loading the same resource concurrently share it.
+
+        :param use_store: Whether the store may be read, by default unless the calling thread is in
+            :meth:`store_disabled`
+        """
+        if use_store is None:
+            use_store = self.reads_store()
+        url = obj.resource_url(resource)
+        key = (type(obj), resource, url, use_store)
+        data = self._single_flight(key, lambda: self._load(obj, resource, url, use_store), 'coalesced_loads')
+        setattr(obj, '_' + resource, data)
+
+    def _load(self, obj: Fetchable, resource: str, url: str, use_store: bool):
+        if self.store is not None and use_store:
+            data = self.store.get(obj, resource)
+            if data is not None:
+                self._count('store_hits')
+                return data
+        resp = self.get_url(url)
+        start = time.perf_counter()
+        data = obj._decode(resource, resp)
+        self.metrics.observe_parse(type(obj).__name__, time.perf_counter() - start)
+        if self.store is not None:
+            self.store.put(obj, resource, data)
+        return data
+
+    def reads_store(self) -> bool:
+        """Whether loads in the calling thread may be served from the store"""
+        return self.store is not None and not getattr(self._store_disabled, 'depth', 0)
+
+    @contextlib.contextmanager
+    def store_disabled(self):
+        """
+        Fetch instead of reading from the store (still writing to it) within this block. Only affects the calling
+        thread, and the bulk fetches it starts.
+        """
+        self._store_disabled.depth = getattr(self._store_disabled, 'depth', 0) + 1
+        try:
+            yield
+        finally:
+            self._store_disabled.depth -= 1
 
     def get_url(self, url: str, is_login=False) -> Response:
+        return self._single_flight((url, is_login), lambda: self._get_url(url, is_login), 'coalesced_requests')
+
+    def _get_url(self, url: str, is_login: bool) -> Response:
         logger.debug("GET %s", url)
-        resp = self.session.get(url)
+        logins = self._logins
+        if not is_login and self._session_expiring() and not self._is_cached(url):
+            # No point in sending the request only to get the login page back
+            logger.info("Session cookies (about to) expire")
+            self._relogin(logins)
+            logins = self._logins
+        resp = self._request(url)
         # If we get a 403 or a login-page, do the login-dance
         if not is_login and (resp.status_code == 403 or not Scraper._is_logged_in(resp)):
-            logger.warning("Logged out - logging in")
-            if hasattr(resp, 'cache_key'):
-                # If we're using requests-cache, evict the logged-out response
-                self.session.cache.delete(resp.cache_key)
-            self.login()
-            logger.info("Login successful")
-            resp = self.session.get(url)
+            self.evict(resp)
+            self._relogin(logins)
+            resp = self._request(url)
             resp.raise_for_status()
         else:
             resp.raise_for_status()
 
         if not getattr(resp, 'from_cache', False):
             logger.debug("CACHE MISS: %s" % url)
-            time.sleep(self.sleep)
         else:
             logger.debug("CACHE HIT:  %s" % url)
         return resp
 
+    def _request(self, url: str) -> Response:
+        """GET url within the rate limit, retrying when ZwiftPower asks us to back off"""
+        for attempt in range(self.MAX_RETRIES + 1):
+            limited = attempt > 0 or not self._is_cached(url)
+            if limited:
+                self.rate_limiter.acquire()
+            start = time.perf_counter()
+            resp = self.session.get(url)
+            self.metrics.observe_request(url, resp, time.perf_counter() - start)
+            if getattr(resp, 'from_cache', False):
+                return resp
+            if not limited:
+                self.rate_limiter.charge()
+            backoff = self.rate_limiter.feedback(resp)
+            if backoff is None:
+                return resp
+            logger.warning("GET %s returned %d (attempt %d)", url, resp.status_code, attempt + 1)
+        return resp
+
+    def evict(self, resp: Response):
+        """Remove a response from the cache, if we're using requests-cache"""
+        if hasattr(resp, 'cache_key'):
+            self.session.cache.delete(resp.cache_key)
+
+    def evict_url(self, url: str):
+        """Remove the cached response for ``url``, if we're using requests-cache"""
+        cache = getattr(self.session, 'cache', None)
+        if cache is not None:
+            cache.delete(urls=[url])
+
+    def _session_expiring(self) -> bool:
+        # Don't keep refreshing if ZwiftPower hands out cookies that live shorter than the margin
+        margin = self.REFRESH_MARGIN if time.time() - self._last_login > self.REFRESH_MARGIN else 0
+        return auth.cookies_expired(self.session.cookies, margin=margin)
+
+    def _is_cached(self, url: str) -> bool:
+        cache = getattr(self.session, 'cache', None)
+        if cache is None:
+            return False
+        if hasattr(cache, 'contains'):
+            return cache.contains(url=url)
+        return cache.has_url(url)
+
+    def fetch_all(self, items: Iterable[Tuple[Fetchable, str]]):
+        """
+        Fetch many (object, resource) pairs concurrently, within the rate limit. Resources that are already loaded
+        are skipped. Failures are logged and left for the object's properties to deal with on access.
+        """
+        todo = [(obj, resource) for obj, resource in items if not obj.is_loaded(resource)]
+        if not todo:
+            return
+        # The workers don't see the calling thread's store_disabled()
+        use_store = self.reads_store()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='zwiftpower') as pool:
+            futures = {pool.submit(self.load, obj, resource, use_store): (obj, resource) for obj, resource in todo}
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    obj, resource = futures[future]
+                    logger.warning("Could not fetch %s of %r", resource, obj, exc_info=future.exception())
+
+    def prefetch_profiles(self, ids: Iterable[Union[int, Profile]],
+                          resources: Iterable[str] = ('html', 'races', 'cp_watts', 'cp_wkg')) -> List[Profile]:
+        """
+        Load ``resources`` for many profiles in one bulk phase, so they can be rendered without further requests.
+
+        :param ids: Zwift ids, or Profile objects to fill in
+        :return: The profiles, in the same order as ``ids``
+        """
+        profiles = [id_ if isinstance(id_, Profile) else self.profile(id_) for id_ in ids]
+        resources = tuple(resources)
+        self.fetch_all((profile, resource) for profile in profiles for resource in resources)
+        return profiles
+
+    def _object(self, type_, id_):
+        # Ids come in as ints and as strings parsed from URLs
+        return self._objects[type_].get(int(id_), lambda: type_(int(id_), scraper=self))
+
     def profile(self, id_: int) -> Profile:
-        return Profile(id_, scraper=self)
+        return self._object(Profile, id_)
 
     def team(self, id_: int) -> Team:
-        return Team(id_, scraper=self)
+        return self._object(Team, id_)
 
     def race(self, id_: int) -> Race:
-        return Race(id_, scraper=self)
+        return self._object(Race, id_)
+
+    def invalidate(self, id_: int = None, type_: type = None):
+        """
+        Forget the live object(s) for ``id_`` (or all of them), so the next lookup fetches them again.
+        The HTTP cache isn't touched.
+        """
+        for t, objects in self._objects.items():
+            if type_ is None or t is type_:
+                objects.invalidate(None if id_ is None else int(id_))
+
+    def identity_stats(self) -> dict:
+        """Size and hit/miss/eviction counters of the identity maps, per type"""
+        return {t.__name__: objects.info() for t, objects in self._objects.items()}
+
+    def _relogin(self, logins_seen: int):
+        with self._login_lock:
+            if self._logins != logins_seen:
+                logger.debug("Already logged in by a concurrent request")
+                return
+            logger.warning("Logged out - logging in")
+            self.login()
+            self._logins += 1
+            self._count('logins')
+            self._last_login = time.time()
+            logger.info("Login successful")
+            if self.cookie_store is not None:
+                self.cookie_store.save(self.session.cookies)
 
     def login(self):
         logger.debug("Logging in")
@@ -699,4 +1064,4 @@ class Scraper:
 
     @staticmethod
     def _is_logged_in(resp: Response):
-        return html(resp).find('form#login', first=True) is None
+        return auth.is_logged_in(resp)
@@ -0,0 +1,243 @@
+"""
+A local stand-in for ZwiftPower serving a fixture corpus, for testing the scraper offline.
+
+Usage: python -m bakpdlbot.zwiftpower.standin CORPUS [--port 8000] [--latency 0.2] [--require-login] ...
+
+Point a scraper at it with :func:`redirect`.
+"""
+import collections
+import itertools
+import logging
+import secrets
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import click
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from .fixtures import FixtureCorpus, fixture_key
+
+logger = logging.getLogger(__name__)
+
+SESSION_COOKIE = 'standin_session'
+
+FRONT_PAGE = b"""<html><body>
+<form id="login" method="post"><a href="{base}/zwift-login">Login with Zwift</a></form>
+</body></html>"""
+
+ZWIFT_LOGIN_PAGE = b"""<html><body>
+<form id="form" action="{base}/signon" method="post">
+<input name="username"><input name="password" type="password"><input name="rememberMe" value="on">
+<input name="state" value="stand-in">
+</form>
+</body></html>"""
+
+LOGGED_IN_PAGE = b"<html><body><h3>Logged in</h3></body></html>"
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Serves the fixtures of a corpus by path and query, simulating ZwiftPower's misbehaviours:
+
+    :param latency: Seconds to wait before answering each request
+    :param require_login: Serve the logged out front page until the scraper has logged in via the fake Zwift
+                          login form
+    :param session_ttl: Seconds a login lasts (sent as the cookie's Max-Age, and enforced)
+    :param forbid_every: Answer every n-th request with a 403
+    :param rate_limit: ``(requests, seconds)``: answer with 429 beyond that many requests in a sliding window
+    :param retry_after: Retry-After of the 429 responses
+    :param public_url: Where the login pages point to. The default keeps a scraper using :func:`redirect` on
+                       "zwiftpower.com" throughout, so it keeps its cookies there
+    """
+    daemon_threads = True
+
+    def __init__(self, corpus: FixtureCorpus, address: Tuple[str, int] = ('127.0.0.1', 0), latency: float = 0.0,
+                 require_login: bool = False, session_ttl: Optional[float] = None, forbid_every: int = None,
+                 rate_limit: Tuple[int, float] = None, retry_after: float = 1.0,
+                 public_url: str = 'https://zwiftpower.com'):
+        super().__init__(address, StandInHandler)
+        self.corpus = corpus
+        self.latency = latency
+        self.require_login = require_login
+        self.session_ttl = session_ttl
+        self.forbid_every = forbid_every
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.public_url = public_url
+        self.sessions = {}
+        self._lock = threading.Lock()
+        self._count = itertools.count(1)
+        self._recent = collections.deque()
+        #: Counters: requests, logins, forbidden, rate_limited, logged_out, not_found
+        self.stats = collections.Counter()
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self) -> 'StandInServer':
+        self._thread = threading.Thread(target=self.serve_forever, name='standin', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def expire_sessions(self):
+        """Log everybody out"""
+        with self._lock:
+            self.sessions.clear()
+
+    def login(self) -> str:
+        token = secrets.token_hex(16)
+        with self._lock:
+            self.sessions[token] = time.monotonic() + (self.session_ttl or float('inf'))
+            self.stats['logins'] += 1
+        return token
+
+    def logged_in(self, token: Optional[str]) -> bool:
+        with self._lock:
+            return token is not None and self.sessions.get(token, 0) > time.monotonic()
+
+    def admit(self) -> Optional[int]:
+        """Count a request, and return the error status to simulate for it, if any"""
+        with self._lock:
+            n = next(self._count)
+            self.stats['requests'] += 1
+            if self.forbid_every and n % self.forbid_every == 0:
+                self.stats['forbidden'] += 1
+                return 403
+            if self.rate_limit:
+                limit, window = self.rate_limit
+                now = time.monotonic()
+                while self._recent and self._recent[0] <= now - window:
+                    self._recent.popleft()
+                if len(self._recent) >= limit:
+                    self.stats['rate_limited'] += 1
+                    return 429
+                self._recent.append(now)
+        return None
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: StandInServer
+
+    def log_message(self, format, *args):
+        logger.debug("%s " + format, self.address_string(), *args)
+
+    def _token(self) -> Optional[str]:
+        morsel = SimpleCookie(self.headers.get('Cookie', '')).get(SESSION_COOKIE)
+        return morsel.value if morsel else None
+
+    def _send(self, status: int, body: bytes = b'', content_type: str = 'text/html', headers: dict = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _page(self, template: bytes) -> bytes:
+        return template.replace(b'{base}', self.server.public_url.encode())
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        status = server.admit()
+        if status == 429:
+            return self._send(429, b'Too many requests', headers={'Retry-After': str(server.retry_after)})
+        if status is not None:
+            return self._send(status, b'Forbidden')
+
+        key = fixture_key(self.path)
+        if key == '/':
+            return self._send(200, self._page(FRONT_PAGE))
+        if key == '/zwift-login':
+            return self._send(200, self._page(ZWIFT_LOGIN_PAGE))
+        if server.require_login and not server.logged_in(self._token()):
+            server.stats['logged_out'] += 1
+            return self._send(200, self._page(FRONT_PAGE))
+        fixture = server.corpus.get(key)
+        if fixture is None:
+            server.stats['not_found'] += 1
+            return self._send(404, b'No fixture for ' + key.encode())
+        self._send(fixture.status, fixture.body, fixture.content_type, fixture.headers)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if fixture_key(self.path) != '/signon':
+            return self._send(404)
+        cookie = '{}={}; Path=/'.format(SESSION_COOKIE, self.server.login())
+        if self.server.session_ttl:
+            cookie += '; Max-Age={}'.format(int(self.server.session_ttl))
+        self._send(200, LOGGED_IN_PAGE, headers={'Set-Cookie': cookie})
+
+
+class RedirectAdapter(HTTPAdapter):
+    """
+    Sends requests to another server while keeping the original URL everywhere else: cookies are stored for, and
+    responses carry, the URL that was asked for.
+    """
+
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base = urlsplit(base_url)
+
+    def send(self, request, **kwargs):
+        original = request.url
+        parts = urlsplit(original)
+        redirected = request.copy()
+        redirected.url = urlunsplit((self.base.scheme, self.base.netloc, parts.path, parts.query, parts.fragment))
+        resp = super().send(redirected, **kwargs)
+        resp.url = original
+        resp.request = request
+        return resp
+
+
+def redirect(session: Session, base_url: str, prefix: str = 'https://zwiftpower.com'):
+    """Make ``session`` send requests for ``prefix`` to ``base_url``, e.g. a :class:`StandInServer`"""
+    session.mount(prefix, RedirectAdapter(base_url))
+
+
+@click.command()
+@click.argument('corpus', type=click.Path(exists=True, file_okay=False))
+@click.option('--port', type=int, default=8000, show_default=True)
+@click.option('--latency', type=float, default=0.0, show_default=True, help='Seconds to wait before each answer')
+@click.option('--require-login', is_flag=True, help='Serve the logged out page until logged in')
+@click.option('--session-ttl', type=float, help='Seconds a login lasts')
+@click.option('--forbid-every', type=int, help='Answer every n-th request with a 403')
+@click.option('--rate-limit', type=(int, float), default=None, help='REQUESTS SECONDS: answer 429 beyond this rate')
+@click.option('--debug', is_flag=True, help='Log every request')
+def main(corpus, port, latency, require_login, session_ttl, forbid_every, rate_limit, debug):
+    """Serve a recorded fixture corpus as a stand-in for ZwiftPower"""
+    logging.basicConfig(level=logging.DEBUG if debug else logging.INFO)
+    server = StandInServer(FixtureCorpus(corpus), ('127.0.0.1', port), latency=latency,
+                           require_login=require_login, session_ttl=session_ttl, forbid_every=forbid_every,
+                           rate_limit=rate_limit)
+    click.echo("Serving {} fixtures on {}".format(len(server.corpus), server.base_url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        click.echo(dict(server.stats))
+
+
+if __name__ == '__main__':
+    main()
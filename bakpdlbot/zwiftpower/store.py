@@ -0,0 +1,299 @@
+"""
+Local SQLite store of what we know about riders, so it can be queried without re-parsing cached responses.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from .cp import CPCurve, CPWindow
+from .history import RaceHistory
+from .results import decodeentities
+from .scraper import Fetchable, ProfileSnapshot
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS riders (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    team_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS riders_name ON riders (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS riders_team ON riders (team_id);
+
+CREATE TABLE IF NOT EXISTS snapshots (
+    rider_id INTEGER PRIMARY KEY,
+    name TEXT,
+    cat TEXT,
+    rank INTEGER,
+    zftp INTEGER,
+    weight REAL,
+    country TEXT,
+    rs TEXT,
+    team_id TEXT,
+    punch REAL,
+    power_profile TEXT
+);
+
+CREATE TABLE IF NOT EXISTS cp_points (
+    rider_id INTEGER,
+    type TEXT,
+    effort TEXT,
+    duration INTEGER,
+    value,
+    PRIMARY KEY (rider_id, type, effort, duration)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS races (
+    rider_id INTEGER,
+    event_date NUMERIC,
+    f_t TEXT,
+    event_title TEXT,
+    height TEXT,
+    weight TEXT
+);
+CREATE INDEX IF NOT EXISTS races_rider ON races (rider_id, event_date);
+
+CREATE TABLE IF NOT EXISTS team_members (
+    team_id INTEGER,
+    rider_id INTEGER,
+    position INTEGER,
+    name TEXT,
+    data TEXT,
+    PRIMARY KEY (team_id, rider_id)
+);
+CREATE INDEX IF NOT EXISTS team_members_rider ON team_members (rider_id);
+
+CREATE TABLE IF NOT EXISTS fetched (
+    kind TEXT,
+    id INTEGER,
+    resource TEXT,
+    fetched REAL,
+    PRIMARY KEY (kind, id, resource)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS signals (
+    rider_id INTEGER,
+    name TEXT,
+    value TEXT,
+    PRIMARY KEY (rider_id, name)
+) WITHOUT ROWID;
+"""
+
+HOUR = 3600
+
+
+class RiderStore:
+    """
+    Riders, profile snapshots, CP points, race histories and team membership in SQLite.
+
+    :class:`Scraper` writes every decoded profile and team resource through to the store, and reads it back
+    instead of fetching as long as it is younger than its :attr:`TTL`.
+    """
+    #: Seconds a stored resource is used before it is fetched again, per (type, resource). Follows cache.py.
+    TTL = {
+        ('Profile', 'html'): 12 * HOUR,
+        ('Profile', 'races'): 6 * HOUR,
+        ('Profile', 'cp_watts'): 6 * HOUR,
+        ('Profile', 'cp_wkg'): 6 * HOUR,
+        ('Team', 'riders_json'): 1 * HOUR,
+    }
+    RACE_COLUMNS = ('event_date', 'f_t', 'event_title', 'height', 'weight')
+
+    def __init__(self, path: Union[str, Path], clock=time.time):
+        self.path = path
+        self._clock = clock
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+            # Stores made before team_members had the roster names
+            if 'name' not in [row['name'] for row in self._db.execute("PRAGMA table_info(team_members)")]:
+                self._db.execute("ALTER TABLE team_members ADD COLUMN name TEXT")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def clear(self):
+        with self._lock, self._db:
+            for table in ('riders', 'snapshots', 'cp_points', 'races', 'team_members', 'fetched', 'signals'):
+                self._db.execute("DELETE FROM {}".format(table))
+
+    def stores(self, obj: Fetchable, resource: str) -> bool:
+        return (type(obj).__name__, resource) in self.TTL
+
+    def fetched_at(self, kind: str, id_: int, resource: str) -> Optional[float]:
+        with self._lock:
+            row = self._db.execute("SELECT fetched FROM fetched WHERE kind = ? AND id = ? AND resource = ?",
+                                   (kind, id_, resource)).fetchone()
+        return row[0] if row else None
+
+    def is_fresh(self, kind: str, id_: int, resource: str) -> bool:
+        fetched = self.fetched_at(kind, id_, resource)
+        return fetched is not None and self._clock() - fetched < self.TTL[(kind, resource)]
+
+    def touch(self, kind: str, id_: int, resource: str):
+        """Mark a stored resource as fetched just now, e.g. when we know it hasn't changed"""
+        with self._lock, self._db:
+            self._db.execute("UPDATE fetched SET fetched = ? WHERE kind = ? AND id = ? AND resource = ?",
+                             (self._clock(), kind, id_, resource))
+
+    def signal(self, rider_id: int, name: str) -> Optional[str]:
+        """The value of a change signal (see :mod:`.refresh`) when the rider was last refreshed"""
+        with self._lock:
+            row = self._db.execute("SELECT value FROM signals WHERE rider_id = ? AND name = ?",
+                                   (rider_id, name)).fetchone()
+        return row[0] if row else None
+
+    def set_signal(self, rider_id: int, name: str, value: str):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO signals (rider_id, name, value) VALUES (?, ?, ?)",
+                             (rider_id, name, value))
+
+    def stale(self, kind: str, resource: str, ids: Iterable[int]) -> List[int]:
+        """The ids whose ``resource`` is missing or older than its TTL"""
+        return [id_ for id_ in ids if not self.is_fresh(kind, id_, resource)]
+
+    def get(self, obj: Fetchable, resource: str) -> Any:
+        """The stored, decoded ``resource`` of ``obj`` if it's fresh, otherwise None"""
+        kind = type(obj).__name__
+        if not self.stores(obj, resource) or not self.is_fresh(kind, obj.id, resource):
+            return None
+        with self._lock:
+            if resource == 'html':
+                return self._get_snapshot(obj.id)
+            if resource == 'races':
+                return self._get_races(obj.id)
+            if resource in ('cp_watts', 'cp_wkg'):
+                return self._get_cp(obj.id, resource)
+            if resource == 'riders_json':
+                return self._get_members(obj.id)
+
+    def put(self, obj: Fetchable, resource: str, data: Any):
+        """Store the decoded ``resource`` of ``obj``, replacing what was stored before"""
+        if not self.stores(obj, resource):
+            return
+        with self._lock, self._db:
+            if resource == 'html':
+                self._put_snapshot(obj.id, data)
+            elif resource == 'races':
+                self._put_races(obj.id, data)
+            elif resource in ('cp_watts', 'cp_wkg'):
+                self._put_cp(obj.id, resource, data)
+            elif resource == 'riders_json':
+                self._put_members(obj.id, data)
+            self._db.execute("INSERT OR REPLACE INTO fetched (kind, id, resource, fetched) VALUES (?, ?, ?, ?)",
+                             (type(obj).__name__, obj.id, resource, self._clock()))
+
+    def _get_snapshot(self, rider_id: int) -> Optional[ProfileSnapshot]:
+        row = self._db.execute("SELECT * FROM snapshots WHERE rider_id = ?", (rider_id,)).fetchone()
+        if row is None:
+            return None
+        fields = {f: row[f] for f in ProfileSnapshot._fields}
+        if fields['power_profile'] is not None:
+            # JSON object keys are strings, the durations are ints
+            fields['power_profile'] = {type_: {int(d): v for d, v in values.items()}
+                                       for type_, values in json.loads(fields['power_profile']).items()}
+        return ProfileSnapshot(**fields)
+
+    def _put_snapshot(self, rider_id: int, snapshot: ProfileSnapshot):
+        fields = snapshot._asdict()
+        fields['power_profile'] = None if snapshot.power_profile is None else json.dumps(snapshot.power_profile)
+        self._db.execute("INSERT OR REPLACE INTO snapshots (rider_id, {}) VALUES (?, {})".format(
+            ', '.join(fields), ', '.join('?' * len(fields))), (rider_id, *fields.values()))
+        self._put_rider(rider_id, snapshot.name, snapshot.team_id)
+
+    def _get_races(self, rider_id: int) -> RaceHistory:
+        rows = self._db.execute("SELECT * FROM races WHERE rider_id = ? ORDER BY event_date", (rider_id,))
+        races = []
+        for row in rows:
+            race = {c: row[c] for c in self.RACE_COLUMNS if row[c] is not None}
+            for c in ('height', 'weight'):
+                if c in race:
+                    race[c] = json.loads(race[c])
+            races.append(race)
+        return RaceHistory(races)
+
+    def _put_races(self, rider_id: int, races: Iterable[Dict]):
+        self._db.execute("DELETE FROM races WHERE rider_id = ?", (rider_id,))
+        self._db.executemany(
+            "INSERT INTO races (rider_id, event_date, f_t, event_title, height, weight) VALUES (?, ?, ?, ?, ?, ?)",
+            [(rider_id, r.get('event_date'), r.get('f_t'), r.get('event_title'),
+              json.dumps(r['height']) if 'height' in r else None,
+              json.dumps(r['weight']) if 'weight' in r else None) for r in races])
+
+    def _get_cp(self, rider_id: int, resource: str) -> CPCurve:
+        rows = self._db.execute("SELECT effort, duration, value FROM cp_points WHERE rider_id = ? AND type = ? "
+                                "ORDER BY effort, duration", (rider_id, resource))
+        points = {}
+        for effort, duration, value in rows:
+            x, y = points.setdefault(effort, ([], []))
+            x.append(duration)
+            y.append(value)
+        return CPCurve({effort: CPWindow(x, y) for effort, (x, y) in points.items()})
+
+    def _put_cp(self, rider_id: int, resource: str, curve: CPCurve):
+        self._db.execute("DELETE FROM cp_points WHERE rider_id = ? AND type = ?", (rider_id, resource))
+        self._db.executemany(
+            "INSERT OR REPLACE INTO cp_points (rider_id, type, effort, duration, value) VALUES (?, ?, ?, ?, ?)",
+            [(rider_id, resource, effort, duration, value)
+             for effort, window in curve.items() for duration, value in window.items()])
+
+    def _get_members(self, team_id: int) -> dict:
+        rows = self._db.execute("SELECT data FROM team_members WHERE team_id = ? ORDER BY position", (team_id,))
+        return {'data': [json.loads(data) for data, in rows]}
+
+    def _put_members(self, team_id: int, riders_json: dict):
+        members = riders_json.get('data') or []
+        self._db.execute("DELETE FROM team_members WHERE team_id = ?", (team_id,))
+        self._db.executemany("INSERT OR REPLACE INTO team_members (team_id, rider_id, position, name, data) "
+                             "VALUES (?, ?, ?, ?, ?)",
+                             [(team_id, m['zwid'], i, decodeentities(m.get('name')), json.dumps(m))
+                              for i, m in enumerate(members)])
+        # Riders who left the team
+        self._db.execute("UPDATE riders SET team_id = NULL WHERE team_id = ? AND id NOT IN "
+                         "(SELECT rider_id FROM team_members WHERE team_id = ?)", (team_id, team_id))
+        for m in members:
+            self._put_rider(m['zwid'], decodeentities(m.get('name')), team_id)
+
+    def _put_rider(self, rider_id: int, name: Optional[str], team_id):
+        self._db.execute("INSERT INTO riders (id, name, team_id) VALUES (?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+                         "name = coalesce(excluded.name, name), team_id = coalesce(excluded.team_id, team_id)",
+                         (rider_id, name, int(team_id) if team_id else None))
+
+    def rider(self, rider_id: int) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute("SELECT * FROM riders WHERE id = ?", (rider_id,)).fetchone()
+
+    def team_riders(self, team_id: int) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute("SELECT * FROM riders WHERE team_id = ? ORDER BY name", (team_id,)).fetchall()
+
+    def find_riders(self, q: str, team_id: int = None) -> List[int]:
+        """
+        Ids of the riders named ``q``. If there are none, those whose name starts with ``q``, and failing that those
+        whose name contains it. Case insensitive.
+
+        With a ``team_id``, only the current members of that team are searched, by their names on the team's roster.
+        """
+        like = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        if team_id is not None:
+            query = "SELECT rider_id FROM team_members WHERE team_id = ? AND {} ORDER BY name"
+            params = (team_id,)
+        else:
+            query = "SELECT id FROM riders WHERE {} ORDER BY name"
+            params = ()
+        with self._lock:
+            for match, value in (("name = ? COLLATE NOCASE", q),
+                                 ("name LIKE ? ESCAPE '\\'", like + '%'),
+                                 ("name LIKE ? ESCAPE '\\'", '%' + like + '%')):
+                rows = self._db.execute(query.format(match), (*params, value)).fetchall()
+                if rows:
+                    return [row[0] for row in rows]
+        return []
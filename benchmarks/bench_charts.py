@@ -0,0 +1,49 @@
+"""
+Compare rendering riderlist charts with matplotlib and with the plain SVG writer.
+
+Usage (with bakpdlbot installed): python benchmarks/bench_charts.py [--riders 8] [--number 20]
+
+Charts are made from synthetic CP curves. The matplotlib time of the first chart, which includes importing and
+setting up matplotlib, is reported separately since a short riderlist run pays it once.
+"""
+import math
+import random
+import sys
+import time
+import timeit
+
+import click
+
+from bakpdlbot import charts, svgchart
+from bakpdlbot.charts import CPChart, PowerBars
+
+
+def synthetic_charts(riders: int):
+    rng = random.Random(1)
+    durations = list(range(1, 60)) + list(range(60, 3600, 30)) + list(range(3600, 14401, 300))
+    plots = []
+    for i in range(riders):
+        ftp = rng.uniform(2.5, 5.0)
+        plots.append((durations, [round(ftp * (1 + 3 / math.log(d + 2.0)), 2) for d in durations], 'Rider {}'.format(i)))
+    bars = PowerBars([label for _, _, label in plots], [y[durations.index(300)] for _, y, _ in plots], 300, 'wkg')
+    return CPChart(plots, "90 day CP", 'wkg'), bars
+
+
+@click.command()
+@click.option('--riders', default=8, show_default=True, help='Riders per chart')
+@click.option('--number', default=20, show_default=True, help='Iterations per chart and renderer')
+def main(riders, number):
+    cp, bars = synthetic_charts(riders)
+    start = time.perf_counter()
+    charts.render(cp, 'svg')
+    click.echo("matplotlib first chart, including import: {:.0f} ms".format((time.perf_counter() - start) * 1000))
+
+    click.echo("{:12} {:>16} {:>16} {:>8}".format('chart', 'matplotlib ms', 'svgchart ms', 'speedup'))
+    for name, chart in (('cp', cp), ('power bars', bars)):
+        mpl = timeit.timeit(lambda: charts.render(chart, 'svg'), number=number) / number * 1000
+        svg = timeit.timeit(lambda: svgchart.render(chart), number=number) / number * 1000
+        click.echo("{:12} {:16.2f} {:16.2f} {:7.1f}x".format(name, mpl, svg, mpl / svg))
+
+
+if __name__ == '__main__':
+    sys.exit(main())  # pragma: no cover
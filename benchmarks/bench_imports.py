@@ -0,0 +1,66 @@
+"""
+Check the cold start of the command line entry points against an import time budget.
+
+Usage (with bakpdlbot installed): python benchmarks/bench_imports.py [--runs 5] [--top 10]
+
+Each module is imported in a fresh interpreter with ``-X importtime``, and ``--help`` of each entry point is timed
+as a whole. Reports the median of the runs and the slowest imports, and exits with 1 when over budget.
+"""
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import click
+
+#: Milliseconds of cumulative import time of the module, and of wall clock time of running it with --help
+BUDGETS = {
+    'bakpdlbot.riderlist': (500, 900),
+    'bakpdlbot.cli': (150, 400),
+}
+
+
+def import_times(module: str) -> Dict[str, int]:
+    """Cumulative import time in microseconds of every module imported by importing ``module``"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                          capture_output=True, text=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, _, cumulative, name = [p.strip() for p in line.replace('import time:', '|').split('|')]
+        times[name] = int(cumulative)
+    return times
+
+
+def help_time(module: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', module, '--help'], capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def slowest(times: Dict[str, int], module: str, top: int) -> List[Tuple[str, int]]:
+    return sorted(((n, t) for n, t in times.items() if n != module), key=lambda t: -t[1])[:top]
+
+
+@click.command()
+@click.option('--runs', default=5, show_default=True, help='Fresh interpreters per module')
+@click.option('--top', default=10, show_default=True, help='Number of slowest imports to show')
+def main(runs, top):
+    over = False
+    for module, (import_budget, help_budget) in BUDGETS.items():
+        samples = [import_times(module) for _ in range(runs)]
+        imported = statistics.median(s[module] for s in samples) / 1000
+        helped = statistics.median(help_time(module) for _ in range(runs)) * 1000
+        ok = imported <= import_budget and helped <= help_budget
+        over = over or not ok
+        click.echo("{}: import {:.0f} ms (budget {}), --help {:.0f} ms (budget {}) {}".format(
+            module, imported, import_budget, helped, help_budget, 'ok' if ok else 'OVER BUDGET'))
+        for name, cumulative in slowest(samples[-1], module, top):
+            click.echo("    {:50} {:8.1f} ms".format(name, cumulative / 1000))
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(standalone_mode=False))  # pragma: no cover
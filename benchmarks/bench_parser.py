@@ -0,0 +1,47 @@
+"""
+Compare the HTML parser backends on recorded ZwiftPower pages.
+
+Usage (with bakpdlbot installed): python benchmarks/bench_parser.py PAGE.html [PAGE.html ...]
+
+Each page is parsed with every backend and run through the lookups the scraper does on it (the ProfileSnapshot
+extraction for profiles, the Team and Race selectors otherwise).
+"""
+import sys
+import timeit
+from pathlib import Path
+
+import click
+
+from bakpdlbot.zwiftpower import parser
+from bakpdlbot.zwiftpower.scraper import ProfileSnapshot
+
+LOOKUPS = (
+    'input#team_name', 'input#team_tag', 'textarea#team_info', 'input#team_color', 'input#team_bgcolor',
+    'input#team_bdcolor', 'h3', 'form#login',
+    '.tab-content #t_results .btn-toolbar .btn-group:nth-child(2) button,'
+    '.tab-content #t_signups .btn-toolbar .btn-group:nth-child(1) button',
+)
+
+
+def run(content: bytes, backend: str):
+    doc = parser.parse(content, backend=backend)
+    if b'profile_information' in content:
+        ProfileSnapshot.from_html(doc)
+    else:
+        for selector in LOOKUPS:
+            doc.find(selector, first=True)
+
+
+@click.command()
+@click.option('--number', default=20, show_default=True, help='Iterations per page and backend')
+@click.argument('pages', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+def main(number, pages):
+    click.echo("{:40} {:>16} {:>16} {:>8}".format('page', *['{} ms'.format(b) for b in parser.BACKENDS], 'speedup'))
+    for page in pages:
+        content = Path(page).read_bytes()
+        times = [timeit.timeit(lambda: run(content, b), number=number) / number * 1000 for b in parser.BACKENDS]
+        click.echo("{:40} {:16.2f} {:16.2f} {:7.1f}x".format(Path(page).name[-40:], *times, times[1] / times[0]))
+
+
+if __name__ == '__main__':
+    sys.exit(main())  # pragma: no cover
@@ -21,10 +21,11 @@ requirements = [
         'ago~=0.0.93',
         'requests~=2.25.1',
         'pendulum~=2.1.2',
-        'requests-cache~=0.7.2',
+        'requests-cache>=1.0,<2',
         'demjson3~=3.0.6',
         'requests-html~=0.6.6',
         'matplotlib~=3.5.1',
+        'numpy~=1.21',
         'jinja2~=3.0.3',
         'appdirs~=1.4.4',
         'html5lib~=1.1',
@@ -56,6 +57,10 @@ setup(
         ],
     },
     install_requires=requirements,
+    extras_require={
+        # Faster streaming of big ZwiftPower JSON files
+        'ijson': ['ijson~=3.1'],
+    },
     license="MIT license",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
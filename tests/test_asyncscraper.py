@@ -0,0 +1,50 @@
+"""Tests for the asyncio front-end of the scraper, against the local ZwiftPower stand-in."""
+
+import asyncio
+import unittest
+
+from requests import HTTPError
+
+from bakpdlbot.zwiftpower.asyncscraper import AsyncScraper
+from bakpdlbot.zwiftpower.ratelimit import TokenBucket
+from bakpdlbot.zwiftpower.standin import StandInServer
+
+from . import test_standin
+
+
+class TestAsyncScraper(unittest.TestCase):
+    setUp = test_standin.TestStandIn.setUp
+    tearDown = test_standin.TestStandIn.tearDown
+    scraper = test_standin.TestStandIn.scraper
+
+    def test_concurrent_loads_share_login(self):
+        with StandInServer(self.corpus, latency=0.05, require_login=True) as server:
+            scraper = self.scraper(server, rate_limiter=TokenBucket(None), concurrency=8)
+            ascraper = AsyncScraper(scraper)
+
+            async def load_all():
+                return await asyncio.gather(*[ascraper.load(scraper.profile(id_), ('html', 'cp_wkg', 'races'))
+                                              for id_ in (1, 2, 3)])
+            try:
+                profiles = asyncio.run(load_all())
+            finally:
+                ascraper.close()
+            self.assertEqual([p.name for p in profiles], ['Mick B [BAKPDL]'] * 3)
+            self.assertEqual(scraper.stats['logins'], 1)
+            self.assertEqual(server.stats['logins'], 1)
+
+    def test_errors_reach_callers(self):
+        with StandInServer(self.corpus) as server:
+            scraper = self.scraper(server, rate_limiter=TokenBucket(None))
+            ascraper = AsyncScraper(scraper)
+
+            async def profiles():
+                return await ascraper.profiles([1, 99], resources=('cp_wkg',))
+            try:
+                with self.assertRaises(HTTPError):
+                    asyncio.run(profiles())
+                # Other callers aren't affected
+                profile = asyncio.run(ascraper.profile(2, resources=('cp_wkg',)))
+            finally:
+                ascraper.close()
+            self.assertEqual(profile.cp_wkg['90days'][5], 1000)
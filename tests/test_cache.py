@@ -0,0 +1,43 @@
+"""Tests for the cache policy of ZwiftPower responses."""
+
+import tempfile
+import unittest
+from datetime import timedelta
+from pathlib import Path
+
+from requests_cache.policy.expiration import get_url_expiration
+
+from bakpdlbot.zwiftpower.cache import DEFAULT_EXPIRE_AFTER, URLS_EXPIRE_AFTER, cached_session
+from bakpdlbot.zwiftpower.scraper import Profile, Race, Team
+
+EXPECTED = {
+    Race.URL_RESULTS.format(id=2692522): timedelta(days=1),
+    Race.URL_SIGNUPS.format(id=2692522): timedelta(minutes=15),
+    'https://zwiftpower.com/cache3/results/2692522_zwift.json': timedelta(days=1),
+    'https://zwiftpower.com/events.php?zid=2692522': timedelta(hours=1),
+    Profile.URL_CP.format(id=514482, type='wkg'): timedelta(hours=6),
+    Profile.URL_RACES.format(id=514482): timedelta(hours=6),
+    Profile.URL_PROFILE.format(id=514482): timedelta(hours=12),
+    Team.RIDERS.format(id=13264): timedelta(hours=1),
+    'https://zwiftpower.com/team.php?id=13264': timedelta(days=1),
+}
+
+
+class TestCachePolicy(unittest.TestCase):
+
+    def test_url_expiry(self):
+        for url, expected in EXPECTED.items():
+            with self.subTest(url=url):
+                self.assertEqual(get_url_expiration(url, URLS_EXPIRE_AFTER), expected)
+
+    def test_nothing_is_kept_forever(self):
+        for pattern, expire_after in URLS_EXPIRE_AFTER.items():
+            with self.subTest(pattern=pattern):
+                self.assertIsInstance(expire_after, timedelta)
+
+    def test_session(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            session = cached_session(Path(tmp) / 'cache')
+            self.assertEqual(session.settings.expire_after, DEFAULT_EXPIRE_AFTER)
+            self.assertEqual(session.settings.urls_expire_after, URLS_EXPIRE_AFTER)
+            session.close()
@@ -0,0 +1,125 @@
+"""Tests for rendering charts in worker processes."""
+
+import asyncio
+import tempfile
+import unittest
+from xml.etree import ElementTree
+
+from bakpdlbot import svgchart
+from bakpdlbot.charts import ChartCache, ChartRenderer, ChartSlots, CPChart, PowerBars, chart_key, render
+
+CP = CPChart([([1, 5, 60, 300], [12.0, 9.5, 6.1, 4.8], 'Rider A'),
+              ([1, 5, 60, 300], [10.0, 8.0, None, 4.1], 'Rider B')], "90 day CP", 'w/kg')
+BARS = PowerBars(['Rider A', 'Rider B'], [4.8, 4.1], 300, 'wkg')
+
+
+class TestRender(unittest.TestCase):
+
+    def test_svg_has_no_prolog(self):
+        svg = render(CP, 'svg')
+        self.assertTrue(svg.startswith(b'<svg'))
+        self.assertIn(b'Rider B', svg)
+
+    def test_png(self):
+        self.assertTrue(render(BARS, 'png').startswith(b'\x89PNG'))
+
+    def test_unknown_format(self):
+        with self.assertRaises(Exception):
+            render(CP, 'gif')
+
+
+class TestChartRenderer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.renderer = ChartRenderer(max_workers=2).warm_up()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.renderer.close()
+
+    def test_render_async(self):
+        png = asyncio.run(self.renderer.render_async(CP))
+        self.assertTrue(png.startswith(b'\x89PNG'))
+
+    def test_slots(self):
+        slots = ChartSlots(self.renderer)
+        text = "<div>{}</div><div>{}</div>".format(slots.add(CP), slots.add(BARS._replace(direction='vertical')))
+        self.assertIn('<!--chart:', text)
+        filled = slots.fill(text)
+        self.assertNotIn('<!--chart:', filled)
+        self.assertEqual(filled.count('<svg'), 2)
+
+    def test_slots_failed_chart(self):
+        slots = ChartSlots(self.renderer)
+        text = "<div>{}</div><div>{}</div>".format(slots.add(CP), slots.add(CP._replace(style='no-such-style')))
+        with self.assertLogs('bakpdlbot.charts', 'ERROR'):
+            filled = slots.fill(text)
+        self.assertEqual(filled.count('<svg'), 1)
+        self.assertIn('<!-- chart 1 failed to render', filled)
+
+
+class TestChartCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = ChartCache(self.dir.name, max_bytes=100)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_key(self):
+        self.assertEqual(chart_key(CP, 'svg'), chart_key(CPChart(*CP), 'svg'))
+        self.assertNotEqual(chart_key(CP, 'svg'), chart_key(CP, 'png'))
+        self.assertNotEqual(chart_key(CP, 'svg'), chart_key(CP._replace(style='xkcd'), 'svg'))
+        self.assertNotEqual(chart_key(BARS, 'svg'), chart_key(BARS._replace(values=[4.8, 4.2]), 'svg'))
+
+    def test_lru_eviction(self):
+        charts = [BARS._replace(period=p) for p in (5, 60, 300)]
+        self.cache.put(charts[0], 'svg', b'a' * 40)
+        self.cache.put(charts[1], 'svg', b'b' * 40)
+        self.assertEqual(self.cache.get(charts[0], 'svg'), b'a' * 40)
+        self.cache.put(charts[2], 'svg', b'c' * 40)
+        self.assertIsNone(self.cache.get(charts[1], 'svg'))
+        self.assertEqual(self.cache.get(charts[0], 'svg'), b'a' * 40)
+        self.assertEqual(self.cache.stats['evictions'], 1)
+        self.assertEqual(ChartCache(self.dir.name).size, 80)
+
+    def test_shared_directory(self):
+        other = ChartCache(self.dir.name, max_bytes=100)
+        other.put(CP, 'svg', b'x' * 30)
+        self.assertEqual(self.cache.get(CP, 'svg'), b'x' * 30)
+        self.assertEqual(self.cache.size, 30)
+        self.cache.put(BARS, 'svg', b'y' * 80)
+        self.assertIsNone(self.cache.get(CP, 'svg'))
+        self.assertEqual(self.cache.size, 80)
+
+    def test_renderer_uses_cache(self):
+        renderer = ChartRenderer(max_workers=1, cache=self.cache)
+        self.cache.put(CP, 'png', b'cached')
+        with renderer:
+            self.assertEqual(renderer.render(CP), b'cached')
+        self.assertEqual(self.cache.stats['hits'], 1)
+
+
+class TestSvgChart(unittest.TestCase):
+
+    def test_cp(self):
+        svg = svgchart.render(CP._replace(plots=CP.plots + [([1, 5], [3.0, 2.0], 'A & B')]))
+        doc = ElementTree.fromstring(svg)
+        # Rider B's curve is split where a value is missing
+        self.assertEqual(len(doc.findall('{http://www.w3.org/2000/svg}polyline')), 4)
+        texts = [t.text for t in doc.iter('{http://www.w3.org/2000/svg}text')]
+        self.assertIn('A & B', texts)
+        self.assertIn('5m', texts)
+
+    def test_power_bars(self):
+        for direction in ('horizontal', 'vertical'):
+            doc = ElementTree.fromstring(svgchart.render(BARS._replace(direction=direction)))
+            texts = [t.text for t in doc.iter('{http://www.w3.org/2000/svg}text')]
+            self.assertIn('90 day 5m power', texts)
+            self.assertEqual('4.8' in texts, direction == 'horizontal')
+
+    def test_nice_ticks(self):
+        self.assertEqual(svgchart.nice_ticks(0, 7.04), [0, 2, 4, 6, 8])
+        self.assertEqual(svgchart.nice_ticks(180, 1210), [0, 200, 400, 600, 800, 1000, 1200])
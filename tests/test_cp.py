@@ -0,0 +1,87 @@
+"""Tests for the NumPy-backed critical power curves."""
+
+import math
+import unittest
+
+from bakpdlbot.zwiftpower.cp import CPCurve
+from bakpdlbot.zwiftpower.powermatrix import TeamPowerMatrix
+
+CP_JSON = {
+    'efforts': {
+        '90days': [{'x': 60, 'y': 400}, {'x': 5, 'y': 900}, {'x': 1200, 'y': 280}],
+        '30days': [],
+    }
+}
+
+
+class TestCPCurve(unittest.TestCase):
+
+    def setUp(self):
+        self.curve = CPCurve.from_json(CP_JSON)
+
+    def test_dict_compatible(self):
+        self.assertEqual(dict(self.curve['90days']), {5: 900, 60: 400, 1200: 280})
+        self.assertEqual(list(self.curve), ['90days', '30days'])
+        self.assertIn(60, self.curve['90days'])
+        self.assertNotIn(61, self.curve['90days'])
+        self.assertIsInstance(self.curve['90days'][60], int)
+        self.assertEqual(list(self.curve['90days'].keys()), [5, 60, 1200])
+        self.assertFalse(self.curve['30days'])
+        self.assertFalse(CPCurve.from_json({'efforts': {}}))
+
+    def test_json_types_kept(self):
+        points = [{'x': 5, 'y': 4.5}, {'x': 1, 'y': 6}, {'x': 60, 'y': None}]
+        window = CPCurve.from_json({'efforts': {'90days': points}})['90days']
+        self.assertEqual(list(window.items()), [(1, 6), (5, 4.5), (60, None)])
+        self.assertIsInstance(window[1], int)
+        self.assertIsInstance(window[5], float)
+        self.assertEqual(window.at(5), 4.5)
+
+    def test_interpolation(self):
+        window = self.curve['90days']
+        self.assertEqual(window.at(60), 400)
+        self.assertAlmostEqual(self.curve.at(math.sqrt(60 * 1200)), 340)
+        self.assertTrue(math.isnan(window.at(2)))
+        self.assertEqual(list(window.at([5, 1200])), [900, 280])
+        self.assertTrue(math.isnan(self.curve['30days'].at(60)))
+
+
+class FakeRider:
+    def __init__(self, name, watts, kg):
+        self.name = name
+        self.profile = self
+        points = [{'x': x, 'y': y} for x, y in watts.items()]
+        self.cp_watts = CPCurve.from_json({'efforts': {'90days': points}}) if watts else None
+        self.cp_wkg = CPCurve.from_json({'efforts': {'90days': [{'x': p['x'], 'y': p['y'] / kg} for p in points]}}) \
+            if watts else None
+
+
+class TestTeamPowerMatrix(unittest.TestCase):
+
+    def setUp(self):
+        self.riders = [
+            FakeRider('A', {60: 500, 300: 350}, kg=100),
+            FakeRider('B', {60: 450, 300: 360}, kg=75),
+            FakeRider('C', {}, kg=70),
+            FakeRider('D', {60: 400}, kg=50),
+        ]
+        self.matrix = TeamPowerMatrix.from_riders(self.riders, durations=(60, 300))
+
+    def test_matrix(self):
+        self.assertEqual(self.matrix.watts.shape, (4, 2))
+        self.assertEqual(self.matrix.missing('watts').tolist(),
+                         [[False, False], [False, False], [True, True], [False, True]])
+
+    def test_ranks(self):
+        ranks = self.matrix.ranks('watts')
+        self.assertEqual(ranks[:, 0].tolist()[:2] + ranks[:, 0].tolist()[3:], [1, 2, 3])
+        self.assertEqual(ranks[:2, 1].tolist(), [2, 1])
+        self.assertTrue(math.isnan(ranks[2, 0]))
+        self.assertEqual(self.matrix.percentiles('wkg')[:, 0].tolist()[3], 100.0)
+
+    def test_best(self):
+        best = self.matrix.best(60, 'wkg')
+        self.assertEqual([(r.name, v) for r, v in best], [('D', 8.0), ('B', 6.0), ('A', 5.0)])
+        self.assertEqual([r.name for r, _ in self.matrix.best(300, 'watts', n=1)], ['B'])
+        with self.assertRaises(KeyError):
+            self.matrix.best(5)
@@ -0,0 +1,43 @@
+"""Tests for running blocking work off the event loop."""
+
+import asyncio
+import time
+import unittest
+
+from bakpdlbot.executor import BlockingExecutor, CommandTimeout, LoopLagMonitor
+
+
+class TestBlockingExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = BlockingExecutor(max_workers=4)
+
+    def tearDown(self):
+        self.executor.close()
+
+    def test_run(self):
+        result = asyncio.run(self.executor.run(lambda a, b=0: a + b, 1, b=2))
+        self.assertEqual(result, 3)
+        self.assertEqual(self.executor.stats['calls'], 1)
+
+    def test_timeout(self):
+        with self.assertRaises(CommandTimeout):
+            asyncio.run(self.executor.run(time.sleep, 0.5, timeout=0.05))
+        self.assertEqual(self.executor.stats['timeouts'], 1)
+
+    def test_loop_stays_responsive(self):
+        async def commands(blocking):
+            monitor = LoopLagMonitor(interval=0.01)
+            monitor.start()
+            await asyncio.sleep(0)
+            if blocking:
+                for _ in range(4):
+                    time.sleep(0.05)
+            else:
+                await asyncio.gather(*[self.executor.run(time.sleep, 0.05) for _ in range(4)])
+            await asyncio.sleep(0.03)
+            monitor.stop()
+            return monitor.max_lag
+
+        self.assertGreater(asyncio.run(commands(blocking=True)), 0.1)
+        self.assertLess(asyncio.run(commands(blocking=False)), 0.04)
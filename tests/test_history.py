@@ -0,0 +1,54 @@
+"""Tests for the race history index."""
+
+import unittest
+from datetime import date, datetime, timezone
+
+from bakpdlbot.zwiftpower import history
+from bakpdlbot.zwiftpower.history import RaceHistory
+
+
+def race(day, title, f_t='TYPE_RACE'):
+    return {'event_date': datetime(*day, 18, tzinfo=timezone.utc).timestamp(), 'event_title': title, 'f_t': f_t}
+
+
+class TestRaceHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.races = [
+            race((2024, 9, 10), 'Zwift Racing League | Open EMEA'),
+            race((2024, 9, 17), 'Zwift Racing League | Open EMEA'),
+            race((2023, 1, 5), 'WTRL Team Time Trial - Zone 2', f_t='TYPE_TTT'),
+            race((2024, 1, 1), 'FRR Tour TTT', f_t='TYPE_GROUP_RIDE'),
+            race((2022, 6, 1), 'Group ride', f_t='TYPE_GROUP_RIDE'),
+        ]
+        self.history = RaceHistory(self.races)
+
+    def test_sorted(self):
+        self.assertEqual([r['event_date'] for r in self.history], sorted(r['event_date'] for r in self.races))
+        self.assertIs(self.history.latest, self.races[1])
+        self.assertIsNone(RaceHistory([]).latest)
+
+    def test_flags_match_classifiers(self):
+        for r, flags in zip(self.history, self.history.flags):
+            self.assertEqual(bool(flags & history.RACE), history.is_race(r))
+            self.assertEqual(bool(flags & history.TTT), history.is_ttt(r))
+
+    def test_select(self):
+        self.assertEqual(self.history.count(history.RACE), 2)
+        self.assertEqual(self.history.ttts(), [self.races[2], self.races[3], self.races[0]])
+        self.assertIs(self.history.ttts(), self.history.ttts())
+        self.assertEqual(self.history.select(history.ZRL_TTT), [self.races[0]])
+
+
+class TestTTTCalendar(unittest.TestCase):
+
+    def test_calendar(self):
+        self.assertEqual(len(history.ZRL_TTT_DAYS), 66)
+        self.assertIn(date(2024, 10, 2).toordinal(), history.ZRL_TTT_DAYS)
+
+    def test_ttt_day_mask(self):
+        dates = [datetime(2024, 10, 2, 23, 59, tzinfo=timezone.utc).timestamp(),
+                 datetime(2024, 10, 3, 0, 1, tzinfo=timezone.utc).timestamp(),
+                 datetime(2020, 10, 19, 19, tzinfo=timezone.utc).timestamp()]
+        self.assertEqual(history.ttt_day_mask(dates).tolist(), [True, False, True])
+        self.assertEqual([history.day_ordinal(d) in history.ZRL_TTT_DAYS for d in dates], [True, False, True])
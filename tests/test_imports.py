@@ -0,0 +1,57 @@
+"""Tests that the entry points don't load heavy modules, or the game dictionary, until they're used."""
+
+import subprocess
+import sys
+import unittest
+
+from bakpdlbot.zwiftcom import const
+
+HEAVY = ('matplotlib', 'pendulum', 'jinja2', 'requests_cache', 'requests_html', 'discord')
+
+
+def loaded_after_import(module: str, check: str = '') -> list:
+    code = "import sys, {0}; {1}; print(' '.join(m for m in {2!r} if m in sys.modules))".format(
+        module, check or 'pass', HEAVY)
+    proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return proc.stdout.split()
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def test_riderlist(self):
+        self.assertEqual(loaded_after_import('bakpdlbot.riderlist'), [])
+
+    def test_cli(self):
+        self.assertEqual(loaded_after_import('bakpdlbot.cli'), [])
+
+    def test_game_dictionary_not_fetched_on_import(self):
+        check = "assert bakpdlbot.zwiftcom.const._game_dictionary is None"
+        # Fails (CalledProcessError) if the assertion does, or if importing tried to download it
+        self.assertNotIn('requests_cache', loaded_after_import('bakpdlbot.zwiftcom', check))
+
+
+class TestGameDictionary(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = 0
+        self.retrieve_data = const.retrieve_data
+        const.retrieve_data = self.failing_retrieve_data
+
+    def tearDown(self):
+        const.retrieve_data = self.retrieve_data
+        const._failure = None
+
+    def failing_retrieve_data(self, use_cache=True):
+        self.calls += 1
+        raise ConnectionError("offline")
+
+    def test_backs_off_after_failure(self):
+        with self.assertRaises(ConnectionError):
+            const.routes
+        with self.assertRaises(Exception):
+            const.items
+        self.assertEqual(self.calls, 1)
+        const._failure = (const._failure[0] - const.RETRY_AFTER, const._failure[1])
+        with self.assertRaises(ConnectionError):
+            const.game_dictionary()
+        self.assertEqual(self.calls, 2)
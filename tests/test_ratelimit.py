@@ -0,0 +1,91 @@
+"""Tests for the ZwiftPower rate limiter."""
+
+import unittest
+
+from requests import Response
+
+from bakpdlbot.zwiftpower.ratelimit import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def response(status, **headers):
+    resp = Response()
+    resp.status_code = status
+    resp.headers.update(headers)
+    return resp
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def bucket(self, per_minute, burst=1):
+        return TokenBucket(per_minute=per_minute, burst=burst, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_burst_then_rate(self):
+        bucket = self.bucket(per_minute=60, burst=3)
+        for _ in range(3):
+            bucket.acquire()
+        self.assertEqual(self.clock.now, 0.0)
+        bucket.acquire()
+        self.assertAlmostEqual(self.clock.now, 1.0)
+        bucket.acquire()
+        self.assertAlmostEqual(self.clock.now, 2.0)
+        self.assertEqual(bucket.stats['waits'], 2)
+        self.assertAlmostEqual(bucket.stats['wait_time'], 2.0)
+
+    def test_refills_while_idle(self):
+        bucket = self.bucket(per_minute=60, burst=2)
+        bucket.acquire()
+        bucket.acquire()
+        self.clock.now += 10
+        bucket.acquire()
+        bucket.acquire()
+        self.assertEqual(self.clock.now, 10.0)
+
+    def test_charge_creates_debt(self):
+        bucket = self.bucket(per_minute=60)
+        bucket.charge()
+        bucket.charge()
+        bucket.acquire()
+        self.assertAlmostEqual(self.clock.now, 2.0)
+
+    def test_unlimited(self):
+        bucket = self.bucket(per_minute=None)
+        for _ in range(100):
+            bucket.acquire()
+        self.assertEqual(self.clock.now, 0.0)
+
+    def test_retry_after(self):
+        bucket = self.bucket(per_minute=None)
+        self.assertIsNone(bucket.feedback(response(200)))
+        self.assertEqual(bucket.feedback(response(429, **{'Retry-After': '30'})), 30.0)
+        bucket.acquire()
+        self.assertEqual(self.clock.now, 30.0)
+        self.assertEqual(bucket.stats['backoffs'], 1)
+
+    def test_exponential_backoff(self):
+        bucket = self.bucket(per_minute=None)
+        delays = [bucket.feedback(response(503)) for _ in range(3)]
+        self.assertEqual(delays, [2.0, 4.0, 8.0])
+        bucket.feedback(response(200))
+        self.assertEqual(bucket.feedback(response(503)), 2.0)
+
+    def test_429_slows_down_and_recovers(self):
+        bucket = self.bucket(per_minute=60)
+        bucket.feedback(response(429))
+        self.assertAlmostEqual(bucket.rate, 0.5)
+        for _ in range(10):
+            bucket.feedback(response(200))
+        self.assertAlmostEqual(bucket.rate, 1.0)
@@ -0,0 +1,313 @@
+"""Offline tests for the ZwiftPower scraper."""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from requests import Response
+from requests.cookies import RequestsCookieJar
+
+from bakpdlbot.zwiftpower import auth, jsonstream, parser
+from bakpdlbot.zwiftpower.identitymap import IdentityMap
+from bakpdlbot.zwiftpower.ratelimit import TokenBucket
+from bakpdlbot.zwiftpower.scraper import ProfileSnapshot, Scraper
+
+PROFILE_HTML = b"""<html><body>
+<div id="zp_submenu"><ul><li><a href="#tab-results">Mick B [BAKPDL]</a></li></ul></div>
+<table id="profile_information">
+<tr><td><small>Rank <b>Overall</b><b>1,234
+ of 5000</b></small></td></tr>
+<tr><th>Category</th><td><span title="Mixed 30 day category">B</span></td></tr>
+<tr><th>Country</th><td>Netherlands</td></tr>
+<tr><th>Team</th><td><a href="/team.php?id=13264">Backpedal</a></td></tr>
+<tr><th>FTP</th><td>280w ~ 75kg</td></tr>
+<tr><th> zFTP </th><td>270w ~ 3.6wkg</td></tr>
+<tr><th>Zwift Racing Score</th><td><b>512</b></td></tr>
+</table>
+<div id="table_scroll_overview"><div class="btn-toolbar"><div class="pull-right"><div class="progress">
+<div class="progress-bar"><span>Punch: 12.5%</span></div></div></div></div></div>
+<script>
+function load_profile_spider() {
+    data: [{ mean: 3, y: 50, color: '#f26f33', ours: '10.1 w/kg' }]
+}
+</script>
+</body></html>"""
+
+
+class TestProfileSnapshot(unittest.TestCase):
+
+    def test_from_html(self):
+        for backend in parser.BACKENDS:
+            with self.subTest(backend=backend):
+                self.check_snapshot(ProfileSnapshot.from_html(parser.parse(PROFILE_HTML, backend=backend)))
+
+    def check_snapshot(self, snapshot):
+        self.assertEqual(snapshot.name, 'Mick B [BAKPDL]')
+        self.assertEqual(snapshot.cat, 'B')
+        self.assertEqual(snapshot.rank, 1234)
+        self.assertEqual(snapshot.zftp, 270)
+        self.assertEqual(snapshot.weight, 75.0)
+        self.assertEqual(snapshot.country, 'Netherlands')
+        self.assertEqual(snapshot.rs, '512')
+        self.assertEqual(snapshot.team_id, '13264')
+        self.assertEqual(snapshot.punch, 12.5)
+        self.assertEqual(snapshot.power_profile['wkg'][15], {'top': 1, 'value': '10.1', 'pct': 50})
+
+    def test_empty_page(self):
+        snapshot = ProfileSnapshot.from_html(parser.parse(b'<html><body></body></html>'))
+        self.assertEqual(snapshot, ProfileSnapshot())
+
+    def test_missing_ftp_range(self):
+        html = PROFILE_HTML.replace(b'<td>280w ~ 75kg</td>', b'<td>280w</td>')
+        snapshot = ProfileSnapshot.from_html(parser.parse(html))
+        self.assertIsNone(snapshot.weight)
+        self.assertEqual((snapshot.name, snapshot.zftp, snapshot.team_id), ('Mick B [BAKPDL]', 270, '13264'))
+
+    def test_unknown_zftp(self):
+        html = PROFILE_HTML.replace(b'<td>270w ~ 3.6wkg</td>', b'<td>-</td>')
+        snapshot = ProfileSnapshot.from_html(parser.parse(html))
+        self.assertIsNone(snapshot.zftp)
+        self.assertEqual((snapshot.name, snapshot.cat, snapshot.weight), ('Mick B [BAKPDL]', 'B', 75.0))
+
+
+class TestParser(unittest.TestCase):
+
+    def test_backends_agree(self):
+        page = b"""<html><body><form id="login" action="/login"><a href="https://secure.zwift.com/">Login</a>
+            <input name="user" value="x"><input name="rememberMe"></form></body></html>"""
+        for backend in parser.BACKENDS:
+            with self.subTest(backend=backend):
+                doc = parser.parse(page, backend=backend)
+                form = doc.find('form#login', first=True)
+                self.assertEqual(form.attrs['action'], '/login')
+                self.assertEqual(form.find('a')[0].attrs['href'], 'https://secure.zwift.com/')
+                self.assertEqual([i.attrs.get('value') for i in form.find('input')], ['x', None])
+                self.assertIsNone(doc.find('form#form', first=True))
+
+
+class TestJsonStream(unittest.TestCase):
+    CONTENT = (b'{"meta": {"data": [0]}, "data" : [ {"event_date": 1.5, "event_title": "ZRL &amp; more", "x": [1]},'
+               b' {"event_date": "", "f_t": "TYPE_RACE"} ], "after": null}')
+
+    def test_iter_items(self):
+        for use_ijson in (False, True) if jsonstream.ijson else (False,):
+            with self.subTest(use_ijson=use_ijson):
+                items = jsonstream.iter_items(self.CONTENT, use_ijson=use_ijson)
+                self.assertEqual(list(items), [{'event_date': 1.5, 'event_title': 'ZRL &amp; more', 'x': [1]},
+                                               {'event_date': '', 'f_t': 'TYPE_RACE'}])
+                items = jsonstream.iter_items(self.CONTENT, fields=('event_date', 'f_t'), use_ijson=use_ijson)
+                self.assertEqual(list(items), [{'event_date': 1.5}, {'event_date': '', 'f_t': 'TYPE_RACE'}])
+                self.assertEqual(list(jsonstream.iter_items(b'{"data": []}', use_ijson=use_ijson)), [])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            list(jsonstream.iter_items(b'[1, 2]', use_ijson=False))
+
+
+class TestAuth(unittest.TestCase):
+
+    @staticmethod
+    def response(content, content_type='text/html; charset=UTF-8'):
+        resp = Response()
+        resp.status_code = 200
+        resp.headers['Content-Type'] = content_type
+        resp._content = content
+        return resp
+
+    def test_is_logged_in(self):
+        self.assertTrue(auth.is_logged_in(self.response(b'{"data": []}', 'application/json')))
+        self.assertTrue(auth.is_logged_in(self.response(b'  {"efforts": {}}')))
+        self.assertTrue(auth.is_logged_in(self.response(PROFILE_HTML)))
+        self.assertFalse(auth.is_logged_in(self.response(b'<html><FORM class="x" id=\'login\'></FORM></html>')))
+        self.assertFalse(auth.is_logged_in(self.response(b'<form method="post" id="login" action="/">')))
+
+    def test_cookies_expired(self):
+        jar = RequestsCookieJar()
+        self.assertFalse(auth.cookies_expired(jar))
+        jar.set('phpbb3_sid', 'x', domain='.zwiftpower.com', expires=time.time() + 60)
+        jar.set('other', 'x', domain='zwift.com', expires=time.time() - 60)
+        self.assertFalse(auth.cookies_expired(jar))
+        self.assertTrue(auth.cookies_expired(jar, margin=120))
+
+    def test_cookie_store(self):
+        jar = RequestsCookieJar()
+        jar.set('phpbb3_sid', 'abc', domain='.zwiftpower.com', expires=int(time.time()) + 60)
+        jar.set('old', 'x', domain='.zwiftpower.com', expires=int(time.time()) - 60)
+        jar.set('session', 'y', domain='secure.zwift.com', rest={'HttpOnly': None})
+        with tempfile.TemporaryDirectory() as tmp:
+            store = auth.CookieStore(Path(tmp) / 'cookies.json')
+            self.assertEqual(store.load(RequestsCookieJar()), 0)
+            store.save(jar)
+            if os.name == 'posix':
+                self.assertEqual((Path(tmp) / 'cookies.json').stat().st_mode & 0o777, 0o600)
+            restored = RequestsCookieJar()
+            self.assertEqual(store.load(restored), 2)
+            self.assertEqual(restored.get('phpbb3_sid', domain='.zwiftpower.com'), 'abc')
+            self.assertEqual(restored.get('session'), 'y')
+            store.clear()
+            self.assertEqual(store.load(RequestsCookieJar()), 0)
+
+
+class FakeSession:
+    """Stands in for requests.Session, serving canned bodies by URL substring"""
+
+    def __init__(self, bodies, delay=0.0):
+        self.bodies = bodies
+        self.delay = delay
+        self.headers = {}
+        self.cookies = RequestsCookieJar()
+        self.requested = []
+
+    def get(self, url):
+        self.requested.append(url)
+        time.sleep(self.delay)
+        resp = Response()
+        resp.status_code = 200
+        resp.url = url
+        resp._content = next(body for pattern, body in self.bodies.items() if pattern in url)
+        return resp
+
+
+class TestScraper(unittest.TestCase):
+
+    def setUp(self):
+        self.session = FakeSession({
+            'profile.php': PROFILE_HTML,
+            '_all.json': b'{"data": [{"event_date": 1600000000, "f_t": "TYPE_RACE", "event_title": "Race", "zid": 1},'
+                         b' {"event_date": ""}]}',
+            'critical_power_profile': b'{"efforts": {"90days": [{"x": 5, "y": 1000}, {"x": 60, "y": 500}]}}',
+            '_view.json': b'{"data": ['
+                          b'{"zwid": 1, "name": "A &amp; B", "category": "B", "position_in_cat": 2, "tid": 13264},'
+                          b'{"zwid": 2, "name": "C", "category": "A", "position_in_cat": 1, "tid": ""},'
+                          b'{"zwid": 3, "name": "D", "category": "B", "position_in_cat": 1, "tid": ""}]}',
+        }, delay=0.05)
+        self.scraper = Scraper('user', 'pass', session=self.session, rate_limiter=TokenBucket(None), concurrency=8)
+
+    def test_prefetch_profiles(self):
+        profiles = self.scraper.prefetch_profiles([1, 2])
+        self.assertEqual(len(self.session.requested), 8)
+        self.assertEqual(profiles[1].name, 'Mick B [BAKPDL]')
+        self.assertEqual(list(profiles[1].races),
+                         [{'event_date': 1600000000, 'f_t': 'TYPE_RACE', 'event_title': 'Race'}])
+        self.assertEqual(profiles[1].cp_watts['90days'][60], 500)
+        self.assertEqual(len(self.session.requested), 8)
+
+    def test_prefetch_order(self):
+        # The first profile is the slowest to come in
+        get = self.session.get
+
+        def slow_get(url):
+            if 'z=3' in url:
+                time.sleep(0.2)
+            return get(url)
+        self.session.get = slow_get
+        profiles = self.scraper.prefetch_profiles([3, self.scraper.profile(1), 2], resources=('html',))
+        self.assertEqual([p.id for p in profiles], [3, 1, 2])
+        self.assertTrue(all(p.is_loaded('html') for p in profiles))
+
+    def test_prefetch_resources(self):
+        profiles = self.scraper.prefetch_profiles([1, 2], resources=('cp_wkg',))
+        self.assertEqual(len(self.session.requested), 2)
+        self.assertTrue(all('type=wkg' in url for url in self.session.requested))
+        self.assertFalse(profiles[0].is_loaded('html'))
+        # Already loaded resources aren't fetched again
+        self.scraper.prefetch_profiles([1, 2], resources=('cp_wkg', 'races'))
+        self.assertEqual(len(self.session.requested), 4)
+
+    def test_prefetch_errors(self):
+        self.session.bodies = {'zwift_id=2&': b'not json', **self.session.bodies}
+        with self.assertLogs('bakpdlbot.zwiftpower.scraper', 'WARNING') as logs:
+            profiles = self.scraper.prefetch_profiles([1, 2], resources=('cp_wkg',))
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(profiles[0].cp_wkg['90days'][5], 1000)
+        self.assertFalse(profiles[1].is_loaded('cp_wkg'))
+        # The failure is left for the property to raise
+        with self.assertRaises(ValueError):
+            profiles[1].cp_wkg
+
+    def test_single_flight(self):
+        profiles = [self.scraper.profile(1) for _ in range(5)]
+        self.scraper.fetch_all((p, 'cp_wkg') for p in profiles)
+        self.assertEqual(len(self.session.requested), 1)
+        self.assertEqual(self.scraper.stats['coalesced_loads'], 4)
+        self.assertEqual(profiles[4].cp_wkg['90days'][5], 1000)
+
+    def test_identity_map(self):
+        profile = self.scraper.profile(1)
+        self.assertIs(self.scraper.profile('1'), profile)
+        self.assertIs(profile.team, self.scraper.team(13264))
+        self.scraper.invalidate(1)
+        self.assertIsNot(self.scraper.profile(1), profile)
+        stats = self.scraper.identity_stats()['Profile']
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 2, 1))
+
+    def test_results_table(self):
+        race = self.scraper.race(1)
+        table = race.results_table()
+        self.assertIs(race.results_table(), table)
+        self.assertEqual(table.column('position_in_cat').dtype.kind, 'i')
+        self.assertEqual([r.name for r in table], [r.name for r in race.results])
+        self.assertEqual(table[0].name, 'A & B')
+        self.assertIs(table[0].team, self.scraper.team(13264))
+        b = table.where(category='B').sort('position_in_cat')
+        self.assertEqual([r.zwid for r in b], [3, 1])
+        self.assertEqual({k: len(v) for k, v in table.group_by('category').items()}, {'A': 1, 'B': 2})
+        self.assertEqual(len(table.filter(table.column('position_in_cat') == 1)), 2)
+
+    def test_stream(self):
+        race = self.scraper.race(2)
+        self.assertEqual(list(race.stream('results', fields=('zwid',))), [{'zwid': 1}, {'zwid': 2}, {'zwid': 3}])
+        self.assertFalse(race.is_loaded('results'))
+
+
+class TestIdentityMap(unittest.TestCase):
+
+    def test_lru_and_expiry(self):
+        now = [0.0]
+        objects = IdentityMap(maxsize=2, max_age=10, clock=lambda: now[0])
+        a = objects.get(1, object)
+        objects.get(2, object)
+        self.assertIs(objects.get(1, object), a)
+        objects.get(3, object)
+        self.assertNotIn(2, objects)
+        now[0] = 20
+        self.assertIsNot(objects.get(1, object), a)
+        self.assertEqual(objects.info(), {'hits': 1, 'misses': 4, 'evictions': 1, 'expired': 1, 'size': 2,
+                                          'maxsize': 2})
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_scraper_metrics(self):
+        session = FakeSession({'profile.php': PROFILE_HTML})
+        scraper = Scraper('user', 'pass', session=session, rate_limiter=TokenBucket(None))
+        scraper.profile(1).name
+        scraper.get_url('https://zwiftpower.com/profile.php?z=1')
+        metrics = scraper.metrics
+        self.assertEqual(metrics.requests[('profile', 'miss', 200)], 2)
+        self.assertEqual(metrics.bytes['profile'], 2 * len(PROFILE_HTML))
+        self.assertEqual(metrics.hit_ratio(), 0.0)
+        self.assertEqual(metrics.parse['Profile'].count, 1)
+        self.assertEqual(metrics.snapshot()['counters']['rate_limiter']['requests'], 2)
+
+        text = metrics.to_prometheus()
+        self.assertIn('zwiftpower_requests_total{endpoint="profile",cache="miss",status="200"} 2', text)
+        self.assertIn('zwiftpower_request_seconds_count{endpoint="profile",cache="miss"} 2', text)
+        self.assertIn('zwiftpower_parse_seconds_bucket{type="Profile",le="+Inf"} 1', text)
+        with tempfile.TemporaryDirectory() as d:
+            metrics.write(Path(d) / 'zp.prom')
+            metrics.write(Path(d) / 'zp.json')
+            self.assertEqual((Path(d) / 'zp.prom').read_text(), text)
+            self.assertEqual(json.loads((Path(d) / 'zp.json').read_text())['cache_hit_ratio'], 0.0)
+
+    def test_counters_copied_by_owner(self):
+        scraper = Scraper('user', 'pass', session=FakeSession({}), rate_limiter=TokenBucket(None))
+        scraper._count('logins')
+        counters = scraper.metrics.counters()
+        scraper._count('logins')
+        self.assertEqual(counters['scraper'], {'logins': 1})
+        self.assertEqual(scraper.metrics.counters()['scraper'], {'logins': 2})
+        self.assertIn('zwiftpower_scraper_logins_total 2', scraper.metrics.to_prometheus())
@@ -0,0 +1,81 @@
+"""Offline scraper tests against the local ZwiftPower stand-in."""
+
+import tempfile
+import unittest
+
+from requests import HTTPError, Session
+
+from bakpdlbot.zwiftpower.fixtures import Fixture, FixtureCorpus, Recorder, fixture_key
+from bakpdlbot.zwiftpower.ratelimit import TokenBucket
+from bakpdlbot.zwiftpower.scraper import Scraper
+from bakpdlbot.zwiftpower.standin import StandInServer, redirect
+
+from .test_scraper import PROFILE_HTML
+
+RACES = b'{"data": [{"event_date": 1600000000, "f_t": "TYPE_RACE", "event_title": "Race"}]}'
+CP = b'{"efforts": {"90days": [{"x": 5, "y": 1000}, {"x": 60, "y": 500}]}}'
+
+
+class TestStandIn(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.corpus = FixtureCorpus(self.tmp.name)
+        for id_ in range(1, 4):
+            self.corpus.add('/profile.php?z={}'.format(id_), Fixture(200, 'text/html', PROFILE_HTML))
+            self.corpus.add('/cache3/profile/{}_all.json'.format(id_), Fixture(200, 'application/json', RACES))
+            for type_ in ('watts', 'wkg'):
+                url = '/api3.php?do=critical_power_profile&zwift_id={}&zwift_event_id=&type={}'.format(id_, type_)
+                self.corpus.add(url, Fixture(200, 'text/html', CP))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def scraper(self, server, **kwargs):
+        session = Session()
+        redirect(session, server.base_url)
+        return Scraper('user', 'pass', session=session, **kwargs)
+
+    def test_login_and_forbidden(self):
+        with StandInServer(self.corpus, latency=0.01, require_login=True, forbid_every=5) as server:
+            scraper = self.scraper(server, rate_limiter=TokenBucket(None), concurrency=4)
+            profiles = scraper.prefetch_profiles([1, 2, 3])
+            self.assertEqual([p.name for p in profiles], ['Mick B [BAKPDL]'] * 3)
+            self.assertEqual(profiles[2].cp_wkg['90days'][60], 500)
+            self.assertEqual(len(profiles[0].races), 1)
+            self.assertGreaterEqual(server.stats['forbidden'], 1)
+            self.assertEqual(scraper.stats['logins'], server.stats['logins'])
+            self.assertEqual(server.stats['not_found'], 0)
+
+    def test_rate_limited(self):
+        with StandInServer(self.corpus, rate_limit=(3, 60), retry_after=0.01) as server:
+            limiter = TokenBucket(None)
+            scraper = self.scraper(server, rate_limiter=limiter)
+            profile = scraper.profile(1)
+            for resource in ('html', 'races', 'cp_watts'):
+                scraper.load(profile, resource)
+            with self.assertRaises(HTTPError):
+                scraper.load(profile, 'cp_wkg')
+            self.assertEqual(server.stats['rate_limited'], Scraper.MAX_RETRIES + 1)
+            self.assertEqual(limiter.stats['backoffs'], Scraper.MAX_RETRIES + 1)
+
+    def test_recorder(self):
+        with tempfile.TemporaryDirectory() as d, StandInServer(self.corpus) as server:
+            recorded = FixtureCorpus(d)
+            scraper = self.scraper(server, rate_limiter=TokenBucket(None))
+            recorder = Recorder(recorded, secrets=['Mick B'])
+            recorder.attach(scraper.session)
+            scraper.profile(1).name
+            scraper.profile(1).cp_watts
+            self.assertEqual(sorted(recorded.keys()), sorted([
+                fixture_key(scraper.profile(1).resource_url('html')),
+                fixture_key(scraper.profile(1).resource_url('cp_watts')),
+            ]))
+            fixture = FixtureCorpus(d).get('/profile.php?z=1')
+            self.assertNotIn(b'Mick B', fixture.body)
+            self.assertEqual(fixture.headers, {})
+
+            resp = scraper.session.get('https://zwiftpower.com/cache3/profile/1_all.json')
+            resp.url += '?sid=0123456789abcdef0123'
+            recorder.record(resp)
+            self.assertIn('/cache3/profile/1_all.json?sid=scrubbed', recorded)
@@ -0,0 +1,136 @@
+"""Tests for the SQLite rider store."""
+
+import threading
+import unittest
+
+from bakpdlbot.zwiftpower.ratelimit import TokenBucket
+from bakpdlbot.zwiftpower.refresh import RefreshPlanner
+from bakpdlbot.zwiftpower.scraper import Scraper
+from bakpdlbot.zwiftpower.store import RiderStore
+
+from .test_scraper import PROFILE_HTML, FakeSession
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRiderStore(unittest.TestCase):
+
+    def setUp(self):
+        self.session = FakeSession({
+            'profile.php': PROFILE_HTML,
+            '_all.json': b'{"data": [{"event_date": 1600000000, "f_t": "TYPE_RACE", "event_title": "Race",'
+                         b' "height": [180, 0], "weight": ["75.0", 0]}]}',
+            'critical_power_profile': b'{"efforts": {"90days": [{"x": 5, "y": 1000}, {"x": 60, "y": 4.5}]}}',
+            'team_riders': b'{"data": [{"zwid": 2, "name": "Anne &amp; Co"}, {"zwid": 1, "name": "Mick B"}]}',
+        })
+        self.clock = FakeClock()
+        self.store = RiderStore(':memory:', clock=self.clock)
+
+    def scraper(self):
+        return Scraper('user', 'pass', session=self.session, rate_limiter=TokenBucket(None), store=self.store)
+
+    def test_write_through(self):
+        fetched = self.scraper().prefetch_profiles([1])[0]
+        team = self.scraper().team(13264)
+        list(team.members)
+        requests = len(self.session.requested)
+
+        scraper = self.scraper()
+        profile = scraper.prefetch_profiles([1])[0]
+        self.assertEqual(len(self.session.requested), requests)
+        self.assertEqual(scraper.stats['store_hits'], 4)
+        self.assertEqual(profile.snapshot, fetched.snapshot)
+        self.assertEqual(list(profile.races), list(fetched.races))
+        self.assertEqual(profile.height, 180)
+        self.assertEqual(dict(profile.cp_wkg['90days']), {5: 1000, 60: 4.5})
+        self.assertEqual([m.name for m in scraper.team(13264).members], ['Anne & Co', 'Mick B'])
+        self.assertEqual(len(self.session.requested), requests)
+
+    def test_store_disabled(self):
+        self.scraper().prefetch_profiles([1])
+        scraper = self.scraper()
+        with scraper.store_disabled():
+            with scraper.store_disabled():
+                pass
+            self.assertFalse(scraper.reads_store())
+            other = []
+            thread = threading.Thread(target=lambda: other.append(scraper.reads_store()))
+            thread.start()
+            thread.join()
+            self.assertEqual(other, [True])
+            requests = len(self.session.requested)
+            scraper.prefetch_profiles([1], resources=('races',))
+            self.assertEqual(len(self.session.requested), requests + 1)
+        self.assertTrue(scraper.reads_store())
+
+    def test_ttl(self):
+        self.scraper().profile(1).races
+        self.assertEqual(self.store.stale('Profile', 'races', [1, 2]), [2])
+        self.clock.now += RiderStore.TTL[('Profile', 'races')]
+        self.assertEqual(self.store.stale('Profile', 'races', [1, 2]), [1, 2])
+        requests = len(self.session.requested)
+        self.scraper().profile(1).races
+        self.assertEqual(len(self.session.requested), requests + 1)
+
+    def test_find_riders(self):
+        list(self.scraper().team(13264).members)
+        self.scraper().profile(1).name
+        self.assertEqual(self.store.find_riders('mick b [bakpdl]'), [1])
+        self.assertEqual(self.store.find_riders('ANNE'), [2])
+        self.assertEqual(self.store.find_riders('b', team_id=13264), [1])
+        self.assertEqual(self.store.find_riders('%'), [])
+        self.assertEqual(self.store.rider(1)['team_id'], 13264)
+        # Within the team, the roster names count rather than the profile's "Mick B [BAKPDL]"
+        self.assertEqual(self.store.find_riders('mick b', team_id=13264), [1])
+
+    def test_rider_leaves_team(self):
+        list(self.scraper().team(13264).members)
+        self.scraper().profile(1).name
+        self.clock.now += RiderStore.TTL[('Team', 'riders_json')]
+        self.session.bodies['team_riders'] = b'{"data": [{"zwid": 2, "name": "Anne &amp; Co"}]}'
+        list(self.scraper().team(13264).members)
+        self.assertEqual(self.store.find_riders('mick', team_id=13264), [])
+        self.assertEqual(self.store.find_riders('mick'), [1])
+        self.assertIsNone(self.store.rider(1)['team_id'])
+        self.assertEqual([r['id'] for r in self.store.team_riders(13264)], [2])
+
+
+class TestRefreshPlanner(unittest.TestCase):
+    setUp = TestRiderStore.setUp
+    scraper = TestRiderStore.scraper
+
+    def refresh(self, signal='team'):
+        scraper = self.scraper()
+        scraper.team(13264).riders_json
+        before = len(self.session.requested)
+        plan = RefreshPlanner(scraper, signal).refresh(scraper.team(13264))
+        return plan, self.session.requested[before:]
+
+    def test_team_signal(self):
+        plan, requested = self.refresh()
+        self.assertEqual((sorted(plan.changed), plan.unchanged), ([1, 2], []))
+        self.assertEqual(len(requested), 6)
+
+        plan, requested = self.refresh()
+        self.assertEqual((plan.changed, sorted(plan.unchanged)), ([], [1, 2]))
+        self.assertEqual(requested, [])
+
+        self.clock.now += RiderStore.TTL[('Team', 'riders_json')]
+        self.session.bodies['team_riders'] = b'{"data": [{"zwid": 2, "name": "Anne &amp; Co", "races": 1},' \
+                                             b' {"zwid": 1, "name": "Mick B"}]}'
+        plan, requested = self.refresh()
+        self.assertEqual((plan.changed, plan.unchanged), ([2], [1]))
+        self.assertEqual(len(requested), 3)
+        self.assertTrue(self.store.is_fresh('Profile', 1, 'cp_wkg'))
+
+    def test_races_signal(self):
+        self.refresh('races')
+        plan, requested = self.refresh('races')
+        self.assertEqual((plan.changed, sorted(plan.unchanged)), ([], [1, 2]))
+        self.assertTrue(all('_all.json' in url for url in requested))